@@ -1,11 +1,23 @@
+import copy
+import asyncio
 from abc import ABC, abstractmethod
 from ai_agent_factory.llms.base_llm import BaseLLM
+from ai_agent_factory.utils.token_counter import get_token_counter, message_tokens
+from ai_agent_factory.agent.session_journal import RECORD_MESSAGE, RECORD_SUMMARY, RECORD_RESET, RECORD_REPLACE
 
 class BaseAgent(ABC):
 
     def reset_context(self):
         """重置对话上下文，保留系统提示"""
-        self.__context = [{"role": "system", "content": self.system_prompt}]
+        self.__context = []
+        self.__context_tokens = []  # 与 __context 一一对应的 token 数缓存
+        self.__context_ids = []  # 与 __context 一一对应的消息序号（单调递增，改写消息时保持不变）
+        self.__context_total = 0
+        self.__next_id = getattr(self, "_BaseAgent__next_id", 0)
+        if self.compactor is not None:
+            self.compactor.reset()  # 重置前提交的压缩任务，其结果不再适用
+        self._journal_append(self.__next_id, {}, 0, RECORD_RESET)
+        self._append_message("system", self.system_prompt)
 
     """
     抽象基类，用于定义 AI 代理的基本行为，管理对话上下文并与底层语言模型交互。
@@ -15,24 +27,39 @@ class BaseAgent(ABC):
         system_prompt (str): 系统提示，定义 AI 代理的行为或角色。
         __context (list[dict]): 对话上下文，存储系统提示、用户消息和 AI 回复。
         max_context (int): 最大上下文长度，控制历史消息的数量以避免过长。
+        max_prompt_tokens (int): 单次请求的 token 预算，设置后按 token 数而非消息数裁剪上下文。
+        compactor (ContextCompactor): 可选的后台上下文压缩器，超过阈值时把较早的消息总结为摘要。
+        journal (SessionJournal): 可选的会话日志，追加到上下文的消息同时写入日志，用于恢复会话。
     """
     def get_context(self):
         return self.__context;
 
-    def __init__(self, basellm: BaseLLM, system_prompt: str, max_context: int = 20):
+    def get_context_tokens(self) -> int:
+        """返回当前上下文的 token 总数（基于缓存，O(1)）"""
+        return self.__context_total
+
+    def __init__(self, basellm: BaseLLM, system_prompt: str, max_context: int = 20,
+                 max_prompt_tokens: int = None, token_counter=None, compactor=None):
         """
         初始化 BaseAgent 实例。
 
         参数:
             basellm (BaseLLM): 底层语言模型实例，用于处理对话请求。
             system_prompt (str): 系统提示，定义 AI 代理的初始行为或角色。
-            max_context (int, optional): 最大上下文消息数，默认为 20。
+            max_context (int, optional): 最大上下文消息数，默认为 20（未设置 max_prompt_tokens 时生效）。
+            max_prompt_tokens (int, optional): 请求的 token 预算，超出时从最旧的非系统消息开始淘汰。
+            token_counter (callable, optional): text -> token 数，默认按模型选择 tiktoken 或快速估算。
+            compactor (ContextCompactor, optional): 后台上下文压缩器，默认不压缩（只裁剪）。
         """
-        self.basellm = basellm
+        self.basellm = basellm  # BaseLLM（配合 chat）或 AsyncBaseLLM（配合 achat）
         self.system_prompt = system_prompt
-        # 初始化上下文，包含系统提示作为第一条消息
-        self.__context = [{"role": "system", "content": system_prompt}]
         self.max_context = max_context
+        self.max_prompt_tokens = max_prompt_tokens
+        self.count_tokens = token_counter or get_token_counter(getattr(basellm, "model_name", None))
+        self.compactor = compactor
+        self.journal = None  # 通过 attach_journal 挂上
+        # 初始化上下文，包含系统提示作为第一条消息
+        self.reset_context()
 
     @abstractmethod
     def todo(self, token: str):
@@ -78,8 +105,22 @@ class BaseAgent(ABC):
             5. 控制上下文长度，保留系统提示和最近的消息。
             6. 调用 todo 回调处理完整回复。
         """
-        # 添加用户消息到上下文
-        self.__context.append({"role": "user", "content": message})
+        result_all = self._stream_reply(message)
+
+        # 调用 todo 回调处理完整回复（如果子类已实现）
+        if self.todo:
+            self.todo(result_all)
+
+        return result_all
+
+    def _stream_reply(self, message: str) -> str:
+        """
+        完成一次模型往返：追加用户消息、流式获取回复并保存到上下文，不调用 todo。
+        """
+        # 换入已完成的后台摘要，再添加用户消息，并在发送前裁剪到预算以内
+        self._apply_compaction()
+        self._append_message("user", message)
+        self._trim_context()
 
         # 调用底层语言模型，获取流式回复
         result = self.basellm.chat(self.__context)
@@ -92,15 +133,206 @@ class BaseAgent(ABC):
             if self.token_deal:
                 self.token_deal(token)
 
-        # 保存 AI 回复到上下文
-        self.__context.append({"role": "assistant", "content": result_all})
+        self._save_reply(result_all)
+        return result_all
 
-        # 控制上下文长度，保留系统提示（index 0）和最近 max_context 条消息
-        if len(self.__context) > self.max_context:
-            self.__context = [self.__context[0]] + self.__context[-self.max_context:]
+    async def achat(self, message: str) -> str:
+        """
+        chat 的异步版本，要求 basellm 为 AsyncBaseLLM。
 
-        # 调用 todo 回调处理完整回复（如果子类已实现）
-        if self.todo:
-            self.todo(result_all)
+        流程与 chat 相同，区别在于以 async for 消费 token，并在最后 await atodo，
+        从而让一个事件循环同时驱动多个会话。
+        """
+        result_all = await self._astream_reply(message)
+
+        await self.atodo(result_all)
+
+        return result_all
+
+    async def _astream_reply(self, message: str) -> str:
+        """_stream_reply 的异步版本"""
+        self._apply_compaction()
+        self._append_message("user", message)
+        self._trim_context()
+
+        result_all = ""
+        async for token in self.basellm.achat(self.__context):
+            result_all += token
+            if self.token_deal:
+                self.token_deal(token)
+
+        self._save_reply(result_all)
+        return result_all
+
+    async def atodo(self, token: str):
+        """
+        todo 的异步版本，默认在线程池中执行 todo，避免文件操作阻塞事件循环。
+        """
+        return await asyncio.to_thread(self.todo, token)
+
+    def _save_reply(self, result_all: str):
+        """保存 AI 回复到上下文，并控制上下文长度"""
+        self._append_message("assistant", result_all)
+        self._trim_context()
+        self._schedule_compaction()
+
+    def _append_message(self, role: str, content: str):
+        """追加一条消息，同时缓存其 token 数"""
+        message = {"role": role, "content": content}
+        tokens = message_tokens(message, self.count_tokens)
+        self.__context.append(message)
+        self.__context_tokens.append(tokens)
+        self.__context_ids.append(self.__next_id)
+        self.__context_total += tokens
+        if role != "system":
+            self._journal_append(self.__next_id, message, tokens, RECORD_MESSAGE)
+        self.__next_id += 1
+
+    def _journal_append(self, msg_id: int, message: dict, tokens: int, kind: int):
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(msg_id, message, tokens, kind)
+        except (OSError, ValueError) as e:
+            print(f"\n⚠️ 写入会话日志失败，已停止记录: {e}")
+            self.journal = None
+
+    def attach_journal(self, journal, max_tokens: int = None) -> int:
+        """
+        挂上会话日志，之后追加的消息与压缩摘要都会写入日志。
+        日志中已有记录时（恢复会话），用日志尾部在 token 预算内的消息替换当前上下文（保留系统提示）。
+
+        参数:
+            journal: SessionJournal 实例
+            max_tokens: 载入消息的 token 预算，默认为 max_prompt_tokens 减去系统提示
+        返回:
+            载入的消息条数
+        """
+        self.journal = None
+        if not len(journal):
+            self.journal = journal
+            return 0
+        if max_tokens is None and self.max_prompt_tokens is not None:
+            max_tokens = max(self.max_prompt_tokens - self.__context_tokens[0], 0)
+        entries, next_id = journal.load_tail(max_tokens)
+        if self.compactor is not None:
+            self.compactor.reset()
+        self.__context_total = self.__context_tokens[0]
+        del self.__context[1:], self.__context_tokens[1:], self.__context_ids[1:]
+        for msg_id, message in entries:
+            tokens = message_tokens(message, self.count_tokens)
+            self.__context.append(message)
+            self.__context_tokens.append(tokens)
+            self.__context_ids.append(msg_id)
+            self.__context_total += tokens
+        self.__next_id = max(self.__next_id, next_id)
+        self.journal = journal
+        return len(entries)
 
-        return result_all
\ No newline at end of file
+    def fork(self):
+        """
+        从当前对话位置分叉出一个新代理，之后两边的对话互不影响。
+        消息 dict 从不原地修改（改写、压缩都替换为新对象），分叉只复制引用列表，已有消息由两边共享；
+        相同的消息前缀也能命中服务端的提示缓存。子类在 _init_fork 中为分叉准备自己的可变状态。
+        """
+        clone = copy.copy(self)
+        clone.__context = list(self.__context)
+        clone.__context_tokens = list(self.__context_tokens)
+        clone.__context_ids = list(self.__context_ids)
+        clone.compactor = self.compactor.clone() if self.compactor is not None else None
+        clone.journal = None
+        clone._init_fork(self)
+        return clone
+
+    def _init_fork(self, parent):
+        """分叉钩子：子类在这里替换不能与原代理共享的状态"""
+        pass
+
+    def set_system_prompt(self, system_prompt: str):
+        """替换系统提示（上下文第一条消息），同步更新 token 缓存"""
+        self.system_prompt = system_prompt
+        message = {"role": "system", "content": system_prompt}
+        tokens = message_tokens(message, self.count_tokens)
+        self.__context_total += tokens - self.__context_tokens[0]
+        self.__context[0] = message  # 替换为新对象，不修改可能仍被引用的旧消息
+        self.__context_tokens[0] = tokens
+
+    def _rewrite_messages(self, rewrite) -> int:
+        """
+        改写上下文中的消息（不含系统提示）：rewrite(message) 返回新内容，或 None 表示不改。
+        被改写的消息替换为新的 dict，并同步更新 token 缓存与会话日志；返回改写的条数。
+        """
+        changed = 0
+        for i in range(1, len(self.__context)):
+            message = self.__context[i]
+            content = rewrite(message)
+            if content is None or content == message["content"]:
+                continue
+            new_message = {**message, "content": content}
+            tokens = message_tokens(new_message, self.count_tokens)
+            self.__context_total += tokens - self.__context_tokens[i]
+            self.__context[i] = new_message
+            self.__context_tokens[i] = tokens
+            self._journal_append(self.__context_ids[i], new_message, tokens, RECORD_REPLACE)
+            changed += 1
+        return changed
+
+    def _schedule_compaction(self):
+        """上下文超过压缩阈值时，把较早的消息（保留最近 keep_recent 条）交给后台线程总结，不等待结果"""
+        compactor = self.compactor
+        if compactor is None or not compactor.should_compact(self.__context_total):
+            return
+        end = len(self.__context) - compactor.keep_recent
+        if sum(self.__context_tokens[1:end]) < compactor.min_batch_tokens:
+            return
+        entries = list(zip(self.__context_ids[1:end], self.__context[1:end]))
+        if compactor.submit(entries):
+            print(f"\n🗜️ 上下文约 {self.__context_total} tokens，已在后台开始总结较早的 {len(entries)} 条消息")
+
+    def _apply_compaction(self):
+        """
+        请求前调用：后台摘要已完成时，把序号不大于被总结的最后一条的消息原子地替换为一条摘要消息。
+        摘要未完成时立即返回，从不等待。
+        """
+        if self.compactor is None:
+            return
+        done = self.compactor.take_result()
+        if done is None:
+            return
+        last_id, summary = done
+        count = 1
+        while count < len(self.__context) and self.__context_ids[count] <= last_id:
+            count += 1
+        message = {"role": "user", "content": summary}
+        tokens = message_tokens(message, self.count_tokens)
+        before = self.__context_total
+        self.__context_total += tokens - sum(self.__context_tokens[1:count])
+        # 被总结的消息可能已被裁剪掉一部分，摘要仍插在最前面，保留早期的决定
+        self.__context[1:count] = [message]
+        self.__context_tokens[1:count] = [tokens]
+        self.__context_ids[1:count] = [last_id]
+        self._journal_append(last_id, message, tokens, RECORD_SUMMARY)
+        print(f"\n🗜️ 已用摘要替换 {count - 1} 条早期消息: {before} → {self.__context_total} tokens")
+
+    def _trim_context(self):
+        """
+        控制上下文长度，始终保留系统提示（index 0）和最新一条消息。
+
+        设置了 max_prompt_tokens 时按 token 预算从最旧的非系统消息开始淘汰；
+        token 数已缓存在每条消息上，裁剪代价只与被淘汰的消息数相关，与历史长度无关。
+        否则沿用按消息数裁剪（保留最近 max_context 条）。
+        """
+        if self.max_prompt_tokens is not None:
+            drop = 0
+            total = self.__context_total
+            last = len(self.__context) - 1
+            while total > self.max_prompt_tokens and 1 + drop < last:
+                total -= self.__context_tokens[1 + drop]
+                drop += 1
+        else:
+            drop = max(0, len(self.__context) - 1 - self.max_context)
+        if drop:
+            self.__context_total -= sum(self.__context_tokens[1:1 + drop])
+            del self.__context[1:1 + drop]
+            del self.__context_tokens[1:1 + drop]
+            del self.__context_ids[1:1 + drop]
@@ -0,0 +1,157 @@
+"""
+上下文压缩：会话接近 token 上限时，在后台调用（可以是更便宜的）模型把较早的消息总结为一条摘要，
+下一次请求前再原子地替换进上下文，避免裁剪直接丢掉早期的决定。
+
+    - 只在一次回复保存之后检查阈值并提交任务，任务拿到的是消息快照，不持有上下文的锁
+    - 摘要完成前的请求照常发送（必要时仍按预算裁剪），从不等待摘要
+    - 替换按消息序号进行：序号不大于快照中最后一条的消息全部换成摘要，期间被改写或裁剪的消息不影响结果
+    - 只有异步接口的模型（AsyncBaseLLM）在提交时若处于运行中的事件循环（achat 路径），
+      摘要作为该循环上的任务执行，与主会话共用同一个客户端；不在事件循环中提交时，
+      在后台线程中的一个压缩器私有的事件循环上执行（此时该模型实例不应再被其它事件循环使用）
+"""
+import asyncio
+import threading
+
+SUMMARY_PREFIX = "【早期对话摘要（自动生成）】\n"
+
+_SUMMARY_PROMPT = (
+    "你是对话压缩助手。下面是一个编程助手与用户较早的对话记录（含文件操作结果）。"
+    "请用简洁的中文总结，供助手在后续对话中继续工作，必须保留：\n"
+    "1. 用户的目标与明确提出的要求、约束\n"
+    "2. 已经做出的决定及理由\n"
+    "3. 已创建、修改、删除的文件及要点\n"
+    "4. 尚未完成的事项与已知问题\n"
+    "不要复述文件全文，不要编造记录中没有的内容。"
+)
+
+
+class ContextCompactor:
+    """
+    后台摘要器。
+
+    参数:
+        llm: 用于生成摘要的模型（BaseLLM 或 AsyncBaseLLM）
+        trigger_tokens: 上下文 token 数超过该值时开始压缩
+        keep_recent: 保留不压缩的最近消息条数
+        min_batch_tokens: 待总结的消息至少达到该 token 数才提交（默认 trigger_tokens 的 1/4），避免每轮都做小规模总结
+        max_message_chars: 每条消息送入摘要模型的最大字符数
+        max_transcript_chars: 送入摘要模型的记录总字符数上限（超出时保留较新的部分）
+    """
+
+    def __init__(self, llm, trigger_tokens: int, keep_recent: int = 6, min_batch_tokens: int = None,
+                 max_message_chars: int = 2000, max_transcript_chars: int = 60000):
+        self.llm = llm
+        self.trigger_tokens = trigger_tokens
+        self.keep_recent = keep_recent
+        self.min_batch_tokens = min_batch_tokens if min_batch_tokens is not None else trigger_tokens // 4
+        self.max_message_chars = max_message_chars
+        self.max_transcript_chars = max_transcript_chars
+        self._lock = threading.Lock()
+        self._thread = None
+        self._task = None  # achat 路径上的摘要任务
+        self._loop = None  # 不在事件循环中提交异步模型的任务时，后台线程使用的私有事件循环
+        self._result = None  # (最后一条被总结消息的序号, 摘要)
+        self._generation = 0  # reset() 后递增，之前提交的任务结果作废
+        self.last_error = None
+
+    def clone(self) -> "ContextCompactor":
+        """配置相同、没有进行中任务的新压缩器（用于分叉出的代理）"""
+        return ContextCompactor(self.llm, self.trigger_tokens, self.keep_recent, self.min_batch_tokens,
+                                self.max_message_chars, self.max_transcript_chars)
+
+    @property
+    def busy(self) -> bool:
+        thread, task = self._thread, self._task
+        return (thread is not None and thread.is_alive()) or (task is not None and not task.done())
+
+    def should_compact(self, total_tokens: int) -> bool:
+        return total_tokens > self.trigger_tokens and not self.busy and self._result is None
+
+    def submit(self, entries: list) -> bool:
+        """
+        提交一批待总结的消息 [(序号, message), ...]（按时间顺序），在后台生成摘要。
+        已有任务在运行或结果尚未取走时不提交，返回 False。
+        """
+        if len(entries) < 2:
+            return False
+        with self._lock:
+            if self.busy or self._result is not None:
+                return False
+            if not hasattr(self.llm, "chat"):
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    loop = None
+                if loop is not None:
+                    self._task = loop.create_task(self._arun(list(entries), self._generation))
+                    return True
+            self._thread = threading.Thread(target=self._run, args=(list(entries), self._generation),
+                                            name="context-compactor", daemon=True)
+            self._thread.start()
+            return True
+
+    def take_result(self):
+        """非阻塞地取走已完成的摘要 (最后序号, 摘要)；尚未完成时返回 None"""
+        with self._lock:
+            result, self._result = self._result, None
+            return result
+
+    def reset(self):
+        """上下文被整体替换（重置或恢复会话）时调用：丢弃已完成和进行中任务的结果"""
+        with self._lock:
+            self._generation += 1
+            self._result = None
+
+    def _run(self, entries: list, generation: int):
+        try:
+            summary = self.summarize([message for _, message in entries])
+        except Exception as e:
+            self.last_error = e
+            print(f"\n⚠️ 上下文压缩失败: {e}")
+            return
+        self._finish(entries, generation, summary)
+
+    async def _arun(self, entries: list, generation: int):
+        try:
+            summary = await self.asummarize([message for _, message in entries])
+        except Exception as e:
+            self.last_error = e
+            print(f"\n⚠️ 上下文压缩失败: {e}")
+            return
+        self._finish(entries, generation, summary)
+
+    def _finish(self, entries: list, generation: int, summary: str):
+        with self._lock:
+            if summary.strip() and generation == self._generation:
+                self._result = (entries[-1][0], SUMMARY_PREFIX + summary.strip())
+
+    def _transcript(self, messages: list) -> str:
+        parts = []
+        for message in messages:
+            content = message["content"]
+            if len(content) > self.max_message_chars:
+                content = content[:self.max_message_chars] + f"...（省略 {len(content) - self.max_message_chars} 字）"
+            parts.append(f"[{message['role']}]\n{content}")
+        transcript = "\n\n".join(parts)
+        if len(transcript) > self.max_transcript_chars:
+            transcript = "...\n" + transcript[-self.max_transcript_chars:]
+        return transcript
+
+    def _request(self, messages: list) -> list:
+        return [
+            {"role": "system", "content": _SUMMARY_PROMPT},
+            {"role": "user", "content": self._transcript(messages)},
+        ]
+
+    def summarize(self, messages: list) -> str:
+        """同步生成摘要（在后台线程中调用）"""
+        if hasattr(self.llm, "chat"):
+            return "".join(self.llm.chat(self._request(messages)))
+        # 异步模型：始终在同一个私有事件循环上运行，客户端不会跨事件循环使用
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.asummarize(messages))
+
+    async def asummarize(self, messages: list) -> str:
+        """异步生成摘要（要求 llm 为 AsyncBaseLLM）"""
+        return "".join([token async for token in self.llm.achat(self._request(messages))])
@@ -0,0 +1,207 @@
+"""
+会话日志：把上下文中追加的每条消息写入只追加的压缩日志，程序退出后可以恢复会话，无需重放模型调用。
+
+目录结构（<项目>/.codegenius/sessions/<会话ID>/）:
+    journal.z    记录帧序列：[长度 u32][crc32 u32][zlib(JSON)]
+    journal.idx  定长索引：每条记录 (偏移 u64, 长度 u32, token 数 u32, 消息序号 i64, 类型 u8)
+
+    - 追加时先写记录帧再写索引项，只 flush 不 fsync；打开时丢弃不完整的尾部，崩溃后日志仍然可用
+    - 恢复时 mmap 索引，从尾部向前按 token 数累加，只解压预算内的记录，耗时与会话总长度无关
+    - 上下文压缩产生的摘要也写入日志（类型为摘要）；恢复时摘要代替它覆盖的全部早期消息
+    - 上下文重置写入一条重置记录，恢复时只载入其后的消息
+    - 已写入的消息被改写（旧结果块折叠等）时追加一条替换记录（同一消息序号），恢复时以最新的替换内容为准
+"""
+import os
+import json
+import mmap
+import time
+import uuid
+import zlib
+import struct
+import threading
+from ai_agent_factory.utils.state_dir import make_dirs
+
+SESSIONS_DIR = os.path.join(".codegenius", "sessions")
+DATA_FILE = "journal.z"
+INDEX_FILE = "journal.idx"
+
+RECORD_MESSAGE = 0
+RECORD_SUMMARY = 1
+RECORD_RESET = 2   # 上下文被重置，恢复时不越过该记录
+RECORD_REPLACE = 3  # 同一序号的消息（或摘要）改写后的内容
+
+_FRAME = struct.Struct("<II")        # 长度, crc32
+_INDEX = struct.Struct("<QIIqB3x")   # 偏移, 长度, token 数, 消息序号, 类型
+
+
+class SessionJournal:
+    """单个会话的日志"""
+
+    def __init__(self, session_dir: str):
+        self.session_dir = os.path.abspath(session_dir)
+        self.session_id = os.path.basename(self.session_dir)
+        make_dirs(self.session_dir)
+        self.data_path = os.path.join(self.session_dir, DATA_FILE)
+        self.index_path = os.path.join(self.session_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._recover()
+        self._data = open(self.data_path, "ab")
+        self._index = open(self.index_path, "ab")
+
+    # ---------- 会话管理 ----------
+
+    @staticmethod
+    def sessions_root(project_dir: str) -> str:
+        return os.path.join(os.path.abspath(project_dir), SESSIONS_DIR)
+
+    @classmethod
+    def create(cls, project_dir: str) -> "SessionJournal":
+        """新建会话（ID 形如 20250101-120000-1a2b）"""
+        session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}"
+        return cls(os.path.join(cls.sessions_root(project_dir), session_id))
+
+    @classmethod
+    def open(cls, project_dir: str, session_id: str) -> "SessionJournal":
+        """
+        打开已有会话；session_id 为 "latest" 时打开最近使用的会话。
+        异常:
+            FileNotFoundError: 会话不存在
+        """
+        if session_id == "latest":
+            sessions = cls.list_sessions(project_dir)
+            if not sessions:
+                raise FileNotFoundError("没有可恢复的会话")
+            session_id = sessions[0]["session_id"]
+        session_dir = os.path.join(cls.sessions_root(project_dir), session_id)
+        if not os.path.isfile(os.path.join(session_dir, INDEX_FILE)):
+            raise FileNotFoundError(f"会话不存在: {session_id}")
+        return cls(session_dir)
+
+    @classmethod
+    def list_sessions(cls, project_dir: str) -> list:
+        """全部会话，最近使用的在前: [{"session_id", "time", "records"}]"""
+        root = cls.sessions_root(project_dir)
+        sessions = []
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            return sessions
+        for entry in entries:
+            try:
+                st = os.stat(os.path.join(entry.path, INDEX_FILE))
+            except OSError:
+                continue
+            sessions.append({
+                "session_id": entry.name,
+                "time": st.st_mtime,
+                "records": st.st_size // _INDEX.size,
+            })
+        sessions.sort(key=lambda s: s["time"], reverse=True)
+        return sessions
+
+    # ---------- 写入 ----------
+
+    def _recover(self):
+        """丢弃崩溃时可能留下的不完整索引项与未被索引的记录"""
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        count = index_size // _INDEX.size
+        end = 0
+        if count:
+            with open(self.index_path, "rb") as f:
+                while count:
+                    f.seek((count - 1) * _INDEX.size)
+                    offset, length = _INDEX.unpack(f.read(_INDEX.size))[:2]
+                    if offset + _FRAME.size + length <= data_size:
+                        end = offset + _FRAME.size + length
+                        break
+                    count -= 1
+        if count * _INDEX.size != index_size:
+            with open(self.index_path, "ab") as f:
+                f.truncate(count * _INDEX.size)
+        if end != data_size:
+            with open(self.data_path, "ab") as f:
+                f.truncate(end)
+        self._count = count
+        self._data_size = end
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, msg_id: int, message: dict, tokens: int, kind: int = RECORD_MESSAGE):
+        """追加一条消息（或摘要、替换）记录"""
+        payload = zlib.compress(json.dumps(message, ensure_ascii=False).encode("utf-8"), 1)
+        with self._lock:
+            offset = self._data_size
+            self._data.write(_FRAME.pack(len(payload), zlib.crc32(payload)))
+            self._data.write(payload)
+            self._data.flush()
+            self._index.write(_INDEX.pack(offset, len(payload), tokens, msg_id, kind))
+            self._index.flush()
+            self._data_size += _FRAME.size + len(payload)
+            self._count += 1
+
+    def close(self):
+        with self._lock:
+            self._data.close()
+            self._index.close()
+
+    # ---------- 恢复 ----------
+
+    def load_tail(self, max_tokens: int = None):
+        """
+        按 token 预算载入会话尾部。
+
+        返回:
+            (entries, next_id)：entries 为 [(消息序号, message)]，按时间顺序，若有摘要则摘要在最前；
+            next_id 为之后新消息应使用的序号
+        """
+        with self._lock:
+            count = self._count
+            if not count:
+                return [], 0
+            budget = max_tokens if max_tokens is not None else float("inf")
+            with open(self.index_path, "rb") as fi, open(self.data_path, "rb") as fd, \
+                    mmap.mmap(fi.fileno(), count * _INDEX.size, access=mmap.ACCESS_READ) as index, \
+                    mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                next_id = 0
+                for i in range(count - 1, -1, -1):
+                    _, _, _, msg_id, kind = _INDEX.unpack_from(index, i * _INDEX.size)
+                    if kind == RECORD_MESSAGE:
+                        next_id = msg_id + 1
+                        break
+
+                # 从尾部向前选取预算内的消息；遇到最近的摘要后，只再选取摘要未覆盖的消息
+                # （提交压缩之后、摘要写入之前追加的消息位于摘要记录之前，但序号更大）。
+                # 替换记录总在被替换的记录之后，向前扫描时先遇到，选中消息时直接换成最新的替换内容
+                selected, summary, covered, used = [], None, None, 0
+                replacements = {}  # 消息序号 -> (偏移, token 数)，只保留最新的一条
+                for i in range(count - 1, -1, -1):
+                    offset, length, tokens, msg_id, kind = _INDEX.unpack_from(index, i * _INDEX.size)
+                    if kind == RECORD_RESET:
+                        break
+                    if kind == RECORD_REPLACE:
+                        replacements.setdefault(msg_id, (offset, tokens))
+                        continue
+                    offset, tokens = replacements.pop(msg_id, (offset, tokens))
+                    if kind == RECORD_SUMMARY and summary is not None:
+                        continue  # 更早的摘要已被最近的摘要覆盖
+                    if covered is not None and msg_id <= covered:
+                        break
+                    if used + tokens > budget:
+                        break
+                    used += tokens
+                    if kind == RECORD_SUMMARY:
+                        summary, covered = (offset, msg_id), msg_id
+                    else:
+                        selected.append((offset, msg_id))
+                records = ([summary] if summary else []) + sorted(selected, key=lambda s: s[1])
+
+                result = []
+                for offset, msg_id in records:
+                    size, crc = _FRAME.unpack_from(data, offset)
+                    payload = data[offset + _FRAME.size:offset + _FRAME.size + size]
+                    if zlib.crc32(payload) != crc:
+                        continue  # 损坏的记录跳过
+                    result.append((msg_id, json.loads(zlib.decompress(payload))))
+                return result, next_id
@@ -1,6 +1,6 @@
 
 from abc import ABC, abstractmethod
-from typing import Iterable, Dict, Any
+from typing import Iterable, AsyncIterator, Dict, Any
 
 class BaseLLM(ABC):
     def __init__(self, api_key: str, base_url: str, model_name: str):
@@ -26,5 +26,27 @@ class BaseLLM(ABC):
         """
         pass
 
-        
-    
\ No newline at end of file
+
+class AsyncBaseLLM(ABC):
+    """
+    异步语言模型基类：与 BaseLLM 接口一致，但以异步生成器返回 token，
+    便于在单个事件循环中并发驱动多个会话，而无需为每个请求占用一个线程。
+    """
+    def __init__(self, api_key: str, base_url: str, model_name: str):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = model_name
+
+    @abstractmethod
+    def achat(self, context: list[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """
+        抽象方法：给定上下文，返回一个异步 token 迭代器。
+
+        参数:
+            context: 对话历史，格式同 BaseLLM.chat
+            kwargs: 额外参数，例如 temperature, max_tokens
+
+        返回:
+            一个异步可迭代对象，逐个产出字符串 token（使用 async for 消费）。
+        """
+        pass
@@ -1,6 +1,23 @@
-from openai import OpenAI, APIError
-from typing import Iterable, Dict, Any
-from ai_agent_factory.llms.base_llm import BaseLLM
+from openai import OpenAI, AsyncOpenAI, APIError
+from typing import Iterable, AsyncIterator, Dict, Any
+from ai_agent_factory.llms.base_llm import BaseLLM, AsyncBaseLLM
+
+
+def _validate_context(context: list[Dict[str, str]]):
+    """验证上下文格式"""
+    for msg in context:
+        if not isinstance(msg, dict) or "role" not in msg or "content" not in msg:
+            raise ValueError("Each message in context must be a dict with 'role' and 'content' keys")
+
+
+def _build_params(temperature: float, max_tokens: int, kwargs: dict) -> Dict[str, Any]:
+    """构建 API 参数"""
+    params = {"temperature": temperature}
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    params.update(kwargs)
+    return params
+
 
 class OpenAILLM(BaseLLM):
     def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1", model_name: str = "gpt-4o-mini"):
@@ -25,16 +42,8 @@ class OpenAILLM(BaseLLM):
             APIError: 如果 OpenAI API 调用失败
             Exception: 其他未预期的错误
         """
-        # 验证上下文格式
-        for msg in context:
-            if not isinstance(msg, dict) or "role" not in msg or "content" not in msg:
-                raise ValueError("Each message in context must be a dict with 'role' and 'content' keys")
-
-        # 构建 API 参数
-        params = {"temperature": temperature}
-        if max_tokens is not None:
-            params["max_tokens"] = max_tokens
-        params.update(kwargs)
+        _validate_context(context)
+        params = _build_params(temperature, max_tokens, kwargs)
 
         try:
             with self.client.chat.completions.create(
@@ -50,4 +59,48 @@ class OpenAILLM(BaseLLM):
         except APIError as e:
             raise Exception(f"OpenAI API error: {str(e)}")
         except Exception as e:
-            raise Exception(f"Unexpected error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Unexpected error: {str(e)}")
+
+
+class AsyncOpenAILLM(AsyncBaseLLM):
+    """
+    基于 AsyncOpenAI 客户端的异步实现，多个会话可共享同一个事件循环和连接池。
+    """
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1", model_name: str = "gpt-4o-mini"):
+        super().__init__(api_key, base_url, model_name)
+        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+
+    async def achat(self, context: list[Dict[str, str]], temperature: float = 0.7, max_tokens: int = None, **kwargs) -> AsyncIterator[str]:
+        """
+        异步流式对话，参数与 OpenAILLM.chat 相同。
+
+        Yields:
+            流式返回的 token（异步）
+
+        Raises:
+            ValueError: 如果 context 格式不正确
+            Exception: API 调用失败或其他未预期的错误
+        """
+        _validate_context(context)
+        params = _build_params(temperature, max_tokens, kwargs)
+
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=context,
+                stream=True,
+                **params
+            )
+            async with response:
+                async for event in response:
+                    delta = event.choices[0].delta if event.choices else None
+                    if delta and delta.content:
+                        yield delta.content
+        except APIError as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Unexpected error: {str(e)}")
+
+    async def aclose(self):
+        """关闭底层 HTTP 连接池"""
+        await self.client.close()
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Iterable, Dict, Any
+from ai_agent_factory.llms.base_llm import BaseLLM
+
+
+def make_context_key(model_name: str, context: list[Dict[str, str]], params: Dict[str, Any] = None) -> str:
+    """
+    计算请求的规范化哈希：模型名 + 采样参数 + 消息列表。
+
+    仅保留消息的 role/content，并统一换行符，保证同一上下文得到同一个 key。
+    """
+    messages = [
+        [msg.get("role", ""), str(msg.get("content", "")).replace("\r\n", "\n")]
+        for msg in context
+    ]
+    payload = json.dumps(
+        {"model": model_name, "params": params or {}, "messages": messages},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedLLM(BaseLLM):
+    """
+    带磁盘缓存的 LLM 包装器。
+
+    对相同的（模型、参数、上下文）直接回放缓存中的完整 token 序列，保持原始分块，
+    缓存存放在 SQLite 中，按总字节数做 LRU 淘汰。只有完整结束的流才会被写入缓存。
+    建议配合固定 temperature（如 default_params={"temperature": 0}）使用。
+    """
+
+    def __init__(self, llm: BaseLLM, cache_path: str = None, max_bytes: int = 256 * 1024 * 1024,
+                 default_params: Dict[str, Any] = None):
+        """
+        参数:
+            llm (BaseLLM): 被包装的语言模型。
+            cache_path (str, optional): SQLite 文件路径，默认 ~/.codegenius/llm_cache.sqlite。
+            max_bytes (int, optional): 缓存总大小上限（字节），超出后淘汰最久未使用的条目。
+            default_params (dict, optional): 每次请求的默认参数，会参与缓存 key 计算。
+        """
+        super().__init__(llm.api_key, llm.base_url, llm.model_name)
+        self.llm = llm
+        self.max_bytes = max_bytes
+        self.default_params = dict(default_params or {})
+        self.cache_path = cache_path or os.path.join(os.path.expanduser("~"), ".codegenius", "llm_cache.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, chunks TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+
+    def chat(self, context: list[Dict[str, str]], **kwargs) -> Iterable[str]:
+        """
+        命中缓存时按原始分块回放，否则调用底层模型并在流结束后写入缓存。
+        """
+        params = dict(self.default_params)
+        params.update(kwargs)
+        key = make_context_key(self.model_name, context, params)
+
+        chunks = self._get(key)
+        if chunks is not None:
+            self.hits += 1
+            yield from chunks
+            return
+
+        self.misses += 1
+        recorded = []
+        for token in self.llm.chat(context, **params):
+            recorded.append(token)
+            yield token
+        self._put(key, recorded)
+
+    def _get(self, key: str):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT chunks FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def _put(self, key: str, chunks: list[str]):
+        data = json.dumps(chunks, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, chunks, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        """按 last_access 从旧到新淘汰，直到总大小不超过 max_bytes（调用方需持有锁）"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": size}
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        self._conn.close()
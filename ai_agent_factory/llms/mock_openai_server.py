@@ -0,0 +1,218 @@
+"""
+本地 OpenAI 兼容模拟服务器，用于对流式链路（OpenAILLM / CLI / GUI）做压测。
+
+实现 /v1/chat/completions（支持 SSE 流式与非流式）和 /v1/models，可配置：
+    - 每秒 token 数（tokens/sec）与首 token 延迟（TTFT）
+    - 错误注入：按比例返回 HTTP 错误，或在流中途断开连接
+    - 脚本化回复：按顺序循环返回预设内容（默认包含 <create_file>/<read_file> 标签）
+
+用法：
+    python -m ai_agent_factory.llms.mock_openai_server --port 8000 --tps 50 --ttft 0.3
+    然后设置 BASE_URL=http://127.0.0.1:8000/v1 即可让 OpenAILLM 指向它。
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSES = [
+    "先看一下项目结构。\n<list_files filter=\"*.py\" />\n<read_file path=\"main.py\" />\n",
+    "好的，创建入口文件：\n<create_file path=\"main.py\">\n"
+    "import logging\n\n\ndef main() -> None:\n    logging.basicConfig(level=logging.INFO)\n"
+    "    logging.info(\"hello\")\n\n\nif __name__ == \"__main__\":\n    main()\n"
+    "</create_file>\n",
+    "任务已完成，main.py 已创建。",
+]
+
+
+class MockConfig:
+    """模拟服务器的运行参数"""
+
+    def __init__(self, tokens_per_sec: float = 50.0, ttft: float = 0.3, error_rate: float = 0.0,
+                 error_status: int = 500, drop_rate: float = 0.0, responses: list[str] = None,
+                 model_name: str = "mock-model"):
+        self.tokens_per_sec = tokens_per_sec
+        self.ttft = ttft
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.drop_rate = drop_rate
+        self.responses = responses or DEFAULT_RESPONSES
+        self.model_name = model_name
+        self._cycle = itertools.cycle(self.responses)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def next_response(self) -> str:
+        with self._lock:
+            self.requests += 1
+            return next(self._cycle)
+
+
+def _tokenize(text: str) -> list[str]:
+    """把回复切成类似模型输出的小块（单词连同前导空白）"""
+    return re.findall(r'\s*\S+|\s+', text)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: MockConfig = None  # 由 make_server 注入
+
+    def log_message(self, format, *args):
+        pass  # 压测时不打印每个请求
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": self.config.model_name, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        config = self.config
+        if config.error_rate and random.random() < config.error_rate:
+            self._send_json(config.error_status, {"error": {"message": "Injected error", "type": "mock_error"}})
+            return
+
+        text = config.next_response()
+        model = body.get("model", config.model_name)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if body.get("stream"):
+            self._stream(completion_id, model, text)
+        else:
+            generation = len(_tokenize(text)) / config.tokens_per_sec if config.tokens_per_sec > 0 else 0
+            time.sleep(config.ttft + generation)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            })
+
+    def _stream(self, completion_id: str, model: str, text: str):
+        config = self.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta: dict, finish_reason=None) -> dict:
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        tokens = _tokenize(text)
+        drop_at = random.randrange(len(tokens)) if tokens and config.drop_rate and random.random() < config.drop_rate else None
+        interval = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0
+        try:
+            time.sleep(config.ttft)
+            self._write_event(chunk({"role": "assistant", "content": ""}))
+            for i, token in enumerate(tokens):
+                if i == drop_at:
+                    # 模拟连接中途断开：不发送结束块直接关闭
+                    self.close_connection = True
+                    return
+                if interval:
+                    time.sleep(interval)
+                self._write_event(chunk({"content": token}))
+            self._write_event(chunk({}, "stop"))
+            self._write_raw(b"data: [DONE]\n\n")
+            self._write_raw(b"")  # 结束 chunked 编码
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _write_event(self, data: dict):
+        self._write_raw(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write_raw(self, payload: bytes):
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, data: dict):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 1024  # 支持数百个并发连接
+    daemon_threads = True
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8000, config: MockConfig = None) -> MockHTTPServer:
+    """创建模拟服务器（port=0 时自动分配端口，可通过 server.server_address 获取）"""
+    handler = type("ConfiguredMockOpenAIHandler", (MockOpenAIHandler,), {"config": config or MockConfig()})
+    return MockHTTPServer((host, port), handler)
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, config: MockConfig = None):
+    """在后台线程中启动模拟服务器，返回 (server, base_url)，用完调用 server.shutdown()"""
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def load_responses(script_path: str) -> list[str]:
+    """读取脚本化回复：JSON 字符串数组，或以单独一行 '---' 分隔的纯文本"""
+    with open(script_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if script_path.endswith(".json"):
+        return json.loads(text)
+    return [part.strip("\n") for part in re.split(r'^---\s*$', text, flags=re.MULTILINE) if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--tps", type=float, default=50.0, help="每秒输出 token 数（0 表示不限速）")
+    parser.add_argument("--ttft", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 错误的比例 0~1")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误时的 HTTP 状态码")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="流式响应中途断开的比例 0~1")
+    parser.add_argument("--script", help="脚本化回复文件（.json 字符串数组或以 --- 分隔的文本）")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        tokens_per_sec=args.tps,
+        ttft=args.ttft,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        drop_rate=args.drop_rate,
+        responses=load_responses(args.script) if args.script else None,
+    )
+    server = make_server(args.host, args.port, config)
+    print(f"🚀 模拟服务器已启动: BASE_URL=http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Iterable, Dict
+from ai_agent_factory.llms.base_llm import BaseLLM
+from ai_agent_factory.llms.cached_llm import make_context_key
+
+
+class RecordingLLM(BaseLLM):
+    """
+    录制型 LLM 包装器：把每次请求的流式分块及其间隔写入 JSONL 磁带（cassette）。
+
+    磁带格式（每行一个 JSON）：
+        {"type": "request", "turn": 1, "key": "...", "model": "..."}
+        {"type": "chunk", "turn": 1, "delay": 0.0213, "token": "..."}
+        {"type": "end", "turn": 1, "elapsed": 1.52}
+    delay 为向上游请求下一个分块到收到它的秒数（首个分块含请求延迟），
+    不包含调用方处理分块（执行工具、刷新界面）的时间，回放时才不会重复计入。
+    """
+
+    def __init__(self, llm: BaseLLM, cassette_path: str):
+        super().__init__(llm.api_key, llm.base_url, llm.model_name)
+        self.llm = llm
+        self.cassette_path = cassette_path
+        os.makedirs(os.path.dirname(os.path.abspath(cassette_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._turn = self._last_turn(cassette_path)  # 追加录制时续接已有轮次编号
+
+    @staticmethod
+    def _last_turn(cassette_path: str) -> int:
+        if not os.path.exists(cassette_path):
+            return 0
+        last = 0
+        with open(cassette_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    last = max(last, json.loads(line)["turn"])
+        return last
+
+    def chat(self, context: list[Dict[str, str]], **kwargs) -> Iterable[str]:
+        with self._lock:
+            self._turn += 1
+            turn = self._turn
+        key = make_context_key(self.model_name, context, kwargs)
+        lines = [{"type": "request", "turn": turn, "key": key, "model": self.model_name}]
+
+        start = time.perf_counter()
+        try:
+            stream = iter(self.llm.chat(context, **kwargs))
+            while True:
+                requested = time.perf_counter()
+                try:
+                    token = next(stream)
+                except StopIteration:
+                    break
+                delay = time.perf_counter() - requested
+                lines.append({"type": "chunk", "turn": turn, "delay": round(delay, 6), "token": token})
+                yield token
+            lines.append({"type": "end", "turn": turn, "elapsed": round(time.perf_counter() - start, 6)})
+        finally:
+            # 即使流被中断也写入已收到的部分，回放时按不完整的轮次处理
+            self._write(lines)
+
+    def _write(self, lines: list[dict]):
+        with self._lock:
+            with open(self.cassette_path, 'a', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+class ReplayLLM(BaseLLM):
+    """
+    回放型 LLM：按录制的分块和间隔回放磁带，无需网络。
+
+    speed 控制回放速度：1.0 为原速，大于 1 为加速（如 10 表示 10 倍速），0 表示不等待。
+    match_by_key=True 时按上下文哈希匹配录制内容（同一上下文多次录制时依次回放），
+    否则按录制顺序逐轮回放。
+    """
+
+    def __init__(self, cassette_path: str, speed: float = 1.0, match_by_key: bool = True, model_name: str = None):
+        self.turns = self._load(cassette_path)
+        recorded_model = next((t["model"] for t in self.turns if t.get("model")), "replay")
+        super().__init__("", "", model_name or recorded_model)
+        self.cassette_path = cassette_path
+        self.recorded_model = recorded_model
+        self.speed = speed
+        self.match_by_key = match_by_key
+        self._lock = threading.Lock()
+        self._sequence = deque(self.turns)
+        self._by_key: Dict[str, deque] = {}
+        for t in self.turns:
+            self._by_key.setdefault(t["key"], deque()).append(t)
+
+    @staticmethod
+    def _load(cassette_path: str) -> list[dict]:
+        turns = {}
+        with open(cassette_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                turn = turns.setdefault(item["turn"], {"turn": item["turn"], "key": None, "model": None, "chunks": [], "complete": False})
+                if item["type"] == "request":
+                    turn["key"] = item["key"]
+                    turn["model"] = item.get("model")
+                elif item["type"] == "chunk":
+                    turn["chunks"].append((item["delay"], item["token"]))
+                elif item["type"] == "end":
+                    turn["complete"] = True
+        return [turns[k] for k in sorted(turns)]
+
+    def chat(self, context: list[Dict[str, str]], **kwargs) -> Iterable[str]:
+        turn = self._next_turn(context, kwargs)
+        for delay, token in turn["chunks"]:
+            if self.speed and delay > 0:
+                time.sleep(delay / self.speed)
+            yield token
+        if not turn["complete"]:
+            raise Exception(f"录制的第 {turn['turn']} 轮不完整（录制时流被中断）")
+
+    def _next_turn(self, context: list[Dict[str, str]], kwargs: dict) -> dict:
+        with self._lock:
+            if self.match_by_key:
+                key = make_context_key(self.recorded_model, context, kwargs)
+                queue = self._by_key.get(key)
+                if not queue:
+                    raise KeyError(f"磁带中没有匹配当前上下文的录制: {key[:12]}")
+                turn = queue.popleft()
+                self._sequence.remove(turn)
+                return turn
+            if not self._sequence:
+                raise IndexError("磁带已回放完毕")
+            turn = self._sequence.popleft()
+            self._by_key[turn["key"]].remove(turn)
+            return turn
@@ -0,0 +1,371 @@
+"""
+文件内容搜索（grep）：并行扫描项目文件，返回 path:line:text 形式的命中行。
+
+    - 文件较少时用线程池读取并匹配；文件较多时按块分给进程池，避免正则匹配受 GIL 限制
+    - 跳过二进制文件、超大文件；忽略目录（.git、node_modules、.gitignore 规则等）由 PathIndex 在遍历时剪枝
+    - 可选的持久化三元组倒排索引（.codegenius/grep_index.json.z）：从正则中提取必需的字面量，
+      只扫描包含其全部三元组的文件；索引按 (mtime_ns, size) 增量更新，重复搜索不必重扫全部磁盘内容
+"""
+import os
+import re
+import json
+import zlib
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ai_agent_factory.utils.process_pool import get_process_pool
+from ai_agent_factory.utils.path_index import glob_match
+from ai_agent_factory.utils.state_dir import make_dirs
+
+MAX_FILE_SIZE = 2 * 1024 * 1024   # 超过该大小的文件不搜索
+MAX_LINE_LENGTH = 200             # 返回的单行文本最大长度
+PROCESS_POOL_THRESHOLD = 2000     # 候选文件数超过该值时使用进程池
+AUTO_INDEX_THRESHOLD = 5000       # use_index=None 时，文件数超过该值自动启用索引
+INDEX_FILE = os.path.join(".codegenius", "grep_index.json.z")
+_INDEX_VERSION = 1
+_CHUNK_SIZE = 200
+
+_REGEX_META = set(".^$*+?{}[]\\|()")
+_HIT_PATH = re.compile(r"(.*?):\d+:")
+
+
+def _is_binary(data: bytes) -> bool:
+    return b"\0" in data[:8192]
+
+
+def _read_text(full_path: str):
+    """读取文本文件；二进制、超大或无法读取时返回 None"""
+    try:
+        if os.path.getsize(full_path) > MAX_FILE_SIZE:
+            return None
+        with open(full_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if _is_binary(data):
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _scan_text(rel_path: str, text: str, regex, limit: int) -> list[str]:
+    hits = []
+    if not regex.search(text):
+        return hits  # 整个文件没有命中时无需逐行匹配
+    for lineno, line in enumerate(text.splitlines(), 1):
+        if regex.search(line):
+            line = line.strip()
+            if len(line) > MAX_LINE_LENGTH:
+                line = line[:MAX_LINE_LENGTH] + "..."
+            hits.append(f"{rel_path}:{lineno}:{line}")
+            if len(hits) >= limit:
+                break
+    return hits
+
+
+def _scan_chunk(root: str, rel_paths: list, pattern: str, flags: int, limit: int) -> list[str]:
+    """扫描一批文件（模块级函数，便于进程池序列化）"""
+    regex = re.compile(pattern, flags)
+    hits = []
+    for rel in rel_paths:
+        text = _read_text(os.path.join(root, *rel.split("/")))
+        if text is None:
+            continue
+        hits.extend(_scan_text(rel, text, regex, limit - len(hits)))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+def _file_trigrams(full_path: str):
+    """文件内容（小写）的三元组集合，拼接成字符串存储；二进制/超大文件返回 None"""
+    text = _read_text(full_path)
+    if text is None:
+        return None
+    lowered = text.lower()
+    return "".join(sorted({lowered[i:i + 3] for i in range(len(lowered) - 2)}))
+
+
+def required_literals(pattern: str) -> list[str]:
+    """
+    从正则中提取所有匹配都必须包含的字面量片段（保守估计）。
+    含顶层以外的复杂结构时只取能确定的部分；含 | 时无法确定，返回空列表。
+    """
+    if "|" in pattern:
+        return []
+    literals, current = [], []
+    i, n = 0, len(pattern)
+    depth = 0
+
+    def flush():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    while i < n:
+        c = pattern[i]
+        if c == "\\":
+            nxt = pattern[i + 1] if i + 1 < n else ""
+            if nxt and not nxt.isalnum():
+                if depth == 0:
+                    current.append(nxt)
+                else:
+                    flush()
+            else:
+                flush()  # \d \w \b 等
+            i += 2
+            continue
+        if c in "?*{":
+            # 前一个字符可选或可重复零次：从当前片段中去掉
+            if current:
+                current.pop()
+            flush()
+            if c == "{":
+                close = pattern.find("}", i)
+                i = close + 1 if close > 0 else i + 1
+                continue
+        elif c == "+":
+            flush()
+        elif c == "(":
+            depth += 1
+            flush()
+        elif c == ")":
+            depth = max(depth - 1, 0)
+            flush()
+            # 分组后的量词可能使整个分组可选，保守起见分组内的字面量本就未收集
+        elif c == "[":
+            flush()
+            close = pattern.find("]", i + 2)
+            i = close + 1 if close > 0 else n
+            continue
+        elif c in _REGEX_META:
+            flush()
+        elif depth == 0:
+            current.append(c)
+        else:
+            flush()
+        i += 1
+    flush()
+    return [lit for lit in literals if len(lit) >= 3]
+
+
+class TrigramContentIndex:
+    """
+    持久化的文件内容三元组索引。
+
+    内存结构:
+        _files: 路径 -> (mtime_ns, size, 三元组集合或 None)
+        _postings: 三元组 -> 路径集合
+    """
+
+    def __init__(self, root: str, index_path: str = None):
+        self.root = root
+        self.index_path = index_path or os.path.join(root, INDEX_FILE)
+        self._files: dict[str, tuple] = {}
+        self._postings: dict[str, set] = {}
+        self._loaded = False
+        self._dirty = False
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.index_path, "rb") as f:
+                data = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            return
+        if data.get("version") != _INDEX_VERSION:
+            return
+        for rel, (mtime, size, grams) in data.get("files", {}).items():
+            self._add(rel, mtime, size, grams)
+
+    def save(self):
+        if not self._dirty:
+            return
+        files = {
+            rel: [mtime, size, "".join(sorted(grams)) if grams is not None else None]
+            for rel, (mtime, size, grams) in self._files.items()
+        }
+        payload = zlib.compress(json.dumps({"version": _INDEX_VERSION, "files": files}).encode("utf-8"), 6)
+        make_dirs(os.path.dirname(self.index_path))
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def _add(self, rel: str, mtime: int, size: int, grams):
+        gram_set = None
+        if grams is not None:
+            gram_set = {grams[i:i + 3] for i in range(0, len(grams), 3)}
+            for gram in gram_set:
+                self._postings.setdefault(gram, set()).add(rel)
+        self._files[rel] = (mtime, size, gram_set)
+
+    def _remove(self, rel: str):
+        entry = self._files.pop(rel, None)
+        if entry and entry[2]:
+            for gram in entry[2]:
+                paths = self._postings.get(gram)
+                if paths is not None:
+                    paths.discard(rel)
+                    if not paths:
+                        del self._postings[gram]
+
+    def update(self, rel_paths: list, executor: ThreadPoolExecutor):
+        """按 (mtime_ns, size) 同步索引：只重新读取新增或变化的文件"""
+        if not self._loaded:
+            self._load()
+        current = set(rel_paths)
+        for rel in [rel for rel in self._files if rel not in current]:
+            self._remove(rel)
+            self._dirty = True
+        changed = []
+        for rel in rel_paths:
+            try:
+                st = os.stat(os.path.join(self.root, *rel.split("/")))
+            except OSError:
+                continue
+            entry = self._files.get(rel)
+            if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+                changed.append((rel, st.st_mtime_ns, st.st_size))
+        if not changed:
+            return
+        results = executor.map(
+            lambda item: _file_trigrams(os.path.join(self.root, *item[0].split("/"))), changed
+        )
+        for (rel, mtime, size), grams in zip(changed, results):
+            self._remove(rel)
+            self._add(rel, mtime, size, grams)
+        self._dirty = True
+
+    def candidates(self, literals: list[str]):
+        """包含全部字面量三元组的文件集合；无法利用索引时返回 None"""
+        grams = set()
+        for lit in literals:
+            lowered = lit.lower()
+            grams.update(lowered[i:i + 3] for i in range(len(lowered) - 2))
+        if not grams:
+            return None
+        result = None
+        for gram in sorted(grams, key=lambda g: len(self._postings.get(g, ()))):
+            paths = self._postings.get(gram)
+            if not paths:
+                return set()
+            result = set(paths) if result is None else result & paths
+            if not result:
+                break
+        return result
+
+
+class ContentSearcher:
+    """项目文件内容搜索"""
+
+    def __init__(self, root: str, path_index, max_workers: int = 8, use_index: bool = None):
+        """
+        参数:
+            root: 搜索根目录
+            path_index: PathIndex 实例，用于获取文件列表（不再 os.walk）
+            max_workers: 线程池大小（进程池为全进程共享，见 process_pool）
+            use_index: True 启用持久化三元组索引；False 不启用；None 时文件数较多才启用
+        """
+        self.root = os.path.abspath(root)
+        self.path_index = path_index
+        self.max_workers = max_workers
+        self.use_index = use_index
+        self._index = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="grep")
+        return self._executor
+
+    @staticmethod
+    def _filter_match(rel: str, file_filter: str) -> bool:
+        """单个路径是否属于 _candidate_files 的结果"""
+        if glob_match(rel, file_filter):
+            return True
+        return "/" not in file_filter and fnmatch.fnmatch(rel.rpartition("/")[2], file_filter)
+
+    def _candidate_files(self, file_filter: str = None) -> list[str]:
+        files = self.path_index.glob(file_filter) if file_filter else self.path_index.all_files()
+        if file_filter and "/" not in file_filter:
+            # 不含目录的过滤模式（如 *.py）同时按文件名匹配，任意层级都能命中
+            names = {p for p in self.path_index.all_files() if fnmatch.fnmatch(p.rpartition("/")[2], file_filter)}
+            files = sorted(names.union(files))
+        return files
+
+    def search(self, pattern: str, file_filter: str = None, max_matches: int = 100,
+               ignore_case: bool = False, literal: bool = False, overlay: dict = None) -> dict:
+        """
+        搜索文件内容。
+
+        参数:
+            overlay: 进行中事务的暂存改动 {路径: 暂存文件或 None(删除)}；
+                     这些路径按暂存内容搜索（已删除的不搜索），其余文件按磁盘内容搜索
+
+        返回:
+            {"matches": ["path:line:text", ...], "truncated": bool, "files_scanned": int, "indexed": bool}
+        异常:
+            re.error: 正则无效
+        """
+        regex_source = re.escape(pattern) if literal else pattern
+        flags = re.IGNORECASE if ignore_case else 0
+        re.compile(regex_source, flags)  # 提前暴露无效正则
+
+        files = self._candidate_files(file_filter)
+        staged = {}
+        if overlay:
+            files = [p for p in files if p not in overlay]
+            staged = {rel: path for rel, path in overlay.items()
+                      if path is not None and (not file_filter or self._filter_match(rel, file_filter))}
+        indexed = False
+        with self._lock:
+            use_index = self.use_index if self.use_index is not None else len(files) >= AUTO_INDEX_THRESHOLD
+            if use_index:
+                if self._index is None:
+                    self._index = TrigramContentIndex(self.root)
+                self._index.update(self.path_index.all_files(), self._get_executor())
+                self._index.save()
+                candidates = self._index.candidates([pattern] if literal else required_literals(pattern))
+                if candidates is not None:
+                    files = [p for p in files if p in candidates]
+                    indexed = True
+
+        limit = max_matches + 1  # 多取一条以判断是否截断
+        chunks = [files[i:i + _CHUNK_SIZE] for i in range(0, len(files), _CHUNK_SIZE)]
+        matches = []
+        if len(files) >= PROCESS_POOL_THRESHOLD:
+            pool = get_process_pool()
+            futures = [pool.submit(_scan_chunk, self.root, chunk, regex_source, flags, limit) for chunk in chunks]
+            for future in futures:  # 按文件顺序合并，数量够了就取消剩余任务
+                matches.extend(future.result())
+                if len(matches) >= limit:
+                    for rest in futures:
+                        rest.cancel()
+                    break
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(_scan_chunk, self.root, [p], regex_source, flags, limit) for p in files]
+            for future in futures:
+                if len(matches) >= limit:
+                    future.cancel()
+                    continue
+                matches.extend(future.result())
+
+        if staged:
+            regex = re.compile(regex_source, flags)
+            for rel in sorted(staged):
+                text = _read_text(staged[rel])
+                if text is not None:
+                    matches.extend(_scan_text(rel, text, regex, limit))
+            # 按路径稳定排序（同一文件内保持行号顺序）；磁盘部分只截到 limit，不影响前 limit 条的正确性
+            matches.sort(key=lambda hit: _HIT_PATH.match(hit).group(1))
+            matches = matches[:limit]
+
+        return {
+            "matches": matches[:max_matches],
+            "truncated": len(matches) > max_matches,
+            "files_scanned": len(files) + len(staged),
+            "indexed": indexed,
+        }
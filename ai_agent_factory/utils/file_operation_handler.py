@@ -1,11 +1,36 @@
 import re
 import os
-import fnmatch
-
-def parse_structured_operations(text: str):
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from ai_agent_factory.utils.path_index import PathIndex, glob_match
+from ai_agent_factory.utils.ignore_rules import IgnoreRules
+from ai_agent_factory.utils.path_search import PathTrigramIndex, subsequence_search
+from ai_agent_factory.utils.content_search import ContentSearcher
+from ai_agent_factory.utils.line_index import LineIndexCache
+from ai_agent_factory.utils.patch_apply import PatchError, parse_patch, apply_hunks, atomic_write
+from ai_agent_factory.utils.snapshot_store import SnapshotStore, SnapshotError
+from ai_agent_factory.utils.file_transaction import FileTransaction, TransactionError
+from ai_agent_factory.utils.read_cache import ReadCache
+from ai_agent_factory.utils.symbol_index import SymbolIndex, format_outline, find_symbol
+from ai_agent_factory.utils.repo_map import RepoMap
+from ai_agent_factory.utils.result_serializer import ResultStore
+from ai_agent_factory.utils.fork_workspace import ForkWorkspace
+from ai_agent_factory.utils.stream_tag_parser import StreamingTagParser, parse_operations, parse_attributes as _parse_attributes
+
+def parse_structured_operations(text: str, tags=None, void_tags=None):
     """
-    安全解析结构化文件操作指令
+    安全解析结构化文件操作指令（单次扫描的状态机，按文档顺序返回）
     支持：<tag attr="val">content</tag> 和 <tag attr="val" />
+
+    参数:
+        tags: 只识别这些标签名；为 None 时识别任意标签
+        void_tags: 没有内容的标签名，省略结尾的 / 也按自闭合处理
+    """
+    return parse_operations(text, tags, void_tags)
+
+
+def parse_structured_operations_regex(text: str):
+    """
+    基于正则的旧版解析器（先返回全部闭合标签，再返回自闭合标签），仅用于基准对比
     """
     if not text or not isinstance(text, str):
         return []
@@ -46,16 +71,12 @@ def parse_structured_operations(text: str):
     return operations
 
 
-def _parse_attributes(attr_str: str) -> dict:
-    """解析属性字符串为字典"""
-    if not attr_str:
-        return {}
-    attrs = {}
-    # 匹配 key="value" 或 key='value'
-    pattern = r'(\w+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')'
-    for key, v1, v2 in re.findall(pattern, attr_str):
-        attrs[key] = v1 or v2
-    return attrs
+def has_file_operations_regex(text: str) -> bool:
+    """基于正则的旧版操作检测，仅用于基准对比"""
+    if not text or not isinstance(text, str):
+        return False
+    pattern = r'<(' + '|'.join(FileOperationHandler.OPERATION_TAGS) + r')\s*[^>]*/?\s*(?:>|/>|>.*?</\1>)'
+    return bool(re.search(pattern, text, re.IGNORECASE | re.DOTALL))
 
 
 # ===========================
@@ -65,6 +86,23 @@ def _parse_attributes(attr_str: str) -> dict:
 class FileOperationHandler:
     """文件操作指令处理器 - 支持结构化标签语法"""
 
+    # 支持的操作标签
+    OPERATION_TAGS = (
+        'create_file', 'read_file', 'update_file', 'edit_file',
+        'delete_file', 'list_files', 'list_dir', 'find_file', 'grep', 'outline', 'read_symbol', 'recall', 'again'
+    )
+    # 没有内容的标签：模型漏写结尾的 / 时也按自闭合处理
+    VOID_TAGS = (
+        'read_file', 'delete_file', 'list_files', 'list_dir', 'find_file', 'grep', 'outline', 'read_symbol',
+        'recall', 'again'
+    )
+    # 只读操作：可以在模型仍在输出时提前执行
+    READ_ONLY_OPERATIONS = {"READ_FILE", "LIST_FILES", "LIST_DIR", "FIND_FILE", "GREP", "OUTLINE", "READ_SYMBOL", "RECALL"}
+    # 写操作：按路径影响文件树
+    WRITE_OPERATIONS = {"CREATE_FILE", "UPDATE_FILE", "EDIT_FILE", "DELETE_FILE"}
+    # 单次 read_file 返回的最大字节数，超出时只返回第一页并提示续读
+    MAX_READ_BYTES = 64 * 1024
+
     @staticmethod
     def get_file_operation_prompt():
         """获取支持结构化标签的提示词"""
@@ -76,12 +114,24 @@ class FileOperationHandler:
             "文件内容（支持多行）\n"
             "</create_file>\n\n"
 
-            "<read_file path=\"文件名\" />\n\n"
+            "<read_file path=\"文件名\" start_line=\"可选，起始行\" end_line=\"可选，结束行\" />\n"
+            "  <!-- 行号从 1 开始；大文件只返回第一页，结果中的 next_start_line 用于继续读取；\n"
+            "       单行过长时该行也分页，结果中另有 next_line_offset，续读时作为 line_offset 属性传入 -->\n\n"
 
             "<update_file path=\"相对路径\">\n"
             "新内容\n"
             "</update_file>\n\n"
 
+            "<edit_file path=\"相对路径\">\n"
+            "<<<<<<< SEARCH\n"
+            "要替换的原内容（需与文件中的内容一致，包含足够的上下文以唯一定位）\n"
+            "=======\n"
+            "新内容\n"
+            ">>>>>>> REPLACE\n"
+            "</edit_file>\n"
+            "  <!-- 可包含多个 SEARCH/REPLACE 块，也可以使用 unified diff（@@ -行号,行数 +行号,行数 @@） -->\n"
+            "  <!-- 修改已有文件的局部内容时优先使用 edit_file，不要用 update_file 重写整个文件 -->\n\n"
+
             "<delete_file path=\"文件名\" />\n\n"
 
             "<list_files filter=\"可选的文件名或路径过滤模式（如 *.py, log/*.log）\" />\n"
@@ -92,21 +142,66 @@ class FileOperationHandler:
             "  <!-- 无 filter：仅列出该目录下文件（不递归） -->\n"
             "  <!-- 有 filter：递归搜索该目录及其子目录并匹配 -->\n\n"
 
+            "<find_file query=\"关键词，如 redis client\" limit=\"可选，默认 10\" />\n"
+            "  <!-- 按文件路径模糊搜索，一次返回最相关的若干文件；不确定文件位置时优先使用 -->\n\n"
+
+            "<outline path=\"Python 文件路径\" />\n"
+            "  <!-- 返回文件中的类、函数、方法的签名与行号范围，不返回函数体 -->\n\n"
+
+            "<read_symbol path=\"Python 文件路径\" name=\"类名.方法名 或 函数名\" />\n"
+            "  <!-- 只返回该类/函数的源码；了解结构先用 outline，需要细节再 read_symbol，避免读取整个文件 -->\n\n"
+
+            "<grep pattern=\"正则表达式\" filter=\"可选的文件过滤模式（如 *.py）\" ignore_case=\"可选 true\" />\n"
+            "  <!-- 搜索文件内容，返回 路径:行号:内容；查找定义或引用时优先使用，避免逐个读取文件 -->\n\n"
+
+            "<recall handle=\"r12\" />\n"
+            "  <!-- 取回已折叠的操作结果原文（句柄见结果块开头的 @rN） -->\n\n"
+
             "📌 规则说明：\n"
             "- 所有路径相对于 output/ 目录\n"
             "- 不允许 ../ 路径穿越\n"
             "- 更新文件之前必须要先阅读文件\n"
             "- `filter` 支持通配符：`*` 匹配任意字符，`?` 匹配单个字符\n"
             "- 过滤时，匹配的是 **相对于 output/ 的完整路径**（例如：log/app_2024-06-25.log）\n"
+            "- 列出与搜索会跳过 .git、node_modules、虚拟环境、构建输出及 .gitignore / .codegeniusignore 中的路径\n"
             "- 内容可包含换行、冒号、引号等字符\n"
+            "- 操作结果以 <<@rN 操作名 ok|error 字段=值 ...>> 块返回，文件内容等正文在块头之后、@rN>> 之前；"
+            "较早的大段结果会折叠为一行摘要\n"
             "- 如果需要分步决策，请返回 <again reason=\"...\" />\n"
             "- 系统将自动执行并反馈结果，您可以基于新状态继续操作。\n\n"
         )
 
-    def __init__(self, output_dir="output"):
+    def __init__(self, output_dir="output", parallel: bool = False, max_workers: int = 8,
+                 search_index: bool = None, transactional: bool = False,
+                 read_cache_bytes: int = 64 * 1024 * 1024, use_defaults: bool = True, extra_patterns: list = None):
+        """
+        参数:
+            output_dir: 操作的根目录
+            parallel: 是否并行执行同一回复中互不依赖的操作（同一路径上的写操作仍保持先后顺序）
+            max_workers: 线程池大小
+            search_index: grep 是否使用持久化三元组索引（None 表示文件较多时自动启用）
+            transactional: 是否以事务方式执行一次回复中的写操作（任一写操作失败则全部不生效）
+            read_cache_bytes: 读取缓存的大小上限（字节），0 表示不缓存
+            use_defaults: 是否跳过内置的忽略目录（.git、node_modules、虚拟环境、根目录下的 build/dist 等）
+            extra_patterns: 额外的忽略规则（gitignore 语法，相对于 output_dir，可用 ! 取反）
+        """
         self.output_dir = os.path.abspath(output_dir)
         os.makedirs(self.output_dir, exist_ok=True)
         self.created_files = []  # 记录成功创建的文件路径
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self._executor = None  # 提前执行/并行执行操作用的线程池（按需创建）
+        self.path_index = PathIndex(self.output_dir, ignore=IgnoreRules(self.output_dir, use_defaults, extra_patterns))  # 文件路径索引（首次列出文件时构建）
+        self.content_search = ContentSearcher(self.output_dir, self.path_index, max_workers, search_index)
+        self.line_index = LineIndexCache()  # 按行范围读取用的行偏移索引
+        self.read_cache = ReadCache(read_cache_bytes) if read_cache_bytes else None  # 解码后文件内容的 LRU 缓存
+        self.symbol_index = SymbolIndex(self.output_dir, self.path_index)  # Python 符号索引（按文件 mtime 缓存）
+        self.repo_map = RepoMap(self.output_dir, self.path_index, self.symbol_index)  # 会话开始时提供给模型的仓库地图
+        self.snapshots = SnapshotStore(self.output_dir)  # 写操作前的自动备份
+        self.result_store = ResultStore()  # 操作结果正文的旁路存储（供 <recall> 取回已折叠的结果）
+        self.transactional = transactional
+        self._tx = None  # 进行中的事务（事务模式下写操作先暂存到这里）
+        self.fork_workspace = None  # 由 fork() 创建的 handler 指向其分叉工作区
 
     @staticmethod
     def has_file_operations(text: str) -> bool:
@@ -115,26 +210,154 @@ class FileOperationHandler:
         :param text: 输入字符串
         :return: 是否包含操作指令
         """
-        if not text or not isinstance(text, str):
-            return False
+        return bool(parse_structured_operations(text, FileOperationHandler.OPERATION_TAGS,
+                                                FileOperationHandler.VOID_TAGS))
 
-        operation_tags = (
-            'create_file', 'read_file', 'update_file',
-            'delete_file', 'list_files', 'list_dir', 'again'
-        )
-        pattern = r'<(' + '|'.join(operation_tags) + r')\s*[^>]*/?\s*(?:>|/>|>.*?</\1>)'
-        return bool(re.search(pattern, text, re.IGNORECASE | re.DOTALL))
+    @staticmethod
+    def create_stream_parser() -> StreamingTagParser:
+        """创建只识别文件操作标签的流式解析器，供 token_deal 逐 token 输入"""
+        return StreamingTagParser(FileOperationHandler.OPERATION_TAGS, FileOperationHandler.VOID_TAGS)
     
-    def handle_tagged_file_operations(self, token: str, callback=None) -> bool:
+    @staticmethod
+    def _op_scope(op_dict: dict) -> tuple[str, str]:
+        """
+        返回操作的影响范围 (kind, path)：
+            kind 为 'read' / 'list' / 'write' / 'none'，path 为规范化的相对路径（list 为目录，'' 表示根目录）
+        """
+        op = op_dict["operation"]
+        attrs = op_dict.get("attributes") or {}
+        if op in FileOperationHandler.WRITE_OPERATIONS:
+            kind = "write"
+        elif op in ("LIST_FILES", "FIND_FILE", "GREP"):
+            return "list", ""
+        elif op == "RECALL":
+            return "none", ""
+        elif op == "LIST_DIR":
+            kind = "list"
+        elif op in FileOperationHandler.READ_ONLY_OPERATIONS:
+            kind = "read"
+        else:
+            return "none", ""
+        path = os.path.normpath(attrs.get("path") or ".").replace("\\", "/")
+        return kind, "" if path == "." else path
+
+    @staticmethod
+    def _scopes_conflict(a: tuple[str, str], b: tuple[str, str]) -> bool:
+        """两个操作是否必须保持先后顺序：至少一方是写操作，且路径重叠"""
+        if "write" not in (a[0], b[0]) or "none" in (a[0], b[0]):
+            return False
+
+        def covers(container: str, path: str) -> bool:
+            return container == "" or path == container or path.startswith(container + "/")
+
+        if a[0] == "list":
+            return covers(a[1], b[1])
+        if b[0] == "list":
+            return covers(b[1], a[1])
+        return a[1] == b[1]
+
+    def can_prefetch(self, op_dict: dict, earlier_ops: list) -> bool:
+        """只读操作且不依赖同一回复中之前的写操作时，可以提前执行"""
+        if op_dict["operation"] not in self.READ_ONLY_OPERATIONS:
+            return False
+        scope = self._op_scope(op_dict)
+        return not any(self._scopes_conflict(self._op_scope(prev), scope) for prev in earlier_ops)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="file-op")
+        return self._executor
+
+    def prefetch(self, op_dict: dict):
+        """在后台线程中提前执行只读操作，返回 Future"""
+        return self._get_executor().submit(self.execute_operation, op_dict)
+
+    def _execute_parallel(self, operations: list, prefetched: dict, on_result):
+        """
+        按依赖图并行执行操作：两个操作路径重叠且至少一方是写操作时，后者等待前者完成；
+        其余操作并发执行。on_result(i, result) 按原始顺序依次回调。
+        """
+        n = len(operations)
+        scopes = [self._op_scope(op) for op in operations]
+        dependents = [[] for _ in range(n)]
+        remaining = [0] * n
+        for j in range(n):
+            for i in range(j):
+                if self._scopes_conflict(scopes[i], scopes[j]):
+                    dependents[i].append(j)
+                    remaining[j] += 1
+
+        executor = self._get_executor()
+        running = {}
+        results = [None] * n
+        finished = [False] * n
+
+        def submit(i):
+            future = prefetched.get(i) or executor.submit(self.execute_operation, operations[i])
+            running[future] = i
+
+        for i in range(n):
+            if remaining[i] == 0:
+                submit(i)
+
+        next_emit = 0
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                results[i] = future.result()
+                finished[i] = True
+                for j in dependents[i]:
+                    remaining[j] -= 1
+                    if remaining[j] == 0:
+                        submit(j)
+            while next_emit < n and finished[next_emit]:
+                on_result(next_emit, results[next_emit])
+                next_emit += 1
+
+    def handle_tagged_file_operations(self, token: str, callback=None, operations: list = None,
+                                      prefetched: dict = None) -> bool:
+        """
+        解析并执行文本中的全部操作指令，每个操作完成后调用 callback(op, result)。
+        已解析好的 operations 可直接传入，避免重复解析；
+        prefetched 为 {操作下标: Future}，这些只读操作已在流式输出期间提前执行，直接取结果。
+        """
+        prefetched = prefetched or {}
         try:
-            operations = parse_structured_operations(token)
+            if operations is None:
+                operations = parse_structured_operations(token, self.OPERATION_TAGS, self.VOID_TAGS)
             if not operations:
                 return False
 
             print(f"🔄 找到 {len(operations)} 个结构化操作指令")
+            if not self.snapshots.in_turn:
+                # 调用方没有开启轮次时，本次回复中的全部写操作记为一轮
+                self.begin_turn((token or "").strip().split("\n", 1)[0][:100])
+                try:
+                    return self.handle_tagged_file_operations(token, callback, operations, prefetched)
+                finally:
+                    self.end_turn()
+            if self.transactional and self._tx is None and \
+                    any(op["operation"] in self.WRITE_OPERATIONS for op in operations):
+                return self._handle_in_transaction(token, callback, operations, prefetched)
+            if self.parallel and len(operations) > 1:
+                def on_result(i, result):
+                    op = operations[i]
+                    print(f"  [{i+1}] 完成: {op['operation']} → {op.get('attributes', {}).get('path', '')}")
+                    if callback:
+                        callback(op, result)
+
+                self._execute_parallel(operations, prefetched, on_result)
+                print("✅ 操作完成")
+                return True
+
             for i, op in enumerate(operations):
-                print(f"  [{i+1}] 执行: {op['operation']} → {op.get('attributes', {}).get('path', '')}")
-                result = self.execute_operation(op)
+                if i in prefetched:
+                    print(f"  [{i+1}] 已提前执行: {op['operation']} → {op.get('attributes', {}).get('path', '')}")
+                    result = prefetched[i].result()
+                else:
+                    print(f"  [{i+1}] 执行: {op['operation']} → {op.get('attributes', {}).get('path', '')}")
+                    result = self.execute_operation(op)
                 if callback:
                     callback(op, result)
             print("✅ 操作完成")
@@ -145,6 +368,71 @@ class FileOperationHandler:
             traceback.print_exc()
             return False
 
+    def _handle_in_transaction(self, token: str, callback, operations: list, prefetched: dict) -> bool:
+        """
+        事务模式：本次回复的写操作先暂存，全部成功才统一提交；任一写操作失败则全部回滚，
+        此前"成功"的写操作结果改为回滚提示，在已有暂存改动时完成的读取/列出/搜索结果（可能包含未生效的内容）
+        标记为 rolled_back，再交给 callback。
+        """
+        results = []
+        saw_staged = []  # 与 results 对应：该结果完成时事务中是否已有暂存改动
+        self._tx = FileTransaction(self.output_dir)
+
+        def collect(op, r):
+            saw_staged.append(bool(self._tx.paths))
+            results.append((op, r))
+
+        try:
+            ok = self.handle_tagged_file_operations(token, collect, operations, prefetched)
+        finally:
+            tx, self._tx = self._tx, None
+
+        failed = [i for i, (op, r) in enumerate(results)
+                  if op["operation"] in self.WRITE_OPERATIONS and not r.get("success")]
+        reason = None
+        if not ok or len(results) < len(operations):
+            reason = "操作执行中断"
+        elif failed:
+            op, r = results[failed[0]]
+            reason = f"第 {failed[0] + 1} 个操作 {op['operation']} 失败: {r.get('error')}"
+
+        if reason is None:
+            try:
+                tx.commit(self.snapshots.record_before, self._after_publish)
+                print(f"💾 事务已提交: {len(tx.paths)} 个文件")
+            except TransactionError as e:
+                reason = str(e)
+                for rel in tx.paths:
+                    self._after_publish(rel)  # 按恢复后的实际状态重新记录
+        else:
+            tx.rollback()
+
+        if reason is not None:
+            print(f"⏪ 事务已回滚，本次回复的写操作均未生效: {reason}")
+            for path in list(self.created_files):
+                if not os.path.exists(path):
+                    self.created_files.remove(path)
+            for i, (op, r) in enumerate(results):
+                if op["operation"] in self.WRITE_OPERATIONS and r.get("success"):
+                    results[i] = (op, {
+                        "success": False,
+                        "operation": r.get("operation"),
+                        "filename": r.get("filename"),
+                        "error": f"事务已回滚（{reason}），该操作未生效",
+                        "rolled_back": True
+                    })
+                elif r.get("success") and saw_staged[i]:
+                    results[i] = (op, {**r, "rolled_back": True,
+                                       "warning": "事务已回滚，该结果可能包含未生效的暂存改动，请以磁盘上的实际内容为准"})
+        if callback:
+            for op, r in results:
+                callback(op, r)
+        return ok and reason is None
+
+    def _after_publish(self, rel: str):
+        self._sync_restored(rel)
+        self.snapshots.record_after(rel)
+
     def execute_operation(self, op_dict: dict):
         op = op_dict["operation"]
         attrs = op_dict["attributes"]
@@ -161,7 +449,15 @@ class FileOperationHandler:
                 path = attrs.get("path")
                 if not path:
                     return {"success": False, "error": "缺少 path 属性"}
-                return self.read_file(path)
+                start_line = attrs.get("start_line")
+                end_line = attrs.get("end_line")
+                line_offset = attrs.get("line_offset")
+                return self.read_file(
+                    path,
+                    start_line=int(start_line) if start_line else None,
+                    end_line=int(end_line) if end_line else None,
+                    line_offset=int(line_offset) if line_offset else None
+                )
 
             elif op == "UPDATE_FILE":
                 path = attrs.get("path")
@@ -169,6 +465,12 @@ class FileOperationHandler:
                     return {"success": False, "error": "缺少 path 属性"}
                 return self.update_file(path, content or "")
 
+            elif op == "EDIT_FILE":
+                path = attrs.get("path")
+                if not path:
+                    return {"success": False, "error": "缺少 path 属性"}
+                return self.edit_file(path, content or "")
+
             elif op == "DELETE_FILE":
                 path = attrs.get("path")
                 if not path:
@@ -186,6 +488,42 @@ class FileOperationHandler:
                     return {"success": False, "error": "缺少 path 属性 in <list_dir>"}
                 return self.list_dir(dir_path, file_filter=file_filter)
 
+            elif op == "FIND_FILE":
+                query = attrs.get("query")
+                if not query:
+                    return {"success": False, "error": "缺少 query 属性 in <find_file>"}
+                return self.find_file(query, limit=int(attrs.get("limit") or 10))
+
+            elif op == "GREP":
+                pattern = attrs.get("pattern")
+                if not pattern:
+                    return {"success": False, "error": "缺少 pattern 属性 in <grep>"}
+                return self.grep(
+                    pattern,
+                    file_filter=attrs.get("filter"),
+                    ignore_case=attrs.get("ignore_case", "").lower() == "true",
+                    max_matches=int(attrs.get("max") or 100)
+                )
+
+            elif op == "OUTLINE":
+                path = attrs.get("path")
+                if not path:
+                    return {"success": False, "error": "缺少 path 属性 in <outline>"}
+                return self.outline(path)
+
+            elif op == "READ_SYMBOL":
+                path = attrs.get("path")
+                name = attrs.get("name")
+                if not path or not name:
+                    return {"success": False, "error": "缺少 path 或 name 属性 in <read_symbol>"}
+                return self.read_symbol(path, name)
+
+            elif op == "RECALL":
+                handle = attrs.get("handle")
+                if not handle:
+                    return {"success": False, "error": "缺少 handle 属性 in <recall>"}
+                return self.recall(handle)
+
             elif op == "AGAIN":
                 reason = attrs.get("reason", "无明确原因")
                 print(f"🔁 请求再次处理: {reason}")
@@ -218,6 +556,202 @@ class FileOperationHandler:
             return False, f"非法子目录路径: {subpath}"
         return True, full_path
 
+    def _rel_path(self, full_path: str) -> str:
+        """绝对路径 -> 相对于 output/ 的 / 分隔路径（根目录为 ''）"""
+        rel = os.path.relpath(full_path, self.output_dir).replace("\\", "/")
+        return "" if rel == "." else rel
+
+    @staticmethod
+    def _print_files(files: list, empty_msg: str, limit: int = 50):
+        for f in files[:limit]:
+            print(f"  - {f}")
+        if len(files) > limit:
+            print(f"  ... 共 {len(files)} 个文件")
+        if not files:
+            print(empty_msg)
+
+    # ---------- 写入与快照 ----------
+    # 所有写文件/删文件都经过这两个方法：写之前备份原内容，写之后记录新内容并同步路径索引。
+
+    def _write_text(self, full_path: str, content: str, newline: str = None):
+        rel = self._rel_path(full_path)
+        if self._tx is not None:
+            self._tx.stage_write(rel, content, newline)  # 提交时再备份与同步索引
+            return
+        self.snapshots.record_before(rel)
+        try:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            atomic_write(full_path, content, newline=newline)
+            self.path_index.add_file(rel)
+            if self.read_cache is not None:
+                self.read_cache.put(full_path, content)
+        finally:
+            self.snapshots.record_after(rel)
+
+    def _remove(self, full_path: str):
+        rel = self._rel_path(full_path)
+        if self._tx is not None:
+            self._tx.stage_delete(rel)
+            return
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(full_path)
+        self.snapshots.record_before(rel)
+        try:
+            os.remove(full_path)
+            self.path_index.remove_file(rel)
+            if self.read_cache is not None:
+                self.read_cache.invalidate(full_path)
+        finally:
+            self.snapshots.record_after(rel)
+
+    def _read_path(self, full_path: str) -> str:
+        """读取时实际打开的文件：事务进行中时优先返回暂存内容"""
+        if self._tx is None:
+            return full_path
+        return self._tx.read_path(self._rel_path(full_path))
+
+    def _staged_overlay(self) -> dict:
+        """进行中事务的暂存改动 {路径: 暂存文件或 None(删除)}（被忽略的路径除外）；没有事务时为空"""
+        if self._tx is None:
+            return {}
+        is_ignored = self.path_index.ignore.is_ignored
+        return {rel: staged for rel, staged in self._tx.overlay().items() if not is_ignored(rel)}
+
+    def _overlay_paths(self, paths: list, match) -> list:
+        """把暂存的新建与删除叠加到索引返回的路径列表上（match(路径) 判断新建的文件是否属于本次查询）"""
+        overlay = self._staged_overlay()
+        if not overlay:
+            return paths
+        result = {p for p in paths if overlay.get(p, p) is not None}
+        result.update(p for p, staged in overlay.items() if staged is not None and match(p))
+        return sorted(result)
+
+    def begin_turn(self, label: str = ""):
+        """开始一轮：直到 end_turn 之前的全部写操作记为同一轮，可以整体撤销"""
+        self.snapshots.begin_turn(label)
+
+    def end_turn(self):
+        """结束当前轮，返回轮号（本轮没有改动文件时为 None）"""
+        return self.snapshots.end_turn()
+
+    def _sync_restored(self, rel: str):
+        """文件被事务提交或快照恢复改动后，同步路径索引与读取缓存"""
+        full_path = os.path.join(self.output_dir, *rel.split("/"))
+        if os.path.isfile(full_path):
+            self.path_index.add_file(rel)
+        else:
+            self.path_index.remove_file(rel)
+        if self.read_cache is not None:
+            self.read_cache.invalidate(full_path)
+
+    def cache_stats(self) -> dict:
+        """读取缓存的命中统计"""
+        return self.read_cache.stats() if self.read_cache is not None else {}
+
+    def undo_turn(self, turn: int = None, force: bool = False):
+        """撤销一轮的全部文件改动（默认最近一轮）"""
+        try:
+            result = self.snapshots.undo_turn(turn, force)
+        except SnapshotError as e:
+            print(f"❌ {e}")
+            return {"success": False, "operation": "UNDO_TURN", "error": str(e)}
+        for rel in result["restored"]:
+            self._sync_restored(rel)
+        print(f"↩️ 已撤销第 {result['turn']} 轮: 恢复 {len(result['restored'])} 个文件")
+        for rel in result["conflicts"]:
+            print(f"  ⚠️ 跳过（之后又被修改过）: {rel}")
+        return {"success": True, "operation": "UNDO_TURN", **result}
+
+    def restore_file(self, filename: str, turn: int):
+        """把单个文件恢复到第 turn 轮结束时的状态"""
+        valid, res = self._validate_path(filename)
+        if not valid:
+            print(f"❌ {res}")
+            return {"success": False, "operation": "RESTORE_FILE", "error": res}
+        rel = self._rel_path(res)
+        try:
+            result = self.snapshots.restore(rel, turn)
+        except SnapshotError as e:
+            print(f"❌ {e}")
+            return {"success": False, "operation": "RESTORE_FILE", "error": str(e)}
+        self._sync_restored(rel)
+        print(f"⏪ 已恢复 {rel} 到第 {turn} 轮" + ("（当时文件不存在，已删除）" if result["deleted"] else ""))
+        return {"success": True, "operation": "RESTORE_FILE", **result}
+
+    def list_turns(self, limit: int = 20):
+        """最近的改动轮次"""
+        return self.snapshots.list_turns(limit)
+
+    def fork(self, fork_id: str = None) -> "FileOperationHandler":
+        """
+        在 .codegenius/forks/<分叉ID>/ 下建立项目的副本（支持时为 reflink 克隆），返回在副本上操作的新 handler。
+        新 handler 与当前 handler 共用结果存储，分叉前上下文中的结果句柄仍可 <recall>。
+        """
+        workspace = ForkWorkspace.create(self.output_dir, self.path_index.all_files(), fork_id)
+        child = FileOperationHandler(
+            workspace.fork_dir,
+            parallel=self.parallel,
+            max_workers=self.max_workers,
+            search_index=self.content_search.use_index,
+            transactional=self.transactional,
+            read_cache_bytes=self.read_cache.max_bytes if self.read_cache is not None else 0,
+            use_defaults=self.path_index.ignore.use_defaults,
+            extra_patterns=self.path_index.ignore.extra_patterns,
+        )
+        child.result_store = self.result_store
+        child.fork_workspace = workspace
+        print(f"🌿 已创建分叉 {workspace.fork_id}: {len(workspace.manifest)} 个文件")
+        return child
+
+    def merge_fork(self, child: "FileOperationHandler", label: str = None):
+        """
+        把分叉中的改动合并回当前项目，记为快照库中的一轮（可以通过 undo_turn 整体撤销）。
+        项目中在分叉之后也被改过的文件视为冲突，跳过不覆盖。
+        """
+        workspace = child.fork_workspace
+        if workspace is None:
+            return {"success": False, "operation": "MERGE_FORK", "error": "该 handler 不是分叉"}
+        changes = workspace.changes(child.path_index.all_files())
+        merged, conflicts, failed = [], [], []
+        self.begin_turn(label or f"合并分叉 {workspace.fork_id}")
+        try:
+            for rel in changes["written"] + changes["deleted"]:
+                if workspace.base_changed(rel):
+                    conflicts.append(rel)
+                    continue
+                full_path = os.path.join(self.output_dir, *rel.split("/"))
+                try:
+                    if rel in changes["deleted"]:
+                        if os.path.isfile(full_path):
+                            self._remove(full_path)
+                    else:
+                        with open(os.path.join(workspace.fork_dir, *rel.split("/")), 'r',
+                                  encoding='utf-8', newline='') as f:
+                            self._write_text(full_path, f.read(), newline='')
+                except (OSError, UnicodeDecodeError) as e:
+                    failed.append(f"{rel}: {e}")
+                    continue
+                workspace.mark_merged(rel)
+                merged.append(rel)
+        finally:
+            turn = self.end_turn()
+            workspace.save()
+        print(f"🔀 已合并分叉 {workspace.fork_id}: {len(merged)} 个文件"
+              + (f"（第 {turn} 轮，可撤销）" if turn is not None else ""))
+        for rel in conflicts:
+            print(f"  ⚠️ 跳过（分叉之后项目中也被修改过）: {rel}")
+        for msg in failed:
+            print(f"  ❌ {msg}")
+        return {
+            "success": not failed,
+            "operation": "MERGE_FORK",
+            "fork_id": workspace.fork_id,
+            "turn": turn,
+            "merged": merged,
+            "conflicts": conflicts,
+            "failed": failed
+        }
+
     def create_file(self, filename: str, content: str):
         print(f"📁 创建文件 → {filename}")
         valid, res = self._validate_path(filename)
@@ -227,9 +761,7 @@ class FileOperationHandler:
         full_path = res
 
         try:
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            self._write_text(full_path, content)
             self.created_files.append(full_path)
             print(f"✅ 成功创建: {full_path}")
             return {
@@ -244,8 +776,14 @@ class FileOperationHandler:
             print(f"❌ {err_msg}")
             return {"success": False, "error": err_msg, "filename": filename}
 
-    def read_file(self, filename: str):
-        print(f"📖 读取文件 ← {filename}")
+    def read_file(self, filename: str, start_line: int = None, end_line: int = None, line_offset: int = None):
+        """
+        读取文件。指定 start_line/end_line 时只返回该行区间（行号从 1 开始，含两端）；
+        文件超过 MAX_READ_BYTES 时只返回第一页，并通过 next_start_line 提示续读位置。
+        单行超过 MAX_READ_BYTES 时该行同样分页：next_line_offset 为续读时该行内的字节偏移（line_offset）。
+        """
+        range_desc = f" [{start_line or 1}-{end_line or ''}]" if start_line or end_line else ""
+        print(f"📖 读取文件 ← {filename}{range_desc}")
         valid, res = self._validate_path(filename)
         if not valid:
             print(f"❌ {res}")
@@ -253,17 +791,57 @@ class FileOperationHandler:
         full_path = res
 
         try:
-            with open(full_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            preview = content[:100] + ('...' if len(content) > 100 else '')
-            print(f"📄 内容预览 ({len(content)} 字): {preview}")
-            return {
+            read_path = self._read_path(full_path)
+            ranged = start_line is not None or end_line is not None or bool(line_offset)
+            if not ranged and os.path.getsize(read_path) <= self.MAX_READ_BYTES:
+                if self.read_cache is not None and read_path == full_path:
+                    content = self.read_cache.read(full_path)
+                else:
+                    with open(read_path, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                preview = content[:100] + ('...' if len(content) > 100 else '')
+                print(f"📄 内容预览 ({len(content)} 字): {preview}")
+                return {
+                    "success": True,
+                    "operation": "READ_FILE",
+                    "filename": filename,
+                    "content": content,
+                    "path": full_path
+                }
+
+            page = self.line_index.read_lines(read_path, start_line or 1, end_line, self.MAX_READ_BYTES,
+                                              line_offset or 0)
+            result = {
                 "success": True,
                 "operation": "READ_FILE",
                 "filename": filename,
-                "content": content,
-                "path": full_path
+                "content": page["content"],
+                "path": full_path,
+                "start_line": page["start_line"],
+                "end_line": page["end_line"],
+                "total_lines": page["total_lines"]
             }
+            if line_offset:
+                result["line_offset"] = line_offset
+            requested_end = end_line if end_line is not None else float("inf")
+            if "next_offset" in page:
+                result["next_start_line"] = page["end_line"]
+                result["next_line_offset"] = page["next_offset"]
+                result["hint"] = (
+                    f"第 {page['end_line']} 行过长，仅返回其中一段；继续读取请使用 "
+                    f"<read_file path=\"{filename}\" start_line=\"{page['end_line']}\" "
+                    f"line_offset=\"{page['next_offset']}\" />"
+                )
+            elif page["has_more"] and page["end_line"] < requested_end:
+                next_line = page["end_line"] + 1
+                result["next_start_line"] = next_line
+                result["hint"] = (
+                    f"内容过长，仅返回第 {page['start_line']}-{page['end_line']} 行；"
+                    f"继续读取请使用 <read_file path=\"{filename}\" start_line=\"{next_line}\" />"
+                )
+            print(f"📄 返回第 {page['start_line']}-{page['end_line']} 行 ({len(page['content'])} 字)"
+                  + (f"，续读起始行 {result['next_start_line']}" if "next_start_line" in result else ""))
+            return result
         except FileNotFoundError:
             print(f"❌ 文件不存在: {full_path}")
             return {"success": False, "error": "文件不存在", "filename": filename}
@@ -272,6 +850,93 @@ class FileOperationHandler:
             print(f"❌ {err_msg}")
             return {"success": False, "error": err_msg, "filename": filename}
 
+    def _load_symbols(self, full_path: str) -> tuple:
+        """返回 (符号信息, 源码行列表)；事务中暂存的文件直接解析暂存内容"""
+        read_path = self._read_path(full_path)
+        if read_path == full_path and self.read_cache is not None:
+            source = self.read_cache.read(full_path)
+        else:
+            with open(read_path, 'r', encoding='utf-8') as f:
+                source = f.read()
+        if read_path == full_path:
+            symbols = self.symbol_index.get(full_path)
+        else:
+            symbols = self.symbol_index.parse_source(source)
+        return symbols, source.splitlines(keepends=True)
+
+    def outline(self, filename: str):
+        """Python 文件大纲：类、函数、方法的签名与行号范围"""
+        print(f"🧭 文件大纲 ← {filename}")
+        valid, res = self._validate_path(filename)
+        if not valid:
+            print(f"❌ {res}")
+            return {"success": False, "error": res}
+        if not filename.endswith(".py"):
+            return {"success": False, "error": "outline 仅支持 .py 文件", "filename": filename}
+        try:
+            symbols, lines = self._load_symbols(res)
+            text = format_outline(symbols["symbols"])
+            print(text or "  (没有类或函数)")
+            return {
+                "success": True,
+                "operation": "OUTLINE",
+                "filename": filename,
+                "total_lines": len(lines),
+                "outline": text
+            }
+        except FileNotFoundError:
+            print(f"❌ 文件不存在: {res}")
+            return {"success": False, "error": "文件不存在", "filename": filename}
+        except Exception as e:
+            err_msg = f"解析失败: {e}"
+            print(f"❌ {err_msg}")
+            return {"success": False, "error": err_msg, "filename": filename}
+
+    def read_symbol(self, filename: str, name: str):
+        """只读取一个类或函数（含装饰器）的源码"""
+        print(f"🎯 读取符号 ← {filename}::{name}")
+        valid, res = self._validate_path(filename)
+        if not valid:
+            print(f"❌ {res}")
+            return {"success": False, "error": res}
+        try:
+            symbols, lines = self._load_symbols(res)
+            symbol, candidates = find_symbol(symbols["symbols"], name)
+            if symbol is None:
+                err_msg = (f"符号 {name} 有多个匹配: {', '.join(candidates)}" if candidates
+                           else f"未找到符号: {name}（可先用 outline 查看文件结构）")
+                print(f"❌ {err_msg}")
+                return {"success": False, "error": err_msg, "filename": filename, "candidates": candidates}
+            content = "".join(lines[symbol["start_line"] - 1:symbol["end_line"]])
+            print(f"📄 {symbol['name']}: 第 {symbol['start_line']}-{symbol['end_line']} 行")
+            return {
+                "success": True,
+                "operation": "READ_SYMBOL",
+                "filename": filename,
+                "symbol": symbol["name"],
+                "start_line": symbol["start_line"],
+                "end_line": symbol["end_line"],
+                "content": content
+            }
+        except FileNotFoundError:
+            print(f"❌ 文件不存在: {res}")
+            return {"success": False, "error": "文件不存在", "filename": filename}
+        except Exception as e:
+            err_msg = f"解析失败: {e}"
+            print(f"❌ {err_msg}")
+            return {"success": False, "error": err_msg, "filename": filename}
+
+    def recall(self, handle: str):
+        """取回旁路存储中的操作结果正文"""
+        handle = handle.strip().lstrip("@")
+        print(f"📦 取回结果 ← @{handle}")
+        body = self.result_store.get(handle)
+        if body is None:
+            err_msg = f"结果 @{handle} 不存在或已过期，请重新执行原操作"
+            print(f"❌ {err_msg}")
+            return {"success": False, "operation": "RECALL", "handle": handle, "error": err_msg}
+        return {"success": True, "operation": "RECALL", "handle": handle, "content": body}
+
     def update_file(self, filename: str, content: str):
         print(f"✏️ 更新文件 → {filename}")
         valid, res = self._validate_path(filename)
@@ -281,9 +946,7 @@ class FileOperationHandler:
         full_path = res
 
         try:
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            self._write_text(full_path, content)
             print(f"✅ 文件已更新: {full_path}")
             return {
                 "success": True,
@@ -297,6 +960,57 @@ class FileOperationHandler:
             print(f"❌ {err_msg}")
             return {"success": False, "error": err_msg, "filename": filename}
 
+    def edit_file(self, filename: str, patch_text: str):
+        """
+        应用 SEARCH/REPLACE 块或 unified diff。所有块都定位成功才写入（原子替换），
+        返回每个块的状态（匹配方式与起始行号）。
+        """
+        print(f"🩹 编辑文件 → {filename}")
+        valid, res = self._validate_path(filename)
+        if not valid:
+            print(f"❌ {res}")
+            return {"success": False, "error": res}
+        full_path = res
+
+        try:
+            hunks = parse_patch(patch_text)
+            with open(self._read_path(full_path), 'r', encoding='utf-8', newline='') as f:
+                original = f.read()
+            new_text, statuses = apply_hunks(original, hunks)
+            applied = sum(1 for s in statuses if s["status"] == "applied")
+            for s in statuses:
+                if s["status"] == "applied":
+                    print(f"  ✅ 块 {s['hunk']}: 第 {s['line']} 行 ({s['match']})")
+                else:
+                    print(f"  ❌ 块 {s['hunk']}: {s['error']}")
+            if new_text is None:
+                print(f"❌ {len(statuses) - applied} 个块定位失败，文件未修改")
+                return {
+                    "success": False,
+                    "operation": "EDIT_FILE",
+                    "filename": filename,
+                    "error": "部分修改块无法定位，文件未修改；请重新读取文件后再编辑",
+                    "hunks": statuses
+                }
+            self._write_text(full_path, new_text, newline='')
+            print(f"✅ 文件已编辑: {full_path} ({applied} 个块)")
+            return {
+                "success": True,
+                "operation": "EDIT_FILE",
+                "filename": filename,
+                "hunks": statuses
+            }
+        except FileNotFoundError:
+            print(f"❌ 文件不存在: {full_path}")
+            return {"success": False, "error": "文件不存在", "filename": filename}
+        except PatchError as e:
+            print(f"❌ 补丁格式错误: {e}")
+            return {"success": False, "error": f"补丁格式错误: {e}", "filename": filename}
+        except Exception as e:
+            err_msg = f"编辑失败: {e}"
+            print(f"❌ {err_msg}")
+            return {"success": False, "error": err_msg, "filename": filename}
+
     def delete_file(self, filename: str):
         print(f"🗑️ 删除文件 × {filename}")
         valid, res = self._validate_path(filename)
@@ -306,7 +1020,7 @@ class FileOperationHandler:
         full_path = res
 
         try:
-            os.remove(full_path)
+            self._remove(full_path)
             if full_path in self.created_files:
                 self.created_files.remove(full_path)
             print(f"✅ 已删除: {full_path}")
@@ -332,15 +1046,8 @@ class FileOperationHandler:
         if file_filter is None:
             print("📂 列出 output/ 根目录文件（不递归）:")
             try:
-                files = []
-                for item in os.listdir(self.output_dir):
-                    if os.path.isfile(os.path.join(self.output_dir, item)):
-                        files.append(item)
-                sorted_files = sorted(files)
-                for f in sorted_files:
-                    print(f"  - {f}")
-                if not sorted_files:
-                    print("  (无文件)")
+                sorted_files = self._overlay_paths(self.path_index.files_in_dir(""), lambda p: "/" not in p)
+                self._print_files(sorted_files, "  (无文件)")
                 return {
                     "success": True,
                     "operation": "LIST_FILES",
@@ -354,17 +1061,9 @@ class FileOperationHandler:
         else:
             print(f"🔍 递归搜索 output/ 下匹配 '{file_filter}' 的文件:")
             try:
-                matched = []
-                for root, dirs, filenames in os.walk(self.output_dir):
-                    for fname in filenames:
-                        rel_path = os.path.relpath(os.path.join(root, fname), self.output_dir).replace("\\", "/")
-                        if fnmatch.fnmatch(rel_path, file_filter):
-                            matched.append(rel_path)
-                matched.sort()
-                for f in matched:
-                    print(f"  - {f}")
-                if not matched:
-                    print("  (无匹配文件)")
+                matched = self._overlay_paths(self.path_index.glob(file_filter),
+                                              lambda p: glob_match(p, file_filter))
+                self._print_files(matched, "  (无匹配文件)")
                 return {
                     "success": True,
                     "operation": "LIST_FILES",
@@ -377,6 +1076,59 @@ class FileOperationHandler:
                 print(f"❌ {err_msg}")
                 return {"success": False, "error": err_msg}
 
+    def find_file(self, query: str, limit: int = 10):
+        """按路径模糊搜索文件，返回最相关的 limit 个"""
+        print(f"🔎 模糊搜索文件: '{query}'")
+        try:
+            overlay = self._staged_overlay()
+            matches = self.path_index.search(query, limit + len(overlay))
+            if overlay:
+                matches = [(p, score) for p, score in matches if overlay.get(p, p) is not None]
+                created = [p for p, staged in overlay.items()
+                           if staged is not None and not os.path.isfile(os.path.join(self.output_dir, *p.split("/")))]
+                if created:
+                    # 暂存中新建的文件不在索引里：单独打分后与索引结果合并
+                    staged_index = PathTrigramIndex()
+                    for p in created:
+                        staged_index.add(p)
+                    matches += staged_index.search(query, limit) or subsequence_search(created, query, limit)
+                    matches.sort(key=lambda m: (-m[1], len(m[0]), m[0]))
+                matches = matches[:limit]
+            self._print_files([f"{path} ({score})" for path, score in matches], "  (无匹配文件)")
+            return {
+                "success": True,
+                "operation": "FIND_FILE",
+                "query": query,
+                "files": [path for path, _ in matches]
+            }
+        except Exception as e:
+            err_msg = f"模糊搜索失败: {e}"
+            print(f"❌ {err_msg}")
+            return {"success": False, "error": err_msg}
+
+    def grep(self, pattern: str, file_filter: str = None, ignore_case: bool = False, max_matches: int = 100):
+        """搜索文件内容，返回 path:line:text 形式的命中行"""
+        print(f"🔍 搜索内容: '{pattern}'" + (f" (过滤: {file_filter})" if file_filter else ""))
+        try:
+            result = self.content_search.search(pattern, file_filter, max_matches, ignore_case,
+                                                overlay=self._staged_overlay())
+        except re.error as e:
+            err_msg = f"无效的正则表达式: {e}"
+            print(f"❌ {err_msg}")
+            return {"success": False, "error": err_msg}
+        except Exception as e:
+            err_msg = f"内容搜索失败: {e}"
+            print(f"❌ {err_msg}")
+            return {"success": False, "error": err_msg}
+        self._print_files(result["matches"], "  (无匹配内容)")
+        return {
+            "success": True,
+            "operation": "GREP",
+            "pattern": pattern,
+            "matches": result["matches"],
+            "truncated": result["truncated"]
+        }
+
     def list_dir(self, dir_path: str, file_filter: str = None):
         """列出指定目录下的文件：
         - 无 filter：仅当前目录文件（不递归）
@@ -387,32 +1139,37 @@ class FileOperationHandler:
             print(f"❌ {target_dir}")
             return {"success": False, "error": target_dir}
 
-        if not os.path.exists(target_dir):
+        rel_dir = self._rel_path(target_dir)
+        # 只在事务暂存中新建出来的目录（尚未发布到磁盘）
+        staged_dir = bool(rel_dir) and any(staged is not None and p.startswith(rel_dir + "/")
+                                           for p, staged in self._staged_overlay().items())
+        if not os.path.exists(target_dir) and not staged_dir:
             return {"success": False, "error": f"目录不存在: {dir_path}"}
-        if not os.path.isdir(target_dir):
+        if os.path.exists(target_dir) and not os.path.isdir(target_dir):
             return {"success": False, "error": f"不是目录: {dir_path}"}
 
         if file_filter is None:
             print(f"📂 列出目录 '{dir_path}' 下的文件（不递归）:")
             try:
-                files = []
-                for item in os.listdir(target_dir):
-                    item_full = os.path.join(target_dir, item)
-                    if os.path.isfile(item_full):
-                        rel_path = os.path.join(dir_path, item).replace("\\", "/")
-                        files.append(rel_path)
-                files.sort()
-                for f in files:
-                    print(f"  - {f}")
-                if not files:
-                    print("  (无文件)")
-                return {
+                ignored = not self.path_index.has_dir(rel_dir) and not staged_dir
+                if ignored:
+                    # 被忽略的目录不在索引中：明确指定时仍直接列出其第一层文件
+                    with os.scandir(target_dir) as it:
+                        files = sorted(f"{rel_dir}/{e.name}" if rel_dir else e.name for e in it if e.is_file())
+                else:
+                    files = self._overlay_paths(self.path_index.files_in_dir(rel_dir),
+                                                lambda p: p.rpartition("/")[0] == rel_dir)
+                self._print_files(files, "  (无文件)")
+                result = {
                     "success": True,
                     "operation": "LIST_DIR",
                     "directory": dir_path,
                     "files": files,
                     "recursive": False
                 }
+                if ignored:
+                    result["ignored"] = True
+                return result
             except Exception as e:
                 err_msg = f"列出目录失败: {e}"
                 print(f"❌ {err_msg}")
@@ -420,19 +1177,11 @@ class FileOperationHandler:
         else:
             print(f"🔍 递归搜索目录 '{dir_path}' 下匹配 '{file_filter}' 的文件:")
             try:
-                matched = []
-                for root, dirs, filenames in os.walk(target_dir):
-                    for fname in filenames:
-                        full_file = os.path.join(root, fname)
-                        rel_to_output = os.path.relpath(full_file, self.output_dir).replace("\\", "/")
-                        # 按完整相对路径匹配 filter（如 filter="log/*.log"）
-                        if fnmatch.fnmatch(rel_to_output, file_filter):
-                            matched.append(rel_to_output)
-                matched.sort()
-                for f in matched:
-                    print(f"  - {f}")
-                if not matched:
-                    print("  (无匹配文件)")
+                # 按完整相对路径匹配 filter（如 filter="log/*.log"）
+                matched = self._overlay_paths(
+                    self.path_index.glob(file_filter, rel_dir),
+                    lambda p: (not rel_dir or p.startswith(rel_dir + "/")) and glob_match(p, file_filter))
+                self._print_files(matched, "  (无匹配文件)")
                 return {
                     "success": True,
                     "operation": "LIST_DIR",
@@ -0,0 +1,179 @@
+"""
+多文件事务：把一次回复中的写操作先暂存到同一文件系统上的临时目录，全部成功后再统一发布。
+
+    - 暂存阶段只写临时文件，不 fsync；读取同一路径时返回暂存内容（先写后读/再编辑能看到新内容）
+    - 提交时先逐个 fsync 暂存文件（只涉及本事务的文件，不用 os.sync() 刷整台机器的全部文件系统），
+      再用 os.replace 逐个发布；原文件先以硬链接备份（不移走），发布过程中任何时刻崩溃，
+      目标路径上都是完整的旧文件或新文件；发布后 fsync 涉及的父目录，
+      中途失败时用备份把已发布的文件恢复原样
+    - 回滚只需删除暂存目录，项目文件不受任何影响
+"""
+import os
+import uuid
+import shutil
+import threading
+from ai_agent_factory.utils.state_dir import make_dirs
+
+TX_DIR = ".codegenius"
+
+
+class TransactionError(Exception):
+    """事务提交失败（已回滚）"""
+
+
+def _link_or_copy(src: str, dst: str):
+    """为原文件建立备份：优先硬链接（不复制内容），不支持硬链接时复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _fsync_files(paths: list):
+    """逐个 fsync 文件内容"""
+    for path in paths:
+        with open(path, "rb+") as f:
+            os.fsync(f.fileno())
+
+
+def _fsync_dirs(dirs):
+    """fsync 目录，使其中的 os.replace / 删除落盘（Windows 不能打开目录，跳过）"""
+    if os.name == "nt":
+        return
+    for directory in dirs:
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+class FileTransaction:
+    """
+    用法:
+        tx = FileTransaction(root)
+        tx.stage_write("a.py", "...")
+        tx.stage_delete("b.py")
+        tx.commit(on_change)   # 或 tx.rollback()
+
+    路径均为相对于 root、以 / 分隔的字符串。
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.staging_dir = os.path.join(self.root, TX_DIR, f"tx-{uuid.uuid4().hex[:12]}")
+        self._lock = threading.Lock()
+        self._final: dict[str, str] = {}  # 路径 -> 暂存文件路径（None 表示删除）
+        self._counter = 0
+        self.closed = False
+
+    def _full(self, rel: str) -> str:
+        return os.path.join(self.root, *rel.split("/"))
+
+    @property
+    def paths(self) -> list:
+        """本事务改动的路径（按首次改动的顺序）"""
+        return list(self._final)
+
+    def stage_write(self, rel: str, content: str, newline: str = None):
+        with self._lock:
+            self._counter += 1
+            staged = os.path.join(self.staging_dir, f"{self._counter:05d}")
+            make_dirs(self.staging_dir)
+            with open(staged, "w", encoding="utf-8", newline=newline) as f:
+                f.write(content)
+            self._final[rel] = staged
+
+    def stage_delete(self, rel: str):
+        with self._lock:
+            if not self.exists(rel):
+                raise FileNotFoundError(self._full(rel))
+            self._final[rel] = None
+
+    def exists(self, rel: str) -> bool:
+        """考虑暂存改动后，路径是否是一个文件"""
+        if rel in self._final:
+            return self._final[rel] is not None
+        return os.path.isfile(self._full(rel))
+
+    def overlay(self) -> dict:
+        """当前的暂存改动 {路径: 暂存文件路径或 None(删除)}（副本，供列目录、搜索叠加到磁盘视图上）"""
+        with self._lock:
+            return dict(self._final)
+
+    def read_path(self, rel: str) -> str:
+        """读取 rel 时实际应打开的文件（已暂存删除时抛出 FileNotFoundError）"""
+        if rel in self._final:
+            staged = self._final[rel]
+            if staged is None:
+                raise FileNotFoundError(self._full(rel))
+            return staged
+        return self._full(rel)
+
+    def commit(self, before_publish=None, after_publish=None):
+        """
+        发布全部暂存改动。
+
+        参数:
+            before_publish / after_publish: 每个路径发布前后的回调 f(rel)（用于快照记录与索引同步）
+        异常:
+            TransactionError: 发布失败，已发布的部分已恢复
+        """
+        with self._lock:
+            if self.closed:
+                raise TransactionError("事务已结束")
+            self.closed = True
+            backup_dir = os.path.join(self.staging_dir, "backup")
+            published = []  # (rel, 原文件备份路径或 None)
+            try:
+                staged_files = [p for p in self._final.values() if p is not None]
+                if staged_files:
+                    _fsync_files(staged_files)  # 发布前确保暂存内容已落盘，崩溃后不会出现空文件
+                make_dirs(backup_dir)
+                for i, (rel, staged) in enumerate(self._final.items()):
+                    target = self._full(rel)
+                    if before_publish:
+                        before_publish(rel)
+                    backup = None
+                    if os.path.isfile(target):
+                        # 原文件留在原处，只另建一个硬链接作备份：任何时刻目标路径上都有完整的旧文件或新文件
+                        backup = os.path.join(backup_dir, f"{i:05d}")
+                        _link_or_copy(target, backup)
+                        if staged is not None:
+                            shutil.copymode(target, staged)  # 保留原文件的权限位
+                    published.append((rel, backup))
+                    if staged is not None:
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.replace(staged, target)
+                    elif backup is not None:
+                        os.remove(target)
+                    if after_publish:
+                        after_publish(rel)
+            except Exception as e:
+                self._undo_publish(published)
+                shutil.rmtree(self.staging_dir, ignore_errors=True)
+                raise TransactionError(f"提交失败，已回滚: {e}") from e
+            _fsync_dirs({os.path.dirname(self._full(rel)) for rel, _ in published})  # 目录项变更落盘
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def _undo_publish(self, published: list):
+        for rel, backup in reversed(published):
+            target = self._full(rel)
+            try:
+                if backup is not None:
+                    os.replace(backup, target)
+                elif os.path.exists(target):
+                    os.remove(target)
+            except OSError:
+                pass
+
+    def rollback(self):
+        """丢弃全部暂存改动"""
+        with self._lock:
+            self.closed = True
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
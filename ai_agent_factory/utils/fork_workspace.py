@@ -0,0 +1,138 @@
+"""
+分叉工作区：在 <项目>/.codegenius/forks/<分叉ID>/ 下建立项目的副本，分叉出的代理在副本上读写，
+与原项目及其它分叉互不影响，之后可以把选中的分叉合并回项目。
+
+    - 文件系统支持时用 reflink 克隆文件（Linux 的 FICLONE，如 btrfs、XFS；macOS APFS 的 clonefile）：
+      克隆与原文件共享数据块、写入时才复制，建立副本几乎不复制数据；不支持时退回为完整复制
+    - 不使用硬链接：硬链接共享同一个 inode，编辑器、格式化工具或 >> 对任一方的原地修改都会出现在另一方
+    - 只包含 PathIndex 列出的文件（被忽略的目录如 .git、node_modules 不进入副本）
+    - 清单记录建立时每个文件在项目与副本中的 (inode, mtime_ns, size)：据此找出副本中的改动，
+      并在合并时检查项目中的同一文件在分叉之后是否也被改过（冲突的文件跳过，不覆盖）
+"""
+import os
+import sys
+import json
+import uuid
+import shutil
+from ai_agent_factory.utils.state_dir import make_dirs
+
+FICLONE = 0x40049409  # Linux ioctl：把整个文件克隆为 reflink
+
+FORKS_DIR = os.path.join(".codegenius", "forks")
+MANIFEST_FILE = os.path.join(".codegenius", "fork.json")
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """以 reflink 克隆 src 到新文件 dst；文件系统或平台不支持时返回 False（不留下 dst）"""
+    if sys.platform.startswith("linux"):
+        import fcntl
+        try:
+            with open(src, "rb") as fs, open(dst, "wb") as fd:
+                fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        except OSError:
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            return False
+        shutil.copystat(src, dst)
+        return True
+    if sys.platform == "darwin":
+        import ctypes
+        try:
+            clonefile = ctypes.CDLL(None, use_errno=True).clonefile
+        except (OSError, AttributeError):
+            return False
+        return clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0  # 克隆同时保留权限与时间戳
+    return False
+
+
+def _signature(full_path: str):
+    """文件的 [inode, mtime_ns, size]；不存在时返回 None"""
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+class ForkWorkspace:
+    """单个分叉的工作区（路径均为相对于项目根目录、以 / 分隔的字符串）"""
+
+    def __init__(self, base_root: str, fork_dir: str, manifest: dict):
+        self.base_root = os.path.abspath(base_root)
+        self.fork_dir = os.path.abspath(fork_dir)
+        self.fork_id = os.path.basename(self.fork_dir)
+        self.manifest = manifest  # 路径 -> {"base": 项目中的签名, "fork": 副本中的签名}
+
+    @staticmethod
+    def _full(root: str, rel: str) -> str:
+        return os.path.join(root, *rel.split("/"))
+
+    @classmethod
+    def create(cls, base_root: str, files: list, fork_id: str = None) -> "ForkWorkspace":
+        """
+        为 files 中的文件建立副本。
+        异常:
+            FileExistsError: 同名分叉已存在
+        """
+        base_root = os.path.abspath(base_root)
+        fork_id = fork_id or uuid.uuid4().hex[:8]
+        fork_dir = os.path.join(base_root, FORKS_DIR, fork_id)
+        make_dirs(os.path.dirname(fork_dir))
+        os.makedirs(fork_dir)  # 同名分叉已存在时抛出 FileExistsError
+        manifest, copied = {}, 0
+        for rel in files:
+            src, dst = cls._full(base_root, rel), cls._full(fork_dir, rel)
+            base_sig = _signature(src)
+            if base_sig is None:
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if not _reflink(src, dst):
+                shutil.copy2(src, dst)
+                copied += 1
+            manifest[rel] = {"base": base_sig, "fork": _signature(dst)}
+        workspace = cls(base_root, fork_dir, manifest)
+        workspace.save()
+        if copied:
+            print(f"ℹ️ 文件系统不支持 reflink，已完整复制 {copied} 个文件到分叉 {fork_id}")
+        return workspace
+
+    def save(self):
+        path = os.path.join(self.fork_dir, MANIFEST_FILE)
+        make_dirs(os.path.dirname(path))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def changes(self, fork_files: list) -> dict:
+        """
+        副本相对建立时（或上次合并后）的改动。
+        参数:
+            fork_files: 副本中当前的全部文件（FileOperationHandler 的 path_index.all_files()）
+        返回:
+            {"written": [新建或修改的文件], "deleted": [删除的文件]}
+        """
+        written = [rel for rel in fork_files
+                   if rel not in self.manifest
+                   or _signature(self._full(self.fork_dir, rel)) != self.manifest[rel]["fork"]]
+        deleted = [rel for rel in self.manifest if not os.path.isfile(self._full(self.fork_dir, rel))]
+        return {"written": sorted(written), "deleted": sorted(deleted)}
+
+    def base_changed(self, rel: str) -> bool:
+        """项目中的该文件在分叉之后是否被改过（包括新建、删除）"""
+        entry = self.manifest.get(rel)
+        return _signature(self._full(self.base_root, rel)) != (entry["base"] if entry else None)
+
+    def mark_merged(self, rel: str):
+        """某个文件已合并回项目：以当前状态作为新的比较基准"""
+        fork_sig = _signature(self._full(self.fork_dir, rel))
+        if fork_sig is None:
+            self.manifest.pop(rel, None)
+        else:
+            self.manifest[rel] = {"base": _signature(self._full(self.base_root, rel)), "fork": fork_sig}
+
+    def discard(self):
+        """删除分叉工作区"""
+        shutil.rmtree(self.fork_dir, ignore_errors=True)
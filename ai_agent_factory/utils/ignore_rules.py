@@ -0,0 +1,227 @@
+"""
+忽略规则：遍历项目时跳过 .git、虚拟环境、node_modules、构建输出等目录，
+并遵循各级目录中的 .gitignore / .codegeniusignore。
+
+内置的默认目录列表先于忽略文件应用，忽略文件中的 ! 取反规则可以覆盖它（如 !build/）。
+规则在加载时编译为正则；同一个忽略文件中没有 ! 取反规则时，全部规则合并为一个正则，
+每个路径只需匹配一次。被忽略的目录在遍历时直接剪枝，不会进入。
+"""
+import os
+import re
+import threading
+
+IGNORE_FILES = (".gitignore", ".codegeniusignore")
+
+# 任意层级都不进入的目录
+DEFAULT_IGNORED_DIRS = frozenset({
+    ".git", ".hg", ".svn", ".codegenius",
+    "node_modules", "bower_components",
+    "__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox",
+    "venv", ".venv", "site-packages", ".eggs",
+})
+# 只在项目根目录忽略的目录（src/build 之类的源码包不受影响）
+DEFAULT_ROOT_IGNORED_DIRS = frozenset({"build", "dist"})
+DEFAULT_IGNORED_SUFFIXES = (".egg-info",)
+
+
+def _translate(pattern: str) -> str:
+    """把 gitignore 通配符翻译为正则片段（* 不跨目录，** 可跨目录）"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern[i:i + 3] == "**/":
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if pattern[i:i + 2] == "**":
+                out.append(".*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            close = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "]") else i + 1)
+            if close < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:close]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = close + 1
+                continue
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class _Rule:
+    __slots__ = ("regex", "negate", "dir_only")
+
+    def __init__(self, regex: str, negate: bool, dir_only: bool):
+        self.regex = regex
+        self.negate = negate
+        self.dir_only = dir_only
+
+
+def compile_rules(lines) -> list:
+    """解析忽略文件内容，返回规则列表（路径相对于忽略文件所在目录）"""
+    rules = []
+    for raw in lines:
+        line = raw.rstrip("\n").rstrip("\r")
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.rstrip() if not line.endswith("\\ ") else line
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        line = line.lstrip("/")
+        body = _translate(line)
+        regex = f"^{body}$" if anchored else f"^(?:.*/)?{body}$"
+        rules.append(_Rule(regex, negate, dir_only))
+    return rules
+
+
+class _RuleSet:
+    """一个忽略文件编译后的匹配器"""
+
+    def __init__(self, rules: list):
+        self.rules = rules
+        self.has_negation = any(r.negate for r in rules)
+        if self.has_negation:
+            self.compiled = [(re.compile(r.regex), r.negate, r.dir_only) for r in rules]
+        else:
+            # 没有取反规则：合并为两个正则（目录可匹配全部规则，文件只匹配非 dir_only 的规则）
+            all_rules = [r.regex for r in rules]
+            file_rules = [r.regex for r in rules if not r.dir_only]
+            self.dir_regex = re.compile("|".join(f"(?:{r})" for r in all_rules)) if all_rules else None
+            self.file_regex = re.compile("|".join(f"(?:{r})" for r in file_rules)) if file_rules else None
+
+    def match(self, rel: str, is_dir: bool):
+        """返回 True（忽略）/ False（明确不忽略）/ None（没有规则匹配）"""
+        if not self.has_negation:
+            regex = self.dir_regex if is_dir else self.file_regex
+            return True if regex is not None and regex.match(rel) else None
+        result = None
+        for regex, negate, dir_only in self.compiled:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                result = not negate
+        return result
+
+
+class IgnoreRules:
+    """
+    项目级忽略规则。路径均为相对于 root、以 / 分隔的字符串。
+
+    各目录的忽略文件按需加载并按 mtime 缓存；changed() 用于发现忽略文件本身的修改。
+    """
+
+    def __init__(self, root: str, use_defaults: bool = True, extra_patterns: list = None):
+        self.root = os.path.abspath(root)
+        self.use_defaults = use_defaults
+        self.extra_patterns = list(extra_patterns or [])
+        self._extra = _RuleSet(compile_rules(self.extra_patterns)) if self.extra_patterns else None
+        self._lock = threading.Lock()
+        self._dir_rules: dict[str, tuple] = {}  # 目录 -> (忽略文件 mtime 元组, [_RuleSet])
+        self._chains: dict[str, list] = {}  # 目录 -> 从根到该目录生效的 [(基准目录, _RuleSet)]
+
+    def _ignore_file_mtimes(self, rel_dir: str) -> tuple:
+        base = os.path.join(self.root, *rel_dir.split("/")) if rel_dir else self.root
+        mtimes = []
+        for name in IGNORE_FILES:
+            try:
+                mtimes.append(os.stat(os.path.join(base, name)).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _rules_for(self, rel_dir: str) -> list:
+        cached = self._dir_rules.get(rel_dir)
+        if cached is not None:
+            return cached[1]
+        with self._lock:
+            mtimes = self._ignore_file_mtimes(rel_dir)
+            rule_sets = []
+            base = os.path.join(self.root, *rel_dir.split("/")) if rel_dir else self.root
+            for name, mtime in zip(IGNORE_FILES, mtimes):
+                if mtime is None:
+                    continue
+                try:
+                    with open(os.path.join(base, name), "r", encoding="utf-8", errors="replace") as f:
+                        rules = compile_rules(f)
+                except OSError:
+                    continue
+                if rules:
+                    rule_sets.append(_RuleSet(rules))
+            self._dir_rules[rel_dir] = (mtimes, rule_sets)
+            return rule_sets
+
+    def changed(self) -> bool:
+        """已加载的忽略文件是否有增删改（有则清空缓存并返回 True）"""
+        for rel_dir, (mtimes, _) in list(self._dir_rules.items()):
+            if self._ignore_file_mtimes(rel_dir) != mtimes:
+                with self._lock:
+                    self._dir_rules.clear()
+                    self._chains.clear()
+                return True
+        return False
+
+    def is_default_ignored_dir(self, name: str, rel_dir: str = "") -> bool:
+        """name 是否是内置列表中的目录（build/dist 只在根目录下算）"""
+        if not self.use_defaults:
+            return False
+        return (name in DEFAULT_IGNORED_DIRS or name.endswith(DEFAULT_IGNORED_SUFFIXES)
+                or (not rel_dir and name in DEFAULT_ROOT_IGNORED_DIRS))
+
+    def ignored_entry(self, rel_dir: str, name: str, is_dir: bool) -> bool:
+        """
+        遍历时判断 rel_dir 下的一个条目是否忽略（调用方保证 rel_dir 本身未被忽略）。
+        依次应用内置目录列表、extra_patterns、从根目录到 rel_dir 各级的忽略文件，
+        后面的匹配结果覆盖前面的（取反规则可以恢复内置列表忽略的目录）。
+        """
+        rel = f"{rel_dir}/{name}" if rel_dir else name
+        result = True if is_dir and self.is_default_ignored_dir(name, rel_dir) else None
+        if self._extra:
+            matched = self._extra.match(rel, is_dir)
+            if matched is not None:
+                result = matched
+        for base, rule_set in self._chain(rel_dir):
+            matched = rule_set.match(rel[len(base) + 1:] if base else rel, is_dir)
+            if matched is not None:
+                result = matched
+        return bool(result)
+
+    def _chain(self, rel_dir: str) -> list:
+        chain = self._chains.get(rel_dir)
+        if chain is None:
+            if rel_dir:
+                parent = rel_dir.rpartition("/")[0]
+                chain = self._chain(parent) + [(rel_dir, rs) for rs in self._rules_for(rel_dir)]
+            else:
+                chain = [("", rs) for rs in self._rules_for("")]
+            self._chains[rel_dir] = chain
+        return chain
+
+    def is_ignored(self, rel: str, is_dir: bool = False) -> bool:
+        """判断任意路径是否被忽略（任一上级目录被忽略时也视为忽略）"""
+        parts = rel.split("/")
+        for i in range(len(parts)):
+            last = i == len(parts) - 1
+            if self.ignored_entry("/".join(parts[:i]), parts[i], is_dir if last else True):
+                return True
+        return False
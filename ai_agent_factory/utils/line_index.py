@@ -0,0 +1,132 @@
+"""
+按行范围读取文件：在 mmap 上建立行首偏移索引，读取某个行区间只需 O(区间大小)。
+
+索引按需向后扩展（读取前 200 行不会扫描整个 50MB 的文件），
+并按 (st_mtime_ns, st_size) 缓存，文件变化后自动失效。
+"""
+import os
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+
+
+class LineOffsetIndex:
+    """单个文件的行首偏移索引（行号从 1 开始，offsets[i] 是第 i+1 行的起始字节）"""
+
+    def __init__(self, mtime_ns: int, size: int):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.offsets = array("Q", [0])
+        self.complete = size == 0  # 是否已扫描到文件末尾
+
+    def ensure(self, mm, line: int):
+        """扩展索引，直到能确定第 line 行的结束位置（或到达文件末尾）"""
+        offsets = self.offsets
+        pos = offsets[-1]
+        while not self.complete and len(offsets) <= line:
+            nl = mm.find(b"\n", pos)
+            if nl < 0 or nl + 1 >= self.size:
+                self.complete = True
+                break
+            pos = nl + 1
+            offsets.append(pos)
+
+    @property
+    def known_lines(self) -> int:
+        return len(self.offsets) if self.size else 0
+
+    def line_end(self, line: int) -> int:
+        """第 line 行（含换行符）结束的字节位置"""
+        return self.offsets[line] if line < len(self.offsets) else self.size
+
+
+class LineIndexCache:
+    """按路径缓存 LineOffsetIndex（LRU）"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, LineOffsetIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_index(self, full_path: str, st) -> LineOffsetIndex:
+        with self._lock:
+            index = self._entries.get(full_path)
+            if index is None or index.mtime_ns != st.st_mtime_ns or index.size != st.st_size:
+                index = LineOffsetIndex(st.st_mtime_ns, st.st_size)
+                self._entries[full_path] = index
+            self._entries.move_to_end(full_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return index
+
+    def invalidate(self, full_path: str):
+        with self._lock:
+            self._entries.pop(full_path, None)
+
+    def read_lines(self, full_path: str, start_line: int = 1, end_line: int = None,
+                   max_bytes: int = None, line_offset: int = 0) -> dict:
+        """
+        读取 [start_line, end_line] 行（含两端，从 1 开始）。
+
+        参数:
+            end_line: 为 None 时读到文件末尾（仍受 max_bytes 限制）
+            max_bytes: 本次最多返回的字节数；超出时在整行处截断。单独一行就超过 max_bytes 时（压缩、生成的文件）
+                       只返回该行的前 max_bytes 字节（在 UTF-8 字符边界处截断），并给出 next_offset
+            line_offset: 从 start_line 行内的第几个字节开始读（配合 next_offset 续读超长的行）
+        返回:
+            {"content", "start_line", "end_line", "total_lines"（未扫描到末尾时为 None）, "has_more"}；
+            行被截断时另有 "next_offset"：end_line 行内下次续读的字节偏移
+        异常:
+            FileNotFoundError / OSError
+        """
+        start_line = max(1, start_line)
+        st = os.stat(full_path)
+        index = self._get_index(full_path, st)
+        if st.st_size == 0:
+            return {"content": "", "start_line": 1, "end_line": 0, "total_lines": 0, "has_more": False}
+
+        with open(full_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with self._lock:
+                index.ensure(mm, start_line)
+                if start_line > index.known_lines:
+                    total = index.known_lines
+                    return {"content": "", "start_line": start_line, "end_line": total,
+                            "total_lines": total, "has_more": False}
+                line_begin = index.offsets[start_line - 1]
+                first_end = index.line_end(start_line)
+                begin = min(line_begin + max(0, line_offset), first_end)
+                total_lines = index.known_lines if index.complete else None
+                if max_bytes is not None and first_end - begin > max_bytes:
+                    cut = begin + max_bytes
+                    while cut > begin + max_bytes - 4 and cut > begin and (mm[cut] & 0xC0) == 0x80:
+                        cut -= 1  # 不把多字节字符切成两半
+                    return {
+                        "content": mm[begin:cut].decode("utf-8", errors="replace"),
+                        "start_line": start_line,
+                        "end_line": start_line,
+                        "total_lines": total_lines,
+                        "has_more": True,
+                        "next_offset": cut - line_begin,
+                    }
+                last = start_line
+                while end_line is None or last < end_line:
+                    index.ensure(mm, last + 1)
+                    if last + 1 > index.known_lines:
+                        break
+                    if max_bytes is not None and index.line_end(last + 1) - begin > max_bytes:
+                        break
+                    last += 1
+                index.ensure(mm, last)
+                end = index.line_end(last)
+                has_more = index.known_lines > last
+                total_lines = index.known_lines if index.complete else None
+            data = mm[begin:end]
+
+        return {
+            "content": data.decode("utf-8", errors="replace"),
+            "start_line": start_line,
+            "end_line": last,
+            "total_lines": total_lines,
+            "has_more": has_more,
+        }
@@ -0,0 +1,331 @@
+"""
+补丁式编辑：把 SEARCH/REPLACE 块或 unified diff 应用到文件，只需输出改动部分而不是整个文件。
+
+支持的格式:
+    <<<<<<< SEARCH
+    原内容
+    =======
+    新内容
+    >>>>>>> REPLACE
+
+    或 unified diff（--- / +++ 文件头可省略）:
+    @@ -12,3 +12,4 @@
+     上下文
+    -删除的行
+    +新增的行
+
+定位原内容时逐级放宽：精确匹配 → 忽略行尾空白 → 忽略缩进 → 按行相似度模糊匹配。
+所有块都定位成功才写入文件（全部成功或全部不改），写入使用临时文件 + os.replace 保证原子性。
+"""
+import os
+import re
+import difflib
+import tempfile
+
+FUZZY_THRESHOLD = 0.85  # 模糊匹配时，块内每行平均相似度的下限
+
+_SEARCH_MARK = re.compile(r'^<{5,9} ?SEARCH\s*$')
+_DIVIDER_MARK = re.compile(r'^={5,9}\s*$')
+_REPLACE_MARK = re.compile(r'^>{5,9} ?REPLACE\s*$')
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@')
+
+
+class PatchError(ValueError):
+    """补丁格式无效"""
+
+
+class Hunk:
+    """一个替换块：search_lines 替换为 replace_lines，hint_line 为 diff 中给出的原始行号（从 1 开始）"""
+
+    def __init__(self, search_lines: list, replace_lines: list, hint_line: int = None):
+        self.search_lines = search_lines
+        self.replace_lines = replace_lines
+        self.hint_line = hint_line
+
+
+def _parse_search_replace(lines: list) -> list:
+    hunks = []
+    i = 0
+    while i < len(lines):
+        if not _SEARCH_MARK.match(lines[i]):
+            i += 1
+            continue
+        search, replace = [], []
+        i += 1
+        while i < len(lines) and not _DIVIDER_MARK.match(lines[i]):
+            search.append(lines[i])
+            i += 1
+        if i >= len(lines):
+            raise PatchError(f"第 {len(hunks) + 1} 个 SEARCH 块缺少 =======")
+        i += 1
+        while i < len(lines) and not _REPLACE_MARK.match(lines[i]):
+            replace.append(lines[i])
+            i += 1
+        if i >= len(lines):
+            raise PatchError(f"第 {len(hunks) + 1} 个 SEARCH 块缺少 >>>>>>> REPLACE")
+        i += 1
+        hunks.append(Hunk(search, replace))
+    return hunks
+
+
+def _parse_unified_diff(lines: list) -> list:
+    hunks = []
+    current = None
+    for line in lines:
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = Hunk([], [], int(header.group(1)))
+            hunks.append(current)
+            continue
+        if current is None or line.startswith("\\"):  # 文件头或 "\ No newline at end of file"
+            continue
+        if line.startswith("-"):
+            current.search_lines.append(line[1:])
+        elif line.startswith("+"):
+            current.replace_lines.append(line[1:])
+        else:
+            # 上下文行；模型常常丢掉空行前面的空格
+            text = line[1:] if line.startswith(" ") else line
+            current.search_lines.append(text)
+            current.replace_lines.append(text)
+    return hunks
+
+
+def parse_patch(patch_text: str) -> list:
+    """解析补丁文本为 Hunk 列表；格式无法识别时抛出 PatchError"""
+    lines = patch_text.splitlines()
+    if any(_SEARCH_MARK.match(line) for line in lines):
+        hunks = _parse_search_replace(lines)
+    elif any(_HUNK_HEADER.match(line) for line in lines):
+        hunks = _parse_unified_diff(lines)
+    else:
+        raise PatchError("未识别的补丁格式：需要 SEARCH/REPLACE 块或 unified diff（@@ 块头）")
+    if not hunks:
+        raise PatchError("补丁中没有任何修改块")
+    return hunks
+
+
+def _indent_of(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _reindent(replace_lines: list, search_lines: list, matched_lines: list):
+    """
+    忽略缩进匹配成功时，按 SEARCH 与文件中对应行的缩进调整替换内容。
+    逐行建立 "SEARCH 缩进 -> 实际缩进" 的映射，替换内容的每一行按自己的缩进层级换算
+    （不在映射中的更深层级保留相对于最近一级的多余缩进），各层级之间的相对结构不会被压平。
+    同一 SEARCH 缩进对应了不同的实际缩进（相对缩进与文件不一致）时返回 None。
+    """
+    mapping = {}
+    for src, dst in zip(search_lines, matched_lines):
+        if not src.strip() or src.strip() != dst.strip():
+            continue  # 空行、模糊匹配中内容不同的行不参与换算
+        src_indent, dst_indent = _indent_of(src), _indent_of(dst)
+        if mapping.setdefault(src_indent, dst_indent) != dst_indent:
+            return None
+    if all(k == v for k, v in mapping.items()):
+        return replace_lines
+    levels = sorted(mapping, key=len, reverse=True)
+    result = []
+    for line in replace_lines:
+        indent = _indent_of(line)
+        base = next((k for k in levels if indent.startswith(k)), None) if line.strip() else None
+        result.append(line if base is None else mapping[base] + line[len(base):])
+    return result
+
+
+def _find_candidates(lines: list, search: list, normalize) -> list:
+    n, m = len(lines), len(search)
+    target = [normalize(l) for l in search]
+    first = target[0]
+    return [
+        i for i in range(n - m + 1)
+        if normalize(lines[i]) == first and all(normalize(lines[i + k]) == target[k] for k in range(1, m))
+    ]
+
+
+def _fuzzy_candidates(lines: list, search: list) -> list:
+    """按行相似度寻找最接近的位置，返回 [(起始行, 相似度)]（只保留最高分）"""
+    m = len(search)
+    target = [l.strip() for l in search]
+    stripped = [l.strip() for l in lines]
+    best, best_score = [], 0.0
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    for i in range(len(lines) - m + 1):
+        # 先用完全相同的行数做快速筛选
+        same = sum(1 for k in range(m) if stripped[i + k] == target[k])
+        if same < m * FUZZY_THRESHOLD / 2:
+            continue
+        total = 0.0
+        for k in range(m):
+            if stripped[i + k] == target[k]:
+                total += 1.0
+            else:
+                matcher.set_seqs(stripped[i + k], target[k])
+                total += matcher.ratio()
+        score = total / m
+        if score > best_score + 1e-9:
+            best, best_score = [i], score
+        elif abs(score - best_score) <= 1e-9:
+            best.append(i)
+    if best_score < FUZZY_THRESHOLD:
+        return []
+    return [(i, best_score) for i in best]
+
+
+def _pick(candidates: list, hint: int):
+    """多处匹配时选择离 diff 行号最近的一处；没有行号时视为歧义"""
+    if len(candidates) == 1:
+        return candidates[0]
+    if hint is None:
+        return None
+    return min(candidates, key=lambda i: abs(i - (hint - 1)))
+
+
+def _locate(lines: list, hunk: Hunk, hint: int = None):
+    """返回 (起始行下标, 匹配方式, 替换内容)；失败时返回 (None, 原因, None)"""
+    search = hunk.search_lines
+    strategies = (
+        ("exact", lambda l: l),
+        ("whitespace", lambda l: l.rstrip()),
+        ("indent", lambda l: l.strip()),
+    )
+    for name, normalize in strategies:
+        candidates = _find_candidates(lines, search, normalize)
+        if candidates:
+            start = _pick(candidates, hint)
+            if start is None:
+                return None, f"SEARCH 内容出现 {len(candidates)} 次，请包含更多上下文以唯一定位", None
+            replace = hunk.replace_lines
+            if name == "indent":
+                replace = _reindent(replace, search, lines[start:start + len(search)])
+                if replace is None:
+                    continue  # 相对缩进与文件不一致，交给模糊匹配
+            return start, name, replace
+
+    fuzzy = _fuzzy_candidates(lines, search)
+    if fuzzy:
+        start = _pick([i for i, _ in fuzzy], hint)
+        if start is None:
+            return None, f"模糊匹配到 {len(fuzzy)} 处相同相似度的位置，请包含更多上下文", None
+        score = dict(fuzzy)[start]
+        replace = _reindent(hunk.replace_lines, search, lines[start:start + len(search)])
+        if replace is None:
+            return None, "SEARCH 内容各行的相对缩进与文件不一致，请按文件中的实际缩进重写", None
+        return start, f"fuzzy({score:.2f})", replace
+    return None, "未找到 SEARCH 内容", None
+
+
+def _split_lines(text: str) -> tuple:
+    """
+    只按换行符切分：返回 (各行内容, 各行的行尾)，行尾为 '\r\n'、'\n' 或 ''（最后一行没有换行符）。
+    不用 str.splitlines：它还会在 \x0c、\u2028 等字符处断行，重新拼接后会改动补丁没有触及的内容。
+    """
+    parts = text.split("\n")
+    lines, ends = [], []
+    for part in parts[:-1]:
+        if part.endswith("\r"):
+            lines.append(part[:-1])
+            ends.append("\r\n")
+        else:
+            lines.append(part)
+            ends.append("\n")
+    if parts[-1]:
+        lines.append(parts[-1])
+        ends.append("")
+    return lines, ends
+
+
+def _replace_lines(lines: list, ends: list, start: int, count: int, replace: list, newline: str):
+    """
+    把 lines[start:start + count] 替换为 replace，同时维护行尾：
+    替换区域内原有的行尾按位置沿用，多出的行沿用区域最后一行的换行符（纯插入时用文件的主要换行符），
+    文件末尾是否有换行符保持不变。
+    """
+    old_ends = ends[start:start + count]
+    at_end = start + count == len(lines)
+    no_final_newline = at_end and bool(ends) and ends[-1] == ""
+    fill = old_ends[-1] if old_ends and old_ends[-1] else newline
+    new_ends = [old_ends[i] if i < count - 1 else fill for i in range(len(replace))]
+    if replace and count:
+        new_ends[-1] = old_ends[-1]
+    elif replace and no_final_newline:
+        # 在没有结尾换行符的最后一行之后插入：原最后一行补上换行符，新的最后一行不加
+        ends[start - 1] = newline
+        new_ends[-1] = ""
+    elif not replace and no_final_newline and start > 0:
+        ends[start - 1] = ""  # 删除了最后几行：新的最后一行同样不带换行符
+    lines[start:start + count] = replace
+    ends[start:start + count] = new_ends
+
+
+def apply_hunks(text: str, hunks: list) -> tuple:
+    """
+    按顺序把 hunks 应用到 text。未被修改的行（包括各自的行尾）逐字节保持原样。
+
+    返回:
+        (新文本或 None, 每个块的状态列表)；任一块失败时新文本为 None
+    """
+    newline = "\r\n" if "\r\n" in text else "\n"
+    lines, ends = _split_lines(text)
+    statuses = []
+    failed = False
+    offset = 0  # 前面的块造成的行数变化，用于修正 diff 行号
+    for idx, hunk in enumerate(hunks, 1):
+        if not hunk.search_lines:
+            # 空 SEARCH：diff 给出行号时插入到该行，否则追加到文件末尾
+            at = len(lines) if hunk.hint_line is None else min(max(hunk.hint_line + offset, 0), len(lines))
+            _replace_lines(lines, ends, at, 0, list(hunk.replace_lines), newline)
+            offset += len(hunk.replace_lines)
+            statuses.append({"hunk": idx, "status": "applied", "match": "insert", "line": at + 1})
+            continue
+        hint = hunk.hint_line + offset if hunk.hint_line is not None else None
+        start, how, replace = _locate(lines, hunk, hint)
+        if start is None:
+            failed = True
+            preview = hunk.search_lines[0].strip()[:60]
+            statuses.append({"hunk": idx, "status": "failed", "error": how, "search": preview})
+            continue
+        _replace_lines(lines, ends, start, len(hunk.search_lines), list(replace), newline)
+        offset += len(replace) - len(hunk.search_lines)
+        statuses.append({"hunk": idx, "status": "applied", "match": how, "line": start + 1})
+    if failed:
+        return None, statuses
+    return "".join(line + end for line, end in zip(lines, ends)), statuses
+
+
+def _read_umask() -> int:
+    # os.umask 只能 "设置并返回旧值"，在导入时（通常是单线程）读取一次，避免运行中临时改动影响其它线程
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _read_umask()
+
+
+def atomic_write(full_path: str, content: str, encoding: str = "utf-8", newline: str = None):
+    """
+    写入同目录下的临时文件后 os.replace，保证读者看到的要么是旧文件要么是完整的新文件。
+    newline 与 open() 的同名参数含义相同（None 表示按平台转换换行符）。
+    """
+    directory = os.path.dirname(full_path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".edit")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline=newline) as f:
+            f.write(content)
+        try:
+            mode = os.stat(full_path).st_mode & 0o7777
+        except OSError:
+            mode = 0o666 & ~_UMASK  # 新文件：与 open() 创建的文件权限一致（mkstemp 默认为 0600）
+        try:
+            os.chmod(tmp_path, mode)
+        except OSError:
+            pass
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,295 @@
+"""
+项目文件路径索引：用 os.scandir 一次性构建，之后由 FileOperationHandler 的写操作原地更新，
+外部修改通过比较目录 mtime 的增量重扫发现。list_files / list_dir 直接从索引中查询，无需 os.walk。
+遍历时按 IgnoreRules 剪枝：被忽略的目录（.git、node_modules、虚拟环境、.gitignore 中的目录等）不会进入。
+"""
+import os
+import re
+import time
+import bisect
+import fnmatch
+import threading
+from functools import lru_cache
+from ai_agent_factory.utils.path_search import PathTrigramIndex, subsequence_search
+from ai_agent_factory.utils.ignore_rules import IgnoreRules
+
+_CASE_INSENSITIVE = os.path.normcase("A") == "a"  # Windows 下 fnmatch 不区分大小写
+
+
+@lru_cache(maxsize=256)
+def _compile_glob(pattern: str):
+    """把通配符编译为正则（与 fnmatch.fnmatch 语义一致，* 可以匹配 /）"""
+    return re.compile(fnmatch.translate(pattern), re.IGNORECASE if _CASE_INSENSITIVE else 0)
+
+
+def glob_match(path: str, pattern: str) -> bool:
+    """单个路径是否匹配通配符（与 PathIndex.glob 语义一致）"""
+    return _compile_glob(pattern).match(path) is not None
+
+
+def _literal_dir_prefix(pattern: str) -> str:
+    """返回通配符中第一个通配字符之前的目录部分，如 'log/2024/*.log' -> 'log/2024'"""
+    for i, c in enumerate(pattern):
+        if c in "*?[":
+            return pattern[:i].rpartition("/")[0]
+    return pattern.rpartition("/")[0]
+
+
+class PathIndex:
+    """
+    文件路径索引（路径均为相对于 root、以 / 分隔的字符串，根目录为 ''）。
+
+    内部结构:
+        _paths: 全部文件路径的有序数组，目录前缀查询用二分定位
+        _dir_files / _dir_subdirs: 每个目录直接包含的文件名 / 子目录名
+        _dir_mtimes: 每个目录的 mtime，用于增量重扫
+    """
+
+    def __init__(self, root: str, refresh_interval: float = 1.0, ignore: IgnoreRules = None):
+        """
+        参数:
+            root: 索引的根目录
+            refresh_interval: 两次外部变更检查的最小间隔（秒）
+            ignore: 忽略规则；为 None 时使用默认规则（含 .gitignore / .codegeniusignore）
+        """
+        self.root = os.path.abspath(root)
+        self.refresh_interval = refresh_interval
+        self.ignore = ignore if ignore is not None else IgnoreRules(self.root)
+        self._lock = threading.RLock()
+        self._paths: list[str] = []
+        self._dir_files: dict[str, set] = {}
+        self._dir_subdirs: dict[str, set] = {}
+        self._dir_mtimes: dict[str, int] = {}
+        self._built = False
+        self._last_refresh = 0.0
+        self._trigrams = None  # 模糊搜索索引（首次 search 时构建，之后随路径增删同步）
+
+    # ---------- 构建与刷新 ----------
+
+    def _full(self, rel: str) -> str:
+        return os.path.join(self.root, *rel.split("/")) if rel else self.root
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    def _scan_dir(self, rel_dir: str):
+        """
+        读取单个目录的直接内容（已去掉被忽略的条目），返回 (mtime_ns, 文件名集合, 子目录名集合)；
+        目录不存在时返回 None
+        """
+        full = self._full(rel_dir)
+        ignored = self.ignore.ignored_entry
+        try:
+            mtime = os.stat(full).st_mtime_ns
+            files, subdirs = set(), set()
+            with os.scandir(full) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            # 与 os.walk 一致：不进入指向目录的符号链接
+                            if not entry.is_symlink() and not ignored(rel_dir, entry.name, True):
+                                subdirs.add(entry.name)
+                        elif entry.is_file() and not ignored(rel_dir, entry.name, False):
+                            files.add(entry.name)
+                    except OSError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+        return mtime, files, subdirs
+
+    def _add_tree(self, rel_dir: str, collected: list):
+        """扫描目录及其子目录，把文件路径追加到 collected"""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            scanned = self._scan_dir(current)
+            if scanned is None:
+                continue
+            mtime, files, subdirs = scanned
+            self._dir_mtimes[current] = mtime
+            self._dir_files[current] = files
+            self._dir_subdirs[current] = subdirs
+            collected.extend(self._join(current, name) for name in files)
+            stack.extend(self._join(current, name) for name in subdirs)
+
+    def build(self):
+        """完整构建索引"""
+        with self._lock:
+            self._dir_files.clear()
+            self._dir_subdirs.clear()
+            self._dir_mtimes.clear()
+            collected = []
+            self._add_tree("", collected)
+            collected.sort()
+            self._paths = collected
+            self._built = True
+            if self._trigrams is not None:
+                self._build_trigrams()
+            self._last_refresh = time.monotonic()
+
+    def _remove_tree(self, rel_dir: str):
+        """从索引中移除目录及其全部内容"""
+        prefix = rel_dir + "/"
+        lo = bisect.bisect_left(self._paths, prefix)
+        hi = bisect.bisect_left(self._paths, rel_dir + "0")  # '0' 是 '/' 的下一个字符
+        if self._trigrams is not None:
+            for path in self._paths[lo:hi]:
+                self._trigrams.remove(path)
+        del self._paths[lo:hi]
+        for d in [d for d in self._dir_mtimes if d == rel_dir or d.startswith(prefix)]:
+            self._dir_mtimes.pop(d, None)
+            self._dir_files.pop(d, None)
+            self._dir_subdirs.pop(d, None)
+
+    def refresh(self, force: bool = False):
+        """
+        检查外部变更：只 stat 每个已知目录，mtime 变化的目录才重新读取其直接内容。
+        """
+        with self._lock:
+            if not self._built:
+                self.build()
+                return
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+            if self.ignore.changed():
+                self.build()  # 忽略规则变了：按新规则重建
+                return
+            for rel_dir in list(self._dir_mtimes):
+                if rel_dir not in self._dir_mtimes:
+                    continue  # 已随父目录一起移除
+                try:
+                    mtime = os.stat(self._full(rel_dir)).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime == self._dir_mtimes[rel_dir]:
+                    continue
+                scanned = self._scan_dir(rel_dir) if mtime is not None else None
+                if scanned is None:
+                    self._remove_file_entry_of_dir(rel_dir)
+                    self._remove_tree(rel_dir)
+                    continue
+                mtime, files, subdirs = scanned
+                old_files = self._dir_files.get(rel_dir, set())
+                old_subdirs = self._dir_subdirs.get(rel_dir, set())
+                for name in old_files - files:
+                    self._discard_path(self._join(rel_dir, name))
+                for name in files - old_files:
+                    self._insert_path(self._join(rel_dir, name))
+                for name in old_subdirs - subdirs:
+                    self._remove_tree(self._join(rel_dir, name))
+                new_paths = []
+                for name in subdirs - old_subdirs:
+                    self._add_tree(self._join(rel_dir, name), new_paths)
+                for path in new_paths:
+                    self._insert_path(path)
+                self._dir_mtimes[rel_dir] = mtime
+                self._dir_files[rel_dir] = files
+                self._dir_subdirs[rel_dir] = subdirs
+
+    def _remove_file_entry_of_dir(self, rel_dir: str):
+        parent, _, name = rel_dir.rpartition("/")
+        if parent in self._dir_subdirs:
+            self._dir_subdirs[parent].discard(name)
+
+    def _insert_path(self, rel: str):
+        i = bisect.bisect_left(self._paths, rel)
+        if i == len(self._paths) or self._paths[i] != rel:
+            self._paths.insert(i, rel)
+            if self._trigrams is not None:
+                self._trigrams.add(rel)
+
+    def _discard_path(self, rel: str):
+        i = bisect.bisect_left(self._paths, rel)
+        if i < len(self._paths) and self._paths[i] == rel:
+            del self._paths[i]
+            if self._trigrams is not None:
+                self._trigrams.remove(rel)
+
+    # ---------- 写操作同步 ----------
+    # 自身写操作直接更新索引，但不改动目录记录的 mtime：下次刷新时这些目录会被重读一次，
+    # 这样同一目录里同时发生的外部变更也不会被掩盖。
+
+    def add_file(self, rel: str):
+        """记录新建/更新的文件（父目录不存在于索引时一并补上；被忽略的路径不记录）"""
+        with self._lock:
+            if not self._built or self.ignore.is_ignored(rel):
+                return
+            parts = rel.split("/")
+            parent = ""
+            for name in parts[:-1]:
+                self._dir_subdirs.setdefault(parent, set()).add(name)
+                child = self._join(parent, name)
+                if child not in self._dir_files:
+                    self._dir_files[child] = set()
+                    self._dir_subdirs[child] = set()
+                    self._dir_mtimes[child] = -1  # 新目录：下次刷新时读取一次
+                parent = child
+            self._dir_files.setdefault(parent, set()).add(parts[-1])
+            self._insert_path(rel)
+
+    def remove_file(self, rel: str):
+        """记录被删除的文件"""
+        with self._lock:
+            if not self._built:
+                return
+            parent, _, name = rel.rpartition("/")
+            if parent in self._dir_files:
+                self._dir_files[parent].discard(name)
+            self._discard_path(rel)
+
+    # ---------- 查询 ----------
+
+    def files_in_dir(self, rel_dir: str = "") -> list[str]:
+        """目录下的直接文件（相对于 root 的路径，已排序）"""
+        with self._lock:
+            self.refresh()
+            return sorted(self._join(rel_dir, name) for name in self._dir_files.get(rel_dir, ()))
+
+    def has_dir(self, rel_dir: str) -> bool:
+        with self._lock:
+            self.refresh()
+            return rel_dir in self._dir_files
+
+    def all_files(self, rel_dir: str = "") -> list[str]:
+        """目录下（递归）全部文件路径，已排序"""
+        with self._lock:
+            self.refresh()
+            if not rel_dir:
+                return list(self._paths)
+            lo = bisect.bisect_left(self._paths, rel_dir + "/")
+            hi = bisect.bisect_left(self._paths, rel_dir + "0")
+            return self._paths[lo:hi]
+
+    def glob(self, pattern: str, rel_dir: str = "") -> list[str]:
+        """
+        递归匹配通配符（匹配相对于 root 的完整路径，语义同 fnmatch）。
+        通配符含固定的目录前缀时（如 'log/*.log'），先用二分把范围缩小到该目录。
+        """
+        regex = _compile_glob(pattern)
+        prefix = _literal_dir_prefix(pattern)
+        if prefix and not _CASE_INSENSITIVE and (not rel_dir or prefix == rel_dir or prefix.startswith(rel_dir + "/")):
+            rel_dir = prefix
+        match = regex.match
+        return [p for p in self.all_files(rel_dir) if match(p)]
+
+    def _build_trigrams(self):
+        self._trigrams = PathTrigramIndex()
+        for path in self._paths:
+            self._trigrams.add(path)
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, float]]:
+        """
+        模糊搜索文件路径，返回 [(路径, 得分)]。
+        先查三元组索引，没有结果时退化为字符子序列匹配。
+        """
+        with self._lock:
+            self.refresh()
+            if self._trigrams is None:
+                self._build_trigrams()
+            results = self._trigrams.search(query, limit)
+            if not results:
+                results = subsequence_search(self._paths, query, limit)
+            return results
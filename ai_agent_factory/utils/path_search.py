@@ -0,0 +1,138 @@
+"""
+路径模糊搜索：基于三元组（trigram）的倒排索引，支持增量更新。
+
+路径被拆成若干"片段"（目录名、文件名以及按 _ - . 拆出的单词），三元组索引建在去重后的片段上，
+片段再映射到包含它的路径。项目里片段大量重复，因此索引远小于直接对每条路径建三元组。
+"""
+import re
+import threading
+
+_SPLIT_PATTERN = re.compile(r'[/\\_\-.\s]+')
+MIN_TOKEN_SCORE = 0.5  # 查询词与片段的相似度低于该值时忽略
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _components(path: str) -> set:
+    """路径 -> 片段集合（全部小写）"""
+    lowered = path.lower()
+    comps = set()
+    for segment in lowered.split("/"):
+        if segment:
+            comps.add(segment)
+            comps.update(word for word in _SPLIT_PATTERN.split(segment) if word)
+    return comps
+
+
+class PathTrigramIndex:
+    """片段级三元组索引"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._comp_paths: dict[str, set] = {}    # 片段 -> 路径集合
+        self._trigram_comps: dict[str, set] = {}  # 三元组 -> 片段集合
+        self._short_comps: set = set()            # 不足 3 个字符、没有三元组的片段
+
+    def add(self, path: str):
+        with self._lock:
+            for comp in _components(path):
+                paths = self._comp_paths.get(comp)
+                if paths is None:
+                    paths = self._comp_paths[comp] = set()
+                    grams = _trigrams(comp)
+                    if not grams:
+                        self._short_comps.add(comp)
+                    for gram in grams:
+                        self._trigram_comps.setdefault(gram, set()).add(comp)
+                paths.add(path)
+
+    def remove(self, path: str):
+        with self._lock:
+            for comp in _components(path):
+                paths = self._comp_paths.get(comp)
+                if paths is None:
+                    continue
+                paths.discard(path)
+                if paths:
+                    continue
+                del self._comp_paths[comp]
+                self._short_comps.discard(comp)
+                for gram in _trigrams(comp):
+                    comps = self._trigram_comps.get(gram)
+                    if comps is not None:
+                        comps.discard(comp)
+                        if not comps:
+                            del self._trigram_comps[gram]
+
+    def _match_components(self, token: str) -> dict:
+        """查询词 -> {片段: 相似度}"""
+        grams = _trigrams(token)
+        scores = {}
+        if grams:
+            counts = {}
+            for gram in grams:
+                for comp in self._trigram_comps.get(gram, ()):
+                    counts[comp] = counts.get(comp, 0) + 1
+            for comp, hit in counts.items():
+                # 兼顾召回（命中查询词的比例）与精确（片段长度接近查询词）
+                score = hit / len(grams) * 0.8 + hit / max(len(comp) - 2, 1) * 0.2
+                if comp == token:
+                    score += 1.0
+                elif comp.startswith(token):
+                    score += 0.3
+                if score >= MIN_TOKEN_SCORE:
+                    scores[comp] = score
+        else:
+            for comp in list(self._comp_paths):
+                if token in comp:
+                    scores[comp] = 1.0 + (1.0 if comp == token else 0.0) - len(comp) / 100
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, float]]:
+        """返回 [(路径, 得分)]，按得分从高到低排序"""
+        tokens = [t for t in _SPLIT_PATTERN.split(query.lower()) if t]
+        if not tokens:
+            return []
+        with self._lock:
+            path_scores = {}
+            for token in tokens:
+                best = {}
+                for comp, score in self._match_components(token).items():
+                    for path in self._comp_paths.get(comp, ()):
+                        if score > best.get(path, (0, None))[0]:
+                            best[path] = (score, comp)
+                for path, (score, comp) in best.items():
+                    total, matched = path_scores.get(path, (0.0, 0))
+                    if comp in path.rpartition("/")[2].lower():
+                        score *= 1.5  # 文件名命中比目录命中更重要
+                    path_scores[path] = (total + score, matched + 1)
+        ranked = sorted(
+            path_scores.items(),
+            key=lambda item: (-item[1][1], -item[1][0], len(item[0]), item[0])
+        )
+        return [(path, round(score, 3)) for path, (score, _) in ranked[:limit]]
+
+
+def subsequence_search(paths, query: str, limit: int = 10) -> list[tuple[str, float]]:
+    """
+    兜底搜索：查询中的字符（去掉分隔符）按顺序出现在路径中即视为匹配，匹配越紧凑得分越高。
+    """
+    needle = "".join(t for t in _SPLIT_PATTERN.split(query.lower()) if t)
+    if not needle:
+        return []
+    results = []
+    for path in paths:
+        lowered = path.lower()
+        pos = start = lowered.find(needle[0])
+        if pos < 0:
+            continue
+        for c in needle[1:]:
+            pos = lowered.find(c, pos + 1)
+            if pos < 0:
+                break
+        else:
+            results.append((path, round(len(needle) / (pos - start + 1), 3)))
+    results.sort(key=lambda item: (-item[1], len(item[0]), item[0]))
+    return results[:limit]
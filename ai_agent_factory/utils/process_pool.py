@@ -0,0 +1,26 @@
+"""
+共享的进程池：大量文件的 grep、批量解析 Python 符号等 CPU 密集任务使用，绕开 GIL。
+
+    - 整个进程只有一个，首次使用时创建，之后复用，不会每次搜索都重新启动工作进程
+    - 用 spawn 方式启动工作进程：调用方通常是文件操作的工作线程，在多线程进程中 fork 可能死锁
+    - 打包为可执行文件（PyInstaller）时，入口脚本必须在 __main__ 中先调用 multiprocessing.freeze_support()，
+      否则 Windows 下的工作进程会重新执行入口程序
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+_pool = None
+_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """返回共享进程池（工作进程异常退出导致进程池不可用时重新创建）"""
+    global _pool
+    with _lock:
+        if _pool is None or getattr(_pool, "_broken", False):
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
@@ -0,0 +1,102 @@
+"""
+文件读取缓存：缓存解码后的文本，按字节数上限做 LRU 淘汰。
+
+每次命中前都会 os.stat 一次，(st_mtime_ns, st_size) 与缓存时不一致即视为失效，
+因此外部修改不会读到旧内容；自身写入时直接用新内容更新缓存，下次读取无需访问磁盘。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+def normalize_newlines(text: str) -> str:
+    """与文本模式 open() 的通用换行一致：\\r\\n 和 \\r 都转为 \\n"""
+    if "\r" not in text:
+        return text
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+class ReadCache:
+    """路径 -> 文本 的 LRU 缓存（以文件字节数计量）"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_file_bytes: int = 4 * 1024 * 1024):
+        """
+        参数:
+            max_bytes: 缓存总大小上限
+            max_file_bytes: 超过该大小的文件不缓存
+        """
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: OrderedDict[str, tuple] = OrderedDict()  # 路径 -> (mtime_ns, size, text)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, full_path: str):
+        """返回缓存的文本；未缓存或已失效时返回 None（文件不存在时抛出 FileNotFoundError）"""
+        st = os.stat(full_path)
+        with self._lock:
+            entry = self._entries.get(full_path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(full_path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def read(self, full_path: str) -> str:
+        """读取文件（utf-8），优先使用缓存"""
+        text = self.get(full_path)
+        if text is not None:
+            return text
+        st = os.stat(full_path)  # 读取之前取 stat：读取期间文件被改时，下次校验会失败而不是读到旧内容
+        with open(full_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        self._store(full_path, st, text)
+        return text
+
+    def put(self, full_path: str, text: str):
+        """自身写入后更新缓存（text 为写入的内容）"""
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            self.invalidate(full_path)
+            return
+        self._store(full_path, st, normalize_newlines(text))
+
+    def _store(self, full_path: str, st, text: str):
+        with self._lock:
+            old = self._entries.pop(full_path, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if st.st_size > self.max_file_bytes:
+                return
+            self._entries[full_path] = (st.st_mtime_ns, st.st_size, text)
+            self._bytes += st.st_size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+
+    def invalidate(self, full_path: str):
+        with self._lock:
+            old = self._entries.pop(full_path, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,288 @@
+"""
+仓库地图：基于文件索引和 Python 符号生成紧凑的 "目录树 + 签名" 摘要，在会话开始时提供给模型。
+
+    - 文件重要性 = import 图上的 PageRank（被越多模块依赖越重要）+ 最近修改加权
+    - 按重要性从高到低选取文件，二分查找能放进 token 预算的最大文件数，再按目录树输出
+    - 每个 .py 文件的签名摘要与 import 按 (mtime_ns, size) 缓存在 .codegenius/repo_map.json，
+      只重新解析变化的文件；项目没有任何变化时直接复用上次渲染的结果
+"""
+import os
+import json
+import hashlib
+import threading
+
+from ai_agent_factory.utils.symbol_index import SymbolIndex
+from ai_agent_factory.utils.token_counter import estimate_tokens
+from ai_agent_factory.utils.state_dir import make_dirs
+
+CACHE_FILE = os.path.join(".codegenius", "repo_map.json")
+_CACHE_VERSION = 1
+DAMPING = 0.85
+PAGERANK_ITERATIONS = 30
+RECENCY_WEIGHT = 0.5     # 最近修改加权相对于 PageRank（归一化到 0~1）的权重
+RECENCY_HALF_LIFE = 8    # 按修改时间排序，每往后 8 个文件加权减半
+MAX_SYMBOLS_PER_FILE = 30
+MAX_SIGNATURE_LENGTH = 120
+
+
+def _summarize(result: dict) -> dict:
+    """从符号索引结果中提取地图需要的部分：顶层定义和类的公开方法"""
+    symbols = []
+    for s in result["symbols"]:
+        if s["depth"] > 1 or (s["depth"] == 1 and s["kind"] != "method"):
+            continue
+        short_name = s["name"].rpartition(".")[2]
+        if s["depth"] == 1 and short_name.startswith("_") and short_name != "__init__":
+            continue
+        signature = s["signature"]
+        if len(signature) > MAX_SIGNATURE_LENGTH:
+            signature = signature[:MAX_SIGNATURE_LENGTH] + "..."
+        symbols.append([s["depth"], signature])
+    return {"symbols": symbols, "imports": result["imports"]}
+
+
+def _module_names(rel: str) -> list:
+    """.py 文件可能对应的模块名（去掉 0~n 层前导目录，兼容 src/ 布局），按优先级排序"""
+    parts = rel[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return [".".join(parts[k:]) for k in range(len(parts)) if parts[k:]]
+
+
+def _pagerank(nodes: list, edges: dict) -> dict:
+    """edges: 节点 -> 它 import 的节点集合；排名沿 import 方向流向被依赖的模块"""
+    n = len(nodes)
+    if not n:
+        return {}
+    rank = dict.fromkeys(nodes, 1.0 / n)
+    for _ in range(PAGERANK_ITERATIONS):
+        dangling = sum(rank[node] for node in nodes if not edges.get(node))
+        base = (1 - DAMPING) / n + DAMPING * dangling / n
+        new_rank = dict.fromkeys(nodes, base)
+        for src, targets in edges.items():
+            if targets:
+                share = DAMPING * rank[src] / len(targets)
+                for dst in targets:
+                    new_rank[dst] += share
+        delta = sum(abs(new_rank[node] - rank[node]) for node in nodes)
+        rank = new_rank
+        if delta < 1e-6:
+            break
+    return rank
+
+
+class RepoMap:
+    """项目仓库地图"""
+
+    def __init__(self, root: str, path_index, symbol_index: SymbolIndex = None, cache_path: str = None):
+        """
+        参数:
+            root: 项目根目录
+            path_index: PathIndex 实例，提供文件列表（已按忽略规则剪枝）
+            symbol_index: SymbolIndex 实例，用于（批量、可并行地）解析变化的 .py 文件
+            cache_path: 磁盘缓存路径，默认为 <root>/.codegenius/repo_map.json
+        """
+        self.root = os.path.abspath(root)
+        self.path_index = path_index
+        self.symbol_index = symbol_index or SymbolIndex(self.root, path_index)
+        self.cache_path = cache_path or os.path.join(self.root, CACHE_FILE)
+        self._files: dict[str, list] = {}  # 相对路径 -> [mtime_ns, size, 摘要或 None]
+        self._rendered = {}  # {"key": 状态哈希, "text": 渲染结果}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _full(self, rel: str) -> str:
+        return os.path.join(self.root, *rel.split("/"))
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != _CACHE_VERSION:
+            return
+        self._files = data.get("files", {})
+        self._rendered = data.get("rendered", {})
+
+    def _save(self):
+        if not self._dirty:
+            return
+        make_dirs(os.path.dirname(self.cache_path))
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": _CACHE_VERSION, "files": self._files, "rendered": self._rendered},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+    def _scan(self) -> dict:
+        """stat 全部文件并增量更新 .py 摘要，返回 {相对路径: mtime_ns}"""
+        mtimes, stale = {}, []
+        for rel in self.path_index.all_files():
+            try:
+                st = os.stat(self._full(rel))
+            except OSError:
+                continue
+            mtimes[rel] = st.st_mtime_ns
+            if not rel.endswith(".py"):
+                continue
+            entry = self._files.get(rel)
+            if entry is None or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+                stale.append(rel)
+
+        if stale:
+            parsed = self.symbol_index.parse_many([self._full(rel) for rel in stale])
+            for rel, (mtime, size, result, _) in zip(stale, parsed):
+                if mtime is None:
+                    continue
+                self._files[rel] = [mtime, size, _summarize(result) if result is not None else None]
+            self._dirty = True
+        for rel in [rel for rel in self._files if rel not in mtimes]:
+            del self._files[rel]
+            self._dirty = True
+        return mtimes
+
+    def _resolve_imports(self) -> dict:
+        """把每个 .py 文件的 import 解析为项目内的文件，返回 {文件: 被 import 的文件集合}"""
+        modules = {}
+        for rel in sorted(self._files, key=lambda p: (p.count("/"), p)):
+            for priority, name in enumerate(_module_names(rel)):
+                if name not in modules or modules[name][0] > priority:
+                    modules[name] = (priority, rel)
+
+        def by_parts(parts: list):
+            if not parts:
+                return None
+            base = "/".join(parts)
+            for candidate in (base + ".py", base + "/__init__.py"):
+                if candidate in self._files:
+                    return candidate
+            return None
+
+        def by_name(parts: list):
+            # 项目根目录本身就是包时，import 路径比文件路径多出前导包名，逐级去掉再试（至少保留两级，避免误配）
+            for k in range(max(len(parts) - 1, 1)):
+                entry = modules.get(".".join(parts[k:]))
+                if entry:
+                    return entry[1]
+            return None
+
+        edges = {}
+        for rel, (_, _, summary) in self._files.items():
+            if summary is None:
+                continue
+            targets = set()
+            package = rel.split("/")[:-1]
+            for imp in summary["imports"]:
+                module_parts = imp["module"].split(".") if imp["module"] else []
+                if imp["level"]:
+                    if imp["level"] - 1 > len(package):
+                        continue
+                    base = package[:len(package) - (imp["level"] - 1)] + module_parts
+                    resolve, prefix = by_parts, base
+                else:
+                    resolve, prefix = by_name, module_parts
+                # from x import y 中的 y 可能是子模块，优先解析到子模块
+                found = [t for t in (resolve(prefix + [name]) for name in imp["names"] if name != "*") if t]
+                while not found and prefix:
+                    target = resolve(prefix)  # 找不到时退到上一级包（如 import a.b.c 中只有 a/b 在项目内）
+                    found = [target] if target else []
+                    prefix = prefix[:-1]
+                targets.update(t for t in found if t != rel)
+            edges[rel] = targets
+        return edges
+
+    def rank(self, mtimes: dict = None) -> list:
+        """按重要性排序的 [(相对路径, 分数)]"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            mtimes = mtimes if mtimes is not None else self._scan()
+            edges = self._resolve_imports()
+        pagerank = _pagerank(sorted(self._files), edges)
+        top = max(pagerank.values(), default=0.0) or 1.0
+        by_recency = sorted(mtimes, key=lambda rel: mtimes[rel], reverse=True)
+        scores, position = {}, 0
+        for i, rel in enumerate(by_recency):
+            if i and mtimes[rel] != mtimes[by_recency[i - 1]]:
+                position = i  # 修改时间相同的文件加权相同
+            recency = 0.5 ** (position / RECENCY_HALF_LIFE)
+            scores[rel] = pagerank.get(rel, 0.0) / top + RECENCY_WEIGHT * recency
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _render_files(self, detailed: list, names_only: list, total: int) -> str:
+        """把选中的文件按目录树输出：detailed 中的 .py 文件附带签名，names_only 只列文件名"""
+        lines = []
+        printed_dirs = set()
+        detailed_set = set(detailed)
+        for rel in sorted(detailed + names_only):
+            parts = rel.split("/")
+            for depth in range(len(parts) - 1):
+                directory = "/".join(parts[:depth + 1])
+                if directory not in printed_dirs:
+                    printed_dirs.add(directory)
+                    lines.append(f"{'  ' * depth}{parts[depth]}/")
+            indent = "  " * (len(parts) - 1)
+            lines.append(f"{indent}{parts[-1]}")
+            entry = self._files.get(rel)
+            if rel in detailed_set and entry and entry[2]:
+                for depth, signature in entry[2]["symbols"][:MAX_SYMBOLS_PER_FILE]:
+                    lines.append(f"{indent}  {'  ' * depth}{signature}")
+                if len(entry[2]["symbols"]) > MAX_SYMBOLS_PER_FILE:
+                    lines.append(f"{indent}  ...")
+        listed = len(detailed) + len(names_only)
+        if total > listed:
+            lines.append(f"...（另有 {total - listed} 个文件未列出，可用 <find_file>/<list_dir> 查看）")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _fit(render, count, budget: int, upper: int):
+        """二分查找 render(k) 不超过预算的最大 k，返回 (k, 文本)；k=0 也放不下时返回 (0, None)"""
+        low, high, best = 0, upper, (0, None)
+        while low <= high:
+            mid = (low + high) // 2
+            text = render(mid)
+            if count(text) <= budget:
+                best, low = (mid, text), mid + 1
+            else:
+                high = mid - 1
+        return best
+
+    def render(self, max_tokens: int = 2000, token_counter=None) -> str:
+        """
+        生成不超过 max_tokens 的仓库地图；项目为空时返回空字符串。
+
+        参数:
+            max_tokens: token 预算
+            token_counter: text -> token 数，默认 estimate_tokens
+        """
+        count = token_counter or estimate_tokens
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            mtimes = self._scan()
+            state = hashlib.sha256(
+                json.dumps([max_tokens, getattr(count, "__name__", ""), sorted(mtimes.items())]).encode("utf-8")
+            ).hexdigest()
+            if self._rendered.get("key") == state:
+                self._save()
+                return self._rendered["text"]
+
+        ranked = [rel for rel, _ in self.rank(mtimes)]
+        header = f"## 仓库地图（共 {len(ranked)} 个文件，按 import 依赖与最近修改挑选，附主要签名）\n"
+        budget = max_tokens - count(header)
+        # 先确定带签名的文件数，剩余预算再按重要性只列出文件名，让地图尽量覆盖项目布局
+        detailed, _ = self._fit(lambda k: self._render_files(ranked[:k], [], len(ranked)),
+                                count, budget, len(ranked))
+        _, best = self._fit(lambda k: self._render_files(ranked[:detailed], ranked[detailed:detailed + k], len(ranked)),
+                            count, budget, len(ranked) - detailed)
+        text = header + best if ranked and best else ""
+
+        with self._lock:
+            self._rendered = {"key": state, "text": text}
+            self._dirty = True
+            self._save()
+        return text
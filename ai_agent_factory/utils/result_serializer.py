@@ -0,0 +1,233 @@
+"""
+操作结果的紧凑序列化：把 handle_tagged_file_operations 的结果 dict 转成省 token 的文本块，
+代替整段 json.dumps。
+
+    <<@r12 READ_FILE ok path=utils/a.py total_lines=300
+    ...文件内容...
+    @r12>>
+    <<@r13 DELETE_FILE ok path=old.py>>
+
+    - 去掉绝对路径 path、success、operation 等冗余字段，标量字段写成 key=value
+    - content / outline / matches / files / hunks 等大字段作为正文，原样多行输出，不做 JSON 转义
+    - 较大的正文同时保存在 ResultStore 中；若干轮之后，上下文里的旧结果块折叠为一行摘要，
+      模型需要时可以用 <recall handle="r12" /> 取回原文
+    - 同一文件（同一行范围）被重复读取时按内容哈希去重：内容未变的新结果只输出
+      "与 @rN 相同" 的短句；内容已变时，上下文里的旧副本改写为 "已被 @rM 取代" 的短句
+"""
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 作为正文输出的字段（按此顺序）
+BODY_FIELDS = ("content", "outline", "matches", "files", "hunks")
+# 不输出的字段：绝对路径、由块头表达的成功标志与操作名、内部标记
+DROPPED_FIELDS = {"success", "operation", "path", "requires_follow_up"}
+
+_BLOCK_RE = re.compile(r"^<<@r(\d+) ([^\n]*)\n(.*?)\n@r\1>>$", re.MULTILINE | re.DOTALL)
+HANDLE_RE = re.compile(r"<<@r(\d+) ")
+_RECALL_NOTE_RE = re.compile(r"\[已折叠: ([^\]\n]*?)，可用 <recall handle=\"r\d+\" /> 取回\]>>")
+_BARE_VALUE_RE = re.compile(r"^[^\s\"'=<>]+$")
+
+
+class ResultStore:
+    """结果正文的旁路存储：句柄 -> 正文，按字节数上限做 LRU 淘汰"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._bytes = 0
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def new_handle(self) -> str:
+        with self._lock:
+            self._counter += 1
+            return f"r{self._counter}"
+
+    def advance_to(self, counter: int):
+        """保证之后分配的句柄序号大于 counter（恢复会话时避免与上下文中已有的句柄重复）"""
+        with self._lock:
+            self._counter = max(self._counter, counter)
+
+    def put(self, handle: str, body: str):
+        with self._lock:
+            self._entries[handle] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= len(old)
+
+    def get(self, handle: str):
+        """返回句柄对应的正文；不存在或已被淘汰时返回 None"""
+        with self._lock:
+            body = self._entries.get(handle)
+            if body is not None:
+                self._entries.move_to_end(handle)
+            return body
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)) and all(isinstance(v, (str, int, float)) for v in value):
+        value = ",".join(str(v) for v in value)
+    elif isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    text = str(value)
+    return text if _BARE_VALUE_RE.match(text) else json.dumps(text, ensure_ascii=False)
+
+
+def _format_body(value) -> str:
+    if isinstance(value, str):
+        return value[:-1] if value.endswith("\n") else value
+    lines = []
+    for item in value:
+        if isinstance(item, dict):
+            lines.append(" ".join(f"{k}={_format_value(v)}" for k, v in item.items()))
+        else:
+            lines.append(str(item))
+    return "\n".join(lines)
+
+
+class ResultSerializer:
+    """
+    把一轮的操作结果序列化为结果块，并负责把上下文中过旧的大结果块折叠为摘要。
+
+    参数:
+        store: ResultStore（与 FileOperationHandler.result_store 共用，<recall> 才能取回）
+        collapse_after: 结果块在之后第几次结果回传时折叠
+        store_min_chars: 正文达到该长度才存入旁路存储并在之后折叠；短结果始终原样保留
+    """
+
+    def __init__(self, store: ResultStore, collapse_after: int = 3, store_min_chars: int = 400):
+        self.store = store
+        self.collapse_after = collapse_after
+        self.store_min_chars = store_min_chars
+        self.turn = 0
+        self._open: dict[str, int] = {}  # 尚未折叠的已存储句柄 -> 产生时的轮次
+        self._reads: dict[tuple, tuple] = {}  # (路径, 起始行, 结束行, 行内偏移) -> (句柄, 轮次, 内容哈希)
+        self._superseded: dict[str, str] = {}  # 待改写的旧 read_file 句柄 -> 摘要说明
+
+    def copy(self) -> "ResultSerializer":
+        """复制折叠与去重状态（共用同一个 ResultStore），用于分叉出的代理"""
+        clone = ResultSerializer(self.store, self.collapse_after, self.store_min_chars)
+        clone.turn = self.turn
+        clone._open = dict(self._open)
+        clone._reads = dict(self._reads)
+        clone._superseded = dict(self._superseded)
+        return clone
+
+    def format_result(self, op: dict, result: dict, is_live=None) -> str:
+        """
+        序列化单个结果（op 为解析出的操作，结果缺少操作名或路径时用来补全）。
+        is_live(handle) 判断某个旧结果块是否仍完整地保留在上下文中，用于 read_file 去重。
+        """
+        handle = self.store.new_handle()
+        attrs = op.get("attributes") or {}
+        operation = result.get("operation") or op.get("operation", "")
+        fields = []
+        if "filename" not in result and attrs.get("path"):
+            fields.append(f"path={_format_value(attrs['path'])}")
+        for key, value in result.items():
+            if key in DROPPED_FIELDS or key in BODY_FIELDS or value is None:
+                continue
+            fields.append(f"{'path' if key == 'filename' else key}={_format_value(value)}")
+
+        bodies = [(key, result[key]) for key in BODY_FIELDS if result.get(key) not in (None, "", [])]
+        status = "ok" if result.get("success") else "error"
+        header = " ".join([f"<<@{handle} {operation} {status}"] + fields)
+        if not bodies:
+            return header + ">>"
+        if len(bodies) == 1:
+            body = _format_body(bodies[0][1])
+        else:
+            body = "\n".join(f"[{key}]\n{_format_body(value)}" for key, value in bodies)
+        if operation == "READ_FILE" and result.get("success") and len(bodies) == 1:
+            unchanged = self._dedup_read(handle, result, body, is_live)
+            if unchanged:
+                return f"{header} [{unchanged}]>>"
+        if len(body) >= self.store_min_chars:
+            self.store.put(handle, body)
+            self._open[handle] = self.turn
+        return f"{header}\n{body}\n@{handle}>>"
+
+    def _dedup_read(self, handle: str, result: dict, body: str, is_live):
+        """
+        登记一次 read_file 结果。与仍在上下文中的旧副本内容相同时返回 "未变化" 说明（不再输出正文）；
+        否则把同一文件的旧副本记为已取代，返回 None。
+        """
+        path = result.get("filename")
+        key = (path, result.get("start_line"), result.get("end_line"), result.get("line_offset"))
+        digest = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        previous = self._reads.get(key)
+        if previous and previous[2] == digest and (is_live is None or is_live(previous[0])):
+            return f"内容与第 {previous[1]} 轮的 @{previous[0]} 相同，自那以后未变化"
+        full_read = key[1] is None and key[2] is None
+        for old_key, (old_handle, _, _) in list(self._reads.items()):
+            # 整文件读取取代该文件的全部旧副本；按行范围读取只取代同一范围的旧副本
+            if old_key[0] == path and (full_read or old_key == key):
+                self._superseded[old_handle] = f"已被第 {self.turn} 轮的 @{handle} 取代，内容已过时"
+                del self._reads[old_key]
+        self._reads[key] = (handle, self.turn, digest)
+        return None
+
+    def serialize(self, results: list, is_live=None) -> str:
+        """序列化一轮的全部结果 [(op, result), ...]"""
+        self.turn += 1
+        return "\n".join(self.format_result(op, result, is_live) for op, result in results)
+
+    def due_handles(self) -> dict:
+        """
+        需要改写的旧结果块 {句柄: 摘要说明或 None}：
+        被新读取取代的 read_file 结果，以及产生后已经过了 collapse_after 次结果回传的大结果（说明为 None）
+        """
+        due = {h: None for h, turn in self._open.items() if self.turn - turn >= self.collapse_after}
+        due.update(self._superseded)
+        return due
+
+    def collapse(self, text: str, handles: dict):
+        """把 text 中属于 handles 的结果块改写为一行摘要；没有变化时返回 None"""
+        if "<<@r" not in text:
+            return None
+
+        def replace(match):
+            handle = f"r{match.group(1)}"
+            if handle not in handles:
+                return match.group(0)
+            note = handles[handle]
+            if note is None:
+                body = match.group(3)
+                size = f"{body.count(chr(10)) + 1} 行, {len(body)} 字"
+                note = f"已折叠: {size}，可用 <recall handle=\"{handle}\" /> 取回"
+            return f"<<@{handle} {match.group(2)} [{note}]>>"
+
+        collapsed = _BLOCK_RE.sub(replace, text)
+        return collapsed if collapsed != text else None
+
+    def restore(self, text: str):
+        """
+        恢复会话后处理载入的一条消息（ResultStore 不随会话保存）：
+        仍完整的大结果块重新存入 ResultStore 并登记，之后照常折叠、可以 <recall>；
+        恢复前就已折叠的块原文已经丢失，把其中的 <recall> 提示改为需要重新读取。
+        有改写时返回新文本，否则返回 None
+        """
+        if "<<@r" not in text:
+            return None
+        for match in _BLOCK_RE.finditer(text):
+            handle, body = f"r{match.group(1)}", match.group(3)
+            if len(body) >= self.store_min_chars:
+                self.store.put(handle, body)
+                self._open[handle] = self.turn
+        restored = _RECALL_NOTE_RE.sub(
+            lambda m: f"[已折叠: {m.group(1)}，原文在会话恢复后已不可取回，需要时请重新执行操作]>>", text)
+        return restored if restored != text else None
+
+    def mark_collapsed(self, handles):
+        for handle in handles:
+            self._open.pop(handle, None)
+            self._superseded.pop(handle, None)
+        for key, (handle, _, _) in list(self._reads.items()):
+            if handle in handles:
+                del self._reads[key]  # 旧副本已不在上下文中，之后的读取需要输出完整内容
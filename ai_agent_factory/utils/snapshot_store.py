@@ -0,0 +1,270 @@
+"""
+内容寻址快照库：每次写文件前自动备份，支持按轮撤销和按轮恢复单个文件。
+
+目录结构（位于项目内的 .codegenius/snapshots/）:
+    objects/ab/cdef...   以 sha256 为键的 zlib 压缩内容，相同内容只存一份
+    turns/000012.json    每一轮的清单 {"turn", "time", "label", "changes": {路径: {"before", "after"}}}
+
+备份只读取、压缩本轮被修改的文件，开销与改动的字节数成正比，与项目大小无关。
+"""
+import os
+import json
+import time
+import zlib
+import hashlib
+import threading
+from ai_agent_factory.utils.state_dir import make_dirs
+
+SNAPSHOT_DIR = os.path.join(".codegenius", "snapshots")
+
+
+class SnapshotError(Exception):
+    """快照不存在或无法恢复"""
+
+
+class SnapshotStore:
+    """
+    用法:
+        store.begin_turn("用户任务描述")
+        store.record_before(rel_path)   # 写文件前
+        ...写文件...
+        store.record_after(rel_path)    # 写文件后
+        store.end_turn()                # 有改动时写入清单，返回轮号
+
+    未调用 begin_turn 时，每次写操作各自成为一轮。
+    """
+
+    def __init__(self, root: str, store_dir: str = None):
+        self.root = os.path.abspath(root)
+        self.store_dir = store_dir or os.path.join(self.root, SNAPSHOT_DIR)
+        self.objects_dir = os.path.join(self.store_dir, "objects")
+        self.turns_dir = os.path.join(self.store_dir, "turns")
+        self._lock = threading.RLock()
+        self._current = None  # 进行中的轮 {"label", "changes"}
+        self._implicit = False  # 当前轮是否由单次写操作自动开启
+
+    # ---------- 内容对象 ----------
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put_blob(self, data: bytes) -> str:
+        """保存内容，返回 sha256；相同内容已存在时直接返回"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            make_dirs(os.path.dirname(path))
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+        return digest
+
+    def get_blob(self, digest: str) -> bytes:
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return zlib.decompress(f.read())
+        except FileNotFoundError:
+            raise SnapshotError(f"快照内容缺失: {digest[:12]}")
+
+    def _full(self, rel: str) -> str:
+        return os.path.join(self.root, *rel.split("/"))
+
+    def _snapshot_file(self, rel: str):
+        """保存文件当前内容，文件不存在时返回 None"""
+        try:
+            with open(self._full(rel), "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        return self.put_blob(data)
+
+    @staticmethod
+    def _digest_of(full_path: str):
+        try:
+            with open(full_path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    # ---------- 轮次记录 ----------
+
+    def begin_turn(self, label: str = ""):
+        with self._lock:
+            if self._current is not None:
+                self.end_turn()
+            self._current = {"label": label, "changes": {}}
+            self._implicit = False
+
+    @property
+    def in_turn(self) -> bool:
+        return self._current is not None and not self._implicit
+
+    def record_before(self, rel: str):
+        """写文件前调用：本轮第一次修改该文件时备份原内容"""
+        with self._lock:
+            if self._current is None:
+                self._current = {"label": f"write {rel}", "changes": {}}
+                self._implicit = True
+            changes = self._current["changes"]
+            if rel not in changes:
+                changes[rel] = {"before": self._snapshot_file(rel), "after": None}
+
+    def record_after(self, rel: str):
+        """写文件后调用：记录新内容（文件被删除时为 None）"""
+        with self._lock:
+            if self._current is None or rel not in self._current["changes"]:
+                return
+            self._current["changes"][rel]["after"] = self._snapshot_file(rel)
+            if self._implicit:
+                self.end_turn()
+
+    def end_turn(self):
+        """结束当前轮；有实际改动时写入清单并返回轮号，否则返回 None"""
+        with self._lock:
+            current, self._current = self._current, None
+            self._implicit = False
+            if not current:
+                return None
+            changes = {rel: c for rel, c in current["changes"].items() if c["before"] != c["after"]}
+            if not changes:
+                return None
+            turn = self._last_turn() + 1
+            manifest = {"turn": turn, "time": time.time(), "label": current["label"][:200], "changes": changes}
+            make_dirs(self.turns_dir)
+            tmp_path = self._manifest_path(turn) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self._manifest_path(turn))
+            return turn
+
+    def _manifest_path(self, turn: int) -> str:
+        return os.path.join(self.turns_dir, f"{turn:06d}.json")
+
+    def _turn_numbers(self) -> list:
+        try:
+            names = os.listdir(self.turns_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith(".json") and name[:-5].isdigit())
+
+    def _last_turn(self) -> int:
+        turns = self._turn_numbers()
+        return turns[-1] if turns else 0
+
+    def load_turn(self, turn: int) -> dict:
+        try:
+            with open(self._manifest_path(turn), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SnapshotError(f"第 {turn} 轮不存在")
+
+    def list_turns(self, limit: int = 20) -> list:
+        """最近的若干轮（新的在前）：[{"turn", "time", "label", "files", "undone_by", "undo_of"}]"""
+        result = []
+        for turn in reversed(self._turn_numbers()[-limit:]):
+            manifest = self.load_turn(turn)
+            result.append({
+                "turn": turn,
+                "time": manifest["time"],
+                "label": manifest.get("label", ""),
+                "files": sorted(manifest["changes"]),
+                "undone_by": manifest.get("undone_by"),
+                "undo_of": manifest.get("undo_of"),
+            })
+        return result
+
+    # ---------- 恢复 ----------
+
+    def _write_state(self, rel: str, digest):
+        """把文件恢复为指定内容（digest 为 None 表示文件不存在）"""
+        full = self._full(rel)
+        if digest is None:
+            if os.path.exists(full):
+                os.remove(full)
+            return
+        data = self.get_blob(digest)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp_path = full + ".restore.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, full)
+
+    def undo_turn(self, turn: int = None, force: bool = False) -> dict:
+        """
+        撤销一轮的全部改动（默认最近一轮未被撤销的改动）。撤销本身也记为新的一轮，可以再撤销。
+
+        文件在该轮之后又被修改过时视为冲突并跳过（force=True 时强制覆盖）。
+        返回:
+            {"turn", "undo_turn", "restored": [...], "conflicts": [...]}
+        """
+        with self._lock:
+            if turn is None:
+                for candidate in reversed(self._turn_numbers()):
+                    manifest = self.load_turn(candidate)
+                    if not manifest.get("undone_by") and not manifest.get("undo_of"):
+                        turn = candidate
+                        break
+                else:
+                    raise SnapshotError("没有可撤销的改动")
+            manifest = self.load_turn(turn)
+            if manifest.get("undone_by"):
+                raise SnapshotError(f"第 {turn} 轮已被第 {manifest['undone_by']} 轮撤销")
+
+            restored, conflicts = [], []
+            self.begin_turn(f"undo {turn}")
+            for rel, change in sorted(manifest["changes"].items()):
+                if not force and self._digest_of(self._full(rel)) != change["after"]:
+                    conflicts.append(rel)
+                    continue
+                self.record_before(rel)
+                self._write_state(rel, change["before"])
+                self.record_after(rel)
+                restored.append(rel)
+            undo_number = self.end_turn()
+            if undo_number is not None:
+                undo_manifest = self.load_turn(undo_number)
+                undo_manifest["undo_of"] = turn
+                self._save_manifest(undo_manifest)
+                if not conflicts:
+                    manifest["undone_by"] = undo_number
+                    self._save_manifest(manifest)
+            return {"turn": turn, "undo_turn": undo_number, "restored": restored, "conflicts": conflicts}
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = self._manifest_path(manifest["turn"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._manifest_path(manifest["turn"]))
+
+    def state_at(self, rel: str, turn: int):
+        """文件在第 turn 轮结束时的内容 digest（None 表示当时不存在）"""
+        turns = self._turn_numbers()
+        for candidate in reversed([t for t in turns if t <= turn]):
+            change = self.load_turn(candidate)["changes"].get(rel)
+            if change is not None:
+                return change["after"]
+        for candidate in (t for t in turns if t > turn):
+            change = self.load_turn(candidate)["changes"].get(rel)
+            if change is not None:
+                return change["before"]
+        raise SnapshotError(f"没有 {rel} 的快照记录")
+
+    def restore(self, rel: str, turn: int) -> dict:
+        """把单个文件恢复到第 turn 轮结束时的状态（恢复也记为新的一轮）"""
+        with self._lock:
+            digest = self.state_at(rel, turn)
+            self.begin_turn(f"restore {rel}@{turn}")
+            self.record_before(rel)
+            self._write_state(rel, digest)
+            self.record_after(rel)
+            new_turn = self.end_turn()
+            return {"path": rel, "turn": turn, "restore_turn": new_turn, "deleted": digest is None}
+
+
+def parse_path_at_turn(spec: str) -> tuple:
+    """解析 'path@turn'，返回 (path, turn)"""
+    path, sep, turn = spec.rpartition("@")
+    if not sep or not path or not turn.strip().isdigit():
+        raise ValueError(f"格式应为 路径@轮号，例如 src/app.py@3: {spec}")
+    return path.strip().replace("\\", "/"), int(turn)
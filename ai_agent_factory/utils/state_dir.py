@@ -0,0 +1,32 @@
+"""
+项目内的工具数据目录 <项目>/.codegenius/：快照、事务暂存、会话日志、grep 索引、仓库地图缓存、分叉等都放在这里。
+
+这些数据不属于用户的代码，创建目录时在 .codegenius/ 中写入内容为 * 的 .gitignore，
+不会出现在 git status 中，也不会被 git add -A 误提交。
+"""
+import os
+
+STATE_DIR = ".codegenius"
+
+
+def make_dirs(path: str):
+    """
+    与 os.makedirs(path, exist_ok=True) 相同；path 位于某个 .codegenius 目录之下（或就是它）时，
+    确保该 .codegenius 目录中有忽略全部内容的 .gitignore。
+    """
+    os.makedirs(path, exist_ok=True)
+    head = os.path.abspath(path)
+    while True:
+        head, name = os.path.split(head)
+        if not name:
+            return
+        if name == STATE_DIR:
+            break
+    gitignore = os.path.join(head, STATE_DIR, ".gitignore")
+    if os.path.exists(gitignore):
+        return
+    try:
+        with open(gitignore, "x", encoding="utf-8") as f:
+            f.write("*\n")
+    except OSError:
+        pass  # 并发创建或只读目录：不影响数据本身的写入
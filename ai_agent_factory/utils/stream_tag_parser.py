@@ -0,0 +1,282 @@
+"""
+流式增量标签解析器：逐个 token 输入，按文档顺序产出已闭合的结构化操作指令。
+
+与基于正则的 parse_structured_operations 相比：
+    - 单次扫描，总代价 O(n)，没有 `.*?` 回溯
+    - 可以边接收流边产出操作，无需等待完整回复
+    - 块标签内部的内容按原样保留，不会把文件内容里的 <br/> 等误识别为操作
+    - void_tags 中的标签没有内容，省略结尾的 / 也按自闭合处理，不会吞掉之后的回复
+"""
+import re
+import time
+
+_TEXT, _HEADER, _CONTENT = 0, 1, 2
+
+_ATTR_PATTERN = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def parse_attributes(attr_str: str) -> dict:
+    """解析属性字符串为字典"""
+    if not attr_str:
+        return {}
+    attrs = {}
+    # 匹配 key="value" 或 key='value'
+    for key, v1, v2 in _ATTR_PATTERN.findall(attr_str):
+        attrs[key] = v1 or v2
+    return attrs
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+
+class StreamingTagParser:
+    """
+    状态机解析器，识别 <tag attr="val">content</tag> 和 <tag attr="val" />。
+
+    用法:
+        parser = StreamingTagParser(tags={"create_file", "read_file"})
+        for token in stream:
+            for op in parser.feed(token):
+                ...
+        parser.close()  # 丢弃未闭合的标签
+
+    产出的操作格式与 parse_structured_operations 一致：
+        {"operation": "CREATE_FILE", "attributes": {...}, "content": "...", "self_closing": False}
+    """
+
+    def __init__(self, tags=None, void_tags=None, max_header: int = 4096):
+        """
+        参数:
+            tags: 只识别这些标签名（不区分大小写）；为 None 时识别任意 \\w+ 标签。
+            void_tags: 没有内容的标签名（不区分大小写），无论是否写了结尾的 / 都按自闭合处理。
+            max_header: 标签头最大长度，超过则视为普通文本，防止异常输出占用内存。
+        """
+        self.tags = {t.lower() for t in tags} if tags else None
+        self.void_tags = {t.lower() for t in void_tags} if void_tags else set()
+        self.max_header = max_header
+        self._reset()
+
+    def _reset(self):
+        self._state = _TEXT
+        self._pending = ""      # 尚未确认的少量尾部数据（如单独的 '<' 或可能的闭合标签前缀）
+        self._header = []       # 当前标签头的字符（含开头的 '<'）
+        self._name = ""
+        self._name_done = False
+        self._quote = None
+        self._attrs = ""
+        self._content = []
+        self._marker = ""
+
+    def feed(self, token: str) -> list[dict]:
+        """输入一段文本，返回其中新完成的操作（按文档顺序）"""
+        if not token:
+            return []
+        operations = []
+        data = self._pending + token if self._pending else token
+        self._pending = ""
+        pos = 0
+        end = len(data)
+        header_pos = None  # 本次输入中标签头 '<' 的位置（标签头始于之前的输入时为 None）
+
+        while pos < end:
+            if self._state == _TEXT:
+                i = data.find('<', pos)
+                if i < 0:
+                    break
+                self._state = _HEADER
+                self._header = ['<']
+                self._name = ""
+                self._name_done = False
+                self._quote = None
+                header_pos = i
+                pos = i + 1
+
+            elif self._state == _HEADER:
+                pos = self._feed_header(data, pos, operations)
+                if pos < 0:
+                    # 标签头无效：从 '<' 之后重新扫描
+                    self._state = _TEXT
+                    if header_pos is not None:
+                        pos = header_pos + 1
+                    else:
+                        # 标签头始于之前的输入：把已消费的部分拼回本次输入（只涉及一个 token 的长度）
+                        data = "".join(self._header[1:]) + data[-pos - 1:]
+                        pos = 0
+                        end = len(data)
+                    self._header = []
+                    header_pos = None
+
+            else:
+                j = self._find_marker(data, pos)
+                if j < 0:
+                    # 保留可能构成闭合标签前缀的尾部
+                    cut = max(pos, end - len(self._marker) + 1)
+                    if cut > pos:
+                        self._content.append(data[pos:cut])
+                    self._pending = data[cut:]
+                    break
+                k = j + len(self._marker)
+                while k < end and data[k].isspace():
+                    k += 1
+                if k >= end:
+                    if j > pos:
+                        self._content.append(data[pos:j])
+                    self._pending = data[j:]
+                    break
+                if data[k] == '>':
+                    self._content.append(data[pos:j])
+                    content = "".join(self._content)
+                    operations.append(self._make_op(content.strip() if content else None, False))
+                    self._state = _TEXT
+                    self._content = []
+                    pos = k + 1
+                else:
+                    # 形如 </create_filex 的文本，不是闭合标签
+                    self._content.append(data[pos:j + 1])
+                    pos = j + 1
+
+        return operations
+
+    def _find_marker(self, data: str, pos: int) -> int:
+        """查找闭合标签前缀 </name（标签名不区分大小写）；数据末尾不完整的前缀不算匹配"""
+        marker = self._marker
+        j = data.find('</', pos)
+        while j >= 0:
+            if data[j:j + len(marker)].lower() == marker:
+                return j
+            j = data.find('</', j + 1)
+        return -1
+
+    def _feed_header(self, data: str, pos: int, operations: list) -> int:
+        """
+        逐字符处理标签头，返回新的位置；标签头无效时返回 -(pos + 1)，
+        由调用方从 '<' 之后重新扫描。
+        """
+        header = self._header
+        end = len(data)
+        while pos < end:
+            c = data[pos]
+            if not self._name_done:
+                if _is_word_char(c):
+                    self._name += c
+                    header.append(c)
+                    pos += 1
+                    continue
+                if not self._name or (self.tags is not None and self._name.lower() not in self.tags):
+                    return -(pos + 1)
+                self._name_done = True
+                self._attrs_start = len(header)  # 属性部分在 header 中的起始位置
+            if self._quote:
+                if c == self._quote:
+                    self._quote = None
+            elif c in ('"', "'"):
+                self._quote = c
+            elif c == '>':
+                attrs = "".join(header[self._attrs_start:]).strip()
+                self._header = []
+                if attrs.endswith('/') or self._name.lower() in self.void_tags:
+                    self._attrs = attrs[:-1].strip() if attrs.endswith('/') else attrs
+                    operations.append(self._make_op(None, True))
+                    self._state = _TEXT
+                else:
+                    self._attrs = attrs
+                    self._state = _CONTENT
+                    self._marker = "</" + self._name.lower()
+                    self._content = []
+                return pos + 1
+            header.append(c)
+            pos += 1
+            if len(header) > self.max_header:
+                return -(pos + 1)
+        return pos
+
+    def _make_op(self, content, self_closing: bool) -> dict:
+        return {
+            "operation": self._name.upper(),
+            "attributes": parse_attributes(self._attrs),
+            "content": content,
+            "self_closing": self_closing
+        }
+
+    def close(self) -> list[dict]:
+        """结束输入：未闭合的标签被丢弃，解析器重置以便复用"""
+        self._reset()
+        return []
+
+
+def parse_operations(text: str, tags=None, void_tags=None) -> list[dict]:
+    """一次性解析完整文本（单次扫描）"""
+    if not text or not isinstance(text, str):
+        return []
+    parser = StreamingTagParser(tags, void_tags)
+    operations = parser.feed(text)
+    parser.close()
+    return operations
+
+
+def benchmark(size_mb: float = 2.0, token_size: int = 4, repeat: int = 3, include_regex: bool = True):
+    """
+    对比正则解析器与流式解析器在多 MB 回复上的耗时。
+
+    参数:
+        size_mb: 生成的测试回复大小（MB）
+        token_size: 流式输入时每个 token 的字符数
+        repeat: 状态机解析重复次数，取最好成绩（正则解析只跑一次，MB 级输入下可能需要数分钟）
+        include_regex: 是否测量正则解析器
+    """
+    from ai_agent_factory.utils.file_operation_handler import (
+        FileOperationHandler, parse_structured_operations_regex, has_file_operations_regex
+    )
+
+    block = (
+        "下面先读取配置，再创建模块。\n"
+        "<read_file path=\"config/settings.py\" />\n"
+        "<create_file path=\"services/user_service.py\">\n"
+        + "def handler(x: int) -> int:\n    return x < 10 and x > 1\n" * 20 +
+        "</create_file>\n"
+        "说明：a < b 时返回 True。\n"
+    )
+    text = block * max(1, int(size_mb * 1024 * 1024 / len(block.encode("utf-8"))))
+    tokens = [text[i:i + token_size] for i in range(0, len(text), token_size)]
+    tags = FileOperationHandler.OPERATION_TAGS
+    void_tags = FileOperationHandler.VOID_TAGS
+
+    def best(fn, repeat=repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    def regex_parse():
+        return parse_structured_operations_regex(text) if has_file_operations_regex(text) else []
+
+    def stream_parse():
+        parser = StreamingTagParser(tags, void_tags)
+        ops = []
+        for token in tokens:
+            ops.extend(parser.feed(token))
+        parser.close()
+        return ops
+
+    oneshot_time, oneshot_ops = best(lambda: parse_operations(text, tags, void_tags))
+    stream_time, stream_ops = best(stream_parse)
+
+    print(f"📏 回复大小: {len(text.encode('utf-8')) / 1024 / 1024:.2f} MB, 流式 token 数: {len(tokens)}")
+    print(f"  状态机一次性解析:                   {oneshot_time * 1000:8.1f} ms, {len(oneshot_ops)} 个操作")
+    print(f"  状态机逐 token 解析:                {stream_time * 1000:8.1f} ms, {len(stream_ops)} 个操作")
+    result = {"oneshot": oneshot_time, "stream": stream_time}
+    if include_regex:
+        regex_time, regex_ops = best(regex_parse, repeat=1)
+        print(f"  正则解析（含 has_file_operations）: {regex_time * 1000:8.1f} ms, {len(regex_ops)} 个操作")
+        result["regex"] = regex_time
+    return result
+
+
+if __name__ == "__main__":
+    # 用法: python -m ai_agent_factory.utils.stream_tag_parser [大小MB] [--no-regex]
+    import sys
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    benchmark(float(args[0]) if args else 2.0, include_regex="--no-regex" not in sys.argv)
@@ -0,0 +1,188 @@
+"""
+Python 符号索引：用 ast 提取模块中的类、函数、方法及其签名、行号范围与 import，
+按文件 (mtime_ns, size) 缓存；整个项目建索引时文件较多则使用进程池并行解析。
+
+供 <outline> / <read_symbol> 操作以及仓库地图使用，模型无需读取整个模块就能定位代码。
+"""
+import os
+import ast
+import threading
+from ai_agent_factory.utils.process_pool import get_process_pool
+
+PROCESS_POOL_THRESHOLD = 200  # 需要解析的文件数超过该值时使用进程池
+_CHUNK_SIZE = 50
+
+
+def _signature(node) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+        return f"class {node.name}({', '.join(bases)})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _first_doc_line(node) -> str:
+    doc = ast.get_docstring(node, clean=True)
+    return doc.strip().splitlines()[0] if doc and doc.strip() else ""
+
+
+def extract_symbols(source: str) -> dict:
+    """
+    解析源码，返回:
+        {"symbols": [{"name", "kind", "signature", "start_line", "end_line", "doc", "depth"}],
+         "imports": [{"module", "names", "level"}]}
+    start_line 包含装饰器；name 为限定名（如 Class.method）。
+    异常:
+        SyntaxError: 源码无法解析
+    """
+    tree = ast.parse(source)
+    symbols, imports = [], []
+
+    def visit(body, prefix: str, depth: int, in_class: bool):
+        for node in body:
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+                name = f"{prefix}{node.name}"
+                if isinstance(node, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if in_class else "function"
+                start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+                symbols.append({
+                    "name": name,
+                    "kind": kind,
+                    "signature": _signature(node),
+                    "start_line": start,
+                    "end_line": node.end_lineno,
+                    "doc": _first_doc_line(node),
+                    "depth": depth,
+                })
+                # 类中的方法、函数中的嵌套定义都记录，便于按限定名读取
+                visit(node.body, name + ".", depth + 1, isinstance(node, ast.ClassDef))
+
+    visit(tree.body, "", 0, False)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append({"module": alias.name, "names": [], "level": 0})
+        elif isinstance(node, ast.ImportFrom):
+            imports.append({
+                "module": node.module or "",
+                "names": [alias.name for alias in node.names],
+                "level": node.level,
+            })
+    return {"symbols": symbols, "imports": imports}
+
+
+def _parse_file(full_path: str):
+    """读取并解析单个文件，返回 (mtime_ns, size, 结果或 None, 错误信息或 None)"""
+    try:
+        st = os.stat(full_path)
+        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+            source = f.read()
+    except OSError as e:
+        return None, None, None, str(e)
+    try:
+        return st.st_mtime_ns, st.st_size, extract_symbols(source), None
+    except (SyntaxError, ValueError) as e:
+        return st.st_mtime_ns, st.st_size, None, f"语法错误: {e}"
+
+
+def _parse_chunk(full_paths: list) -> list:
+    """进程池任务：解析一批文件"""
+    return [_parse_file(p) for p in full_paths]
+
+
+def format_outline(symbols: list) -> str:
+    """把符号列表格式化为紧凑的大纲文本（每行: 行号范围 签名  # 文档首行）"""
+    lines = []
+    for s in symbols:
+        doc = f"  # {s['doc'][:80]}" if s["doc"] else ""
+        lines.append(f"{'    ' * s['depth']}L{s['start_line']}-{s['end_line']} {s['signature']}{doc}")
+    return "\n".join(lines)
+
+
+class SymbolIndex:
+    """项目 Python 文件的符号索引（键为绝对路径）"""
+
+    def __init__(self, root: str, path_index=None):
+        self.root = os.path.abspath(root)
+        self.path_index = path_index
+        self._entries: dict[str, tuple] = {}  # 路径 -> (mtime_ns, size, 结果, 错误)
+        self._lock = threading.Lock()
+
+    def _fresh(self, full_path: str, st) -> bool:
+        entry = self._entries.get(full_path)
+        return entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size
+
+    def get(self, full_path: str) -> dict:
+        """
+        返回文件的符号信息（缓存失效时重新解析）。
+        异常:
+            FileNotFoundError: 文件不存在
+            SyntaxError: 文件无法解析
+        """
+        st = os.stat(full_path)
+        with self._lock:
+            if not self._fresh(full_path, st):
+                self._entries[full_path] = _parse_file(full_path)
+            mtime, _, result, error = self._entries[full_path]
+        if mtime is None:
+            raise FileNotFoundError(full_path)
+        if result is None:
+            raise SyntaxError(error)
+        return result
+
+    def parse_source(self, source: str) -> dict:
+        """解析未落盘的内容（如事务中暂存的文件），不缓存"""
+        return extract_symbols(source)
+
+    def parse_many(self, full_paths: list) -> list:
+        """解析一批文件，返回与输入一一对应的 (mtime_ns, size, 结果, 错误)；文件较多时使用进程池"""
+        if len(full_paths) >= PROCESS_POOL_THRESHOLD:
+            chunks = [full_paths[i:i + _CHUNK_SIZE] for i in range(0, len(full_paths), _CHUNK_SIZE)]
+            return [r for chunk in get_process_pool().map(_parse_chunk, chunks) for r in chunk]
+        return [_parse_file(p) for p in full_paths]
+
+    def build(self) -> dict:
+        """
+        为项目中全部 .py 文件建立/更新索引，返回 {相对路径: 结果}（解析失败的文件不包含在内）。
+        需要重新解析的文件较多时使用进程池。
+        """
+        rel_paths = [p for p in self.path_index.all_files() if p.endswith(".py")]
+        full_paths = {rel: os.path.join(self.root, *rel.split("/")) for rel in rel_paths}
+        stale = []
+        for rel, full in full_paths.items():
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            if not self._fresh(full, st):
+                stale.append(full)
+
+        parsed = self.parse_many(stale)
+        with self._lock:
+            for full, entry in zip(stale, parsed):
+                self._entries[full] = entry
+            known = set(full_paths.values())
+            for full in [p for p in self._entries if p not in known]:
+                del self._entries[full]
+            return {
+                rel: self._entries[full][2]
+                for rel, full in full_paths.items()
+                if full in self._entries and self._entries[full][2] is not None
+            }
+
+
+def find_symbol(symbols: list, name: str):
+    """
+    按限定名查找符号：先精确匹配，再匹配名称结尾（如 'method' 或 'Class.method'）。
+    返回 (符号或 None, 候选名列表)；有多个候选时符号为 None。
+    """
+    for s in symbols:
+        if s["name"] == name:
+            return s, [s["name"]]
+    candidates = [s for s in symbols if s["name"].endswith("." + name)]
+    if len(candidates) == 1:
+        return candidates[0], [candidates[0]["name"]]
+    return None, [s["name"] for s in candidates]
@@ -1,5 +1,7 @@
 import os
 import sys
+import multiprocessing
+import argparse
 import logging
 import logging.handlers
 import datetime
@@ -10,6 +12,9 @@ from concurrent.futures import ThreadPoolExecutor
 import queue
 import threading
 
+from ai_agent_factory.utils.snapshot_store import parse_path_at_turn
+from ai_agent_factory.agent.session_journal import SessionJournal
+
 # 强制 stdout/stderr 使用 UTF-8
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -105,7 +110,11 @@ def save_app_config(app_dir, project_folder, system_prompt):
 # ----------------------------
 
 class CodeGeniusCLI:
-    def __init__(self):
+    COMMANDS = ("/undo", "/restore", "/turns")
+
+    def __init__(self, resume_session: str = None, journal_session: bool = False):
+        self.resume_session = resume_session  # 要恢复的会话 ID 或 "latest"
+        self.journal_session = journal_session  # 是否把会话记录到 <项目>/.codegenius/sessions/
         self.app_dir = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
         load_config_from_env()
         self.project_folder, self.system_prompt = load_app_config(self.app_dir)
@@ -161,6 +170,8 @@ class CodeGeniusCLI:
                     break
                 if stripped in ("quit", "exit", "q"):
                     return stripped  # 用于主循环判断退出
+                if not lines and stripped.split(" ")[0] in self.COMMANDS:
+                    return stripped  # 快照命令无需 /done
                 lines.append(line)
             except KeyboardInterrupt:
                 print("\n(输入已取消)")
@@ -170,6 +181,32 @@ class CodeGeniusCLI:
                 break
         return "\n".join(lines)
 
+    def handle_command(self, command: str):
+        """
+        处理快照命令：
+            /turns              列出最近的改动轮次
+            /undo [轮号]        撤销一轮（默认最近一轮）的全部文件改动
+            /restore 路径@轮号  把单个文件恢复到该轮结束时的状态
+        """
+        name, _, arg = command.partition(" ")
+        arg = arg.strip()
+        try:
+            if name == "/turns":
+                turns = self.agent.list_turns()
+                if not turns:
+                    print("📭 暂无改动记录")
+                for t in turns:
+                    when = datetime.datetime.fromtimestamp(t["time"]).strftime("%m-%d %H:%M:%S")
+                    undone = f" (已被第 {t['undone_by']} 轮撤销)" if t["undone_by"] else ""
+                    print(f"  #{t['turn']} {when} {t['label'][:40]!r} - {len(t['files'])} 个文件{undone}")
+            elif name == "/undo":
+                self.agent.undo_turn(int(arg) if arg else None)
+            elif name == "/restore":
+                path, turn = parse_path_at_turn(arg)
+                self.agent.restore_file(path, turn)
+        except ValueError as e:
+            print(f"❌ 命令参数错误: {e}")
+
     def initialize_agent(self, project_folder: str, api_key: str, base_url: str, model_name: str):
         if not project_folder:
             print("❌ 项目文件夹不能为空！", file=sys.stderr)
@@ -190,14 +227,27 @@ class CodeGeniusCLI:
             self.agent = PythonProgrammerAgent(
                 basellm=llm,
                 project_dir=project_folder,
-                system_prompt=self.system_prompt
+                system_prompt=self.system_prompt,
+                resume_session=self.resume_session,
+                journal_session=self.journal_session
             )
             self.agent.set_token_deal_call_back(update_ui_callback=self.update_streaming_message)
             os.chdir(project_folder)
             setup_logging(project_folder)
             save_app_config(self.app_dir, project_folder, self.system_prompt)
             print("✅ 智能体初始化成功！")
+            if self.agent.session_id:
+                print(f"📝 会话 ID: {self.agent.session_id}（下次可用 --resume {self.agent.session_id} 继续）")
             return True
+        except FileNotFoundError as e:
+            print(f"❌ 无法恢复会话: {e}", file=sys.stderr)
+            sessions = SessionJournal.list_sessions(project_folder)
+            if sessions:
+                print("可恢复的会话:")
+                for s in sessions[:10]:
+                    when = datetime.datetime.fromtimestamp(s["time"]).strftime("%Y-%m-%d %H:%M")
+                    print(f"  {s['session_id']}  {when}  {s['records']} 条记录")
+            return False
         except Exception as e:
             print(f"❌ 初始化失败: {e}", file=sys.stderr)
             logging.exception("Agent 初始化异常")
@@ -235,6 +285,7 @@ class CodeGeniusCLI:
 
         # 4. 主交互循环
         print("\n💬 输入你的编程任务（输入 'quit' 退出；多行输入请以 '/done' 结束）:")
+        print("   快照命令: /turns 查看改动记录 | /undo [轮号] 撤销 | /restore 路径@轮号 恢复文件")
         while True:
             try:
                 user_input = self.get_multiline_input()
@@ -245,6 +296,9 @@ class CodeGeniusCLI:
                     break
                 if not user_input.strip():
                     continue  # 跳过纯空输入
+                if user_input.strip().split(" ")[0] in self.COMMANDS:
+                    self.handle_command(user_input.strip())
+                    continue
 
                 print("🧠 CodeGenius 正在思考...", end='', flush=True)
                 self.message_queue.put(("stream_start", None))
@@ -273,7 +327,14 @@ class CodeGeniusCLI:
 # ----------------------------
 
 if __name__ == "__main__":
-    app = CodeGeniusCLI()
+    multiprocessing.freeze_support()  # 打包后的进程池工作进程不重新执行入口程序
+    parser = argparse.ArgumentParser(description="CodeGenius - AI 编程助手 (命令行版)")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="SESSION",
+                        help="恢复之前用 --journal 记录的会话（不指定会话 ID 时恢复最近的会话）")
+    parser.add_argument("--journal", action="store_true",
+                        help="把本次会话记录到 <项目>/.codegenius/sessions/，之后可以用 --resume 恢复")
+    args = parser.parse_args()
+    app = CodeGeniusCLI(resume_session=args.resume, journal_session=args.journal)
     try:
         app.run()
     except Exception as e:
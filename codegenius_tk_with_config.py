@@ -1,5 +1,6 @@
 import os
 import sys
+import multiprocessing
 import threading
 import logging
 import logging.handlers
@@ -471,6 +472,7 @@ class CodeGeniusApp:
         self.config_btn.config(state=ttk.NORMAL)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后的进程池工作进程不重新执行入口程序
     root = ttk.Window(themename="cosmo")
     app = CodeGeniusApp(root)
     root.mainloop()
\ No newline at end of file
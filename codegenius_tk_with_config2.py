@@ -1,5 +1,6 @@
 import os
 import sys
+import multiprocessing
 import threading
 import logging
 import logging.handlers
@@ -533,6 +534,7 @@ class CodeGeniusApp:
             self.executor.shutdown(wait=False)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后的进程池工作进程不重新执行入口程序
     root = ttk.Window(themename="cosmo")
     app = CodeGeniusApp(root)
     
@@ -1,5 +1,6 @@
 import os
 import sys
+import multiprocessing
 import threading
 import logging
 import logging.handlers
@@ -8,7 +9,7 @@ from pathlib import Path
 import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
 import configparser
 import queue
 import time
@@ -21,6 +22,7 @@ import re
 try:
     from python_programmer_agent2 import PythonProgrammerAgent
     from ai_agent_factory.llms.base_llm_openai import OpenAILLM
+    from ai_agent_factory.utils.snapshot_store import parse_path_at_turn
     from dotenv import load_dotenv
 except ImportError as e:
     messagebox.showerror("导入错误", f"缺少依赖模块:\n{e}\n请确保已安装所有依赖。")
@@ -448,6 +450,12 @@ class HighPerformanceCodeGeniusApp:
         self.theme_btn = ttk.Button(right_frame, text="🌙 暗色", bootstyle=OUTLINE, command=self.toggle_theme)
         self.theme_btn.pack(side=tk.LEFT, padx=5)
 
+        self.undo_btn = ttk.Button(right_frame, text="↩️ 撤销", bootstyle=OUTLINE, command=self.undo_last_turn)
+        self.undo_btn.pack(side=tk.LEFT, padx=5)
+
+        self.restore_btn = ttk.Button(right_frame, text="⏪ 恢复文件", bootstyle=OUTLINE, command=self.restore_file_at_turn)
+        self.restore_btn.pack(side=tk.LEFT, padx=5)
+
         # 主区域
         main_frame = ttk.Frame(self.root, padding=10)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -614,6 +622,60 @@ class HighPerformanceCodeGeniusApp:
         self.status_var.set("就绪")
         self.send_btn.config(state=tk.NORMAL)
 
+    def undo_last_turn(self):
+        """撤销最近一次任务的全部文件改动"""
+        if not self.check_agent_ready():
+            return
+        if str(self.send_btn["state"]) == tk.DISABLED:
+            messagebox.showwarning("提示", "任务进行中，请等待完成后再撤销")
+            return
+        turns = [t for t in self.agent.list_turns() if not t["undone_by"] and not t["undo_of"]]
+        if not turns:
+            messagebox.showinfo("撤销", "暂无可撤销的改动")
+            return
+        last = turns[0]
+        files = "\n".join(last["files"][:10]) + ("\n..." if len(last["files"]) > 10 else "")
+        if not messagebox.askyesno("撤销", f"撤销第 {last['turn']} 轮的改动？\n{last['label'][:60]}\n\n{files}"):
+            return
+        result = self.agent.undo_turn(last["turn"])
+        if not result["success"]:
+            messagebox.showerror("撤销失败", result["error"])
+            return
+        text = f"↩️ 已撤销第 {result['turn']} 轮，恢复 {len(result['restored'])} 个文件"
+        if result["conflicts"]:
+            text += f"；{len(result['conflicts'])} 个文件之后又被修改过，已跳过: " + ", ".join(result["conflicts"])
+        self.add_message("系统", text)
+
+    def restore_file_at_turn(self):
+        """把单个文件恢复到某一轮结束时的状态（输入 路径@轮号）"""
+        if not self.check_agent_ready():
+            return
+        if str(self.send_btn["state"]) == tk.DISABLED:
+            messagebox.showwarning("提示", "任务进行中，请等待完成后再恢复")
+            return
+        turns = self.agent.list_turns(10)
+        if not turns:
+            messagebox.showinfo("恢复文件", "暂无改动记录")
+            return
+        recent = "\n".join(
+            f"#{t['turn']} {t['label'][:30]} - {', '.join(t['files'][:3])}{' ...' if len(t['files']) > 3 else ''}"
+            for t in turns
+        )
+        spec = simpledialog.askstring("恢复文件", f"最近的改动:\n{recent}\n\n输入 路径@轮号（例如 src/app.py@3）:",
+                                      parent=self.root)
+        if not spec:
+            return
+        try:
+            path, turn = parse_path_at_turn(spec)
+        except ValueError as e:
+            messagebox.showerror("恢复失败", str(e))
+            return
+        result = self.agent.restore_file(path, turn)
+        if not result["success"]:
+            messagebox.showerror("恢复失败", result["error"])
+            return
+        self.add_message("系统", f"⏪ 已把 {path} 恢复到第 {turn} 轮" + ("（当时文件不存在，已删除）" if result["deleted"] else ""))
+
     def check_agent_ready(self) -> bool:
         if not self.project_folder:
             self.show_banner(True)
@@ -717,6 +779,7 @@ class HighPerformanceCodeGeniusApp:
             self.message_thread.join(timeout=1.0)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后的进程池工作进程不重新执行入口程序
     root = ttk.Window(themename="cosmo")
     app = HighPerformanceCodeGeniusApp(root)
     
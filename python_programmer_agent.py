@@ -1,16 +1,22 @@
-import json
 import re
 import os
+import time
+import asyncio
 from ai_agent_factory.agent.baseagent import BaseAgent
+from ai_agent_factory.agent.context_compactor import ContextCompactor
+from ai_agent_factory.agent.session_journal import SessionJournal
 from ai_agent_factory.llms.base_llm_openai import OpenAILLM
-from ai_agent_factory.utils.file_operation_handler import FileOperationHandler
+from ai_agent_factory.utils.file_operation_handler import FileOperationHandler, parse_structured_operations
+from ai_agent_factory.utils.result_serializer import ResultSerializer, HANDLE_RE
 
 class PythonProgrammerAgent(BaseAgent):
     """
     Python程序员智能体 - 专门处理Python开发任务的智能体
     """
 
-    def __init__(self, basellm,system_prompt="", project_dir="output"):
+    def __init__(self, basellm,system_prompt="", project_dir="output", max_prompt_tokens=60000,
+                 max_iterations=30, max_seconds=900, repo_map_tokens=1500,
+                 summary_llm=None, compact_ratio=0.7, resume_session=None, journal_session=False):
         system_prompt = (
     "你是一位专业的Python程序员，精通各种Python开发任务。\n"
     "你需要根据用户的需求，完成Python项目的开发工作。\n"
@@ -71,11 +77,90 @@ class PythonProgrammerAgent(BaseAgent):
     "\n文件操作指令支持：\n"
 ) + FileOperationHandler.get_file_operation_prompt()
         
-        super().__init__(basellm, system_prompt, max_context=50)
+        # 上下文超过预算的 compact_ratio 时在后台总结早期消息；summary_llm 可以是更便宜的模型
+        compactor = None
+        if compact_ratio and max_prompt_tokens:
+            compactor = ContextCompactor(summary_llm or basellm, int(max_prompt_tokens * compact_ratio))
+        super().__init__(basellm, system_prompt, max_context=50, max_prompt_tokens=max_prompt_tokens,
+                         compactor=compactor)
         self.files = []
         self.project_dir = project_dir
-        self.file_handler = FileOperationHandler(project_dir)
+        self.file_handler = FileOperationHandler(project_dir, parallel=True, transactional=True)
         self.current_response = ""  # 用于累积流式 token
+        self.update_ui_callback = None
+        self.max_iterations = max_iterations  # 单个任务最多的模型往返次数
+        self.max_seconds = max_seconds  # 单个任务的墙钟时间上限（秒）
+        self.iteration_stats = []  # 最近一次任务每轮的耗时统计
+        self._tag_parser = None  # 当前轮的流式标签解析器
+        self._stream_operations = []  # 当前轮流式解析出的操作
+        self._prefetched = {}  # 当前轮已提前执行的只读操作 {下标: Future}
+        self._stream_parse_time = 0.0
+        self.base_system_prompt = system_prompt
+        self.repo_map_tokens = repo_map_tokens  # 仓库地图的 token 预算，0/None 表示不注入
+        self._repo_map_injected = False
+        self.result_serializer = ResultSerializer(self.file_handler.result_store)  # 操作结果的紧凑格式与折叠
+        self.session_id = None
+        # journal_session 为 True 时每条消息写入 <项目>/.codegenius/sessions/<会话ID>/ 的日志（默认不记录）；
+        # resume_session 为会话 ID 或 "latest"，恢复后继续记录
+        if journal_session or resume_session:
+            self.open_session(resume_session)
+
+    def open_session(self, session_id: str = None) -> str:
+        """
+        开始记录新会话，或恢复已有会话（session_id 为会话 ID 或 "latest"）。
+        恢复时按 token 预算载入日志尾部的消息替换当前上下文。
+
+        返回:
+            会话 ID；新建会话失败时返回 None
+        异常:
+            FileNotFoundError: 要恢复的会话不存在
+        """
+        if session_id:
+            journal = SessionJournal.open(self.project_dir, session_id)
+        else:
+            try:
+                journal = SessionJournal.create(self.project_dir)
+            except OSError as e:
+                print(f"\n⚠️ 无法创建会话日志，本次会话不会被记录: {e}")
+                return None
+        if self.journal is not None:
+            self.journal.close()
+        loaded = self.attach_journal(journal)
+        self.session_id = journal.session_id
+        if loaded:
+            # 之后的结果句柄接在已恢复消息中的句柄之后
+            handles = [int(h) for m in self.get_context() for h in HANDLE_RE.findall(m["content"])]
+            self.file_handler.result_store.advance_to(max(handles, default=0))
+            # 结果正文的旁路存储不随会话保存：重新登记仍完整的结果块，已折叠块的 <recall> 提示改为重新读取
+            self._rewrite_messages(
+                lambda m: self.result_serializer.restore(m["content"]) if m["role"] == "user" else None
+            )
+            print(f"\n📂 已恢复会话 {self.session_id}：载入 {loaded} 条消息，"
+                  f"约 {self.get_context_tokens()} tokens")
+        return self.session_id
+
+    def _init_fork(self, parent):
+        """分叉在 .codegenius/forks/ 下的项目副本上读写文件，不记录会话日志"""
+        self.file_handler = parent.file_handler.fork()
+        self.result_serializer = parent.result_serializer.copy()
+        self.files = list(parent.files)
+        self.current_response = ""
+        self.iteration_stats = []
+        self._tag_parser = None
+        self._stream_operations = []
+        self._prefetched = {}
+        self.session_id = None
+
+    def merge_fork(self, fork: "PythonProgrammerAgent"):
+        """把分叉中的文件改动合并回本代理的项目（记为可撤销的一轮），对话上下文不合并"""
+        return self.file_handler.merge_fork(fork.file_handler)
+
+    def discard_fork(self, fork: "PythonProgrammerAgent"):
+        """删除分叉的工作区"""
+        workspace = fork.file_handler.fork_workspace
+        if workspace is not None:
+            workspace.discard()
+            print(f"🗑️ 已删除分叉 {workspace.fork_id}")
 
     def set_token_deal_call_back(self,update_ui_callback):
         self.update_ui_callback  = update_ui_callback;
@@ -85,40 +170,234 @@ class PythonProgrammerAgent(BaseAgent):
         处理流式返回的每个 token，并通过回调更新 UI
         """
         self.current_response += token
+        if self._tag_parser is not None:
+            parse_start = time.perf_counter()
+            operations = self._tag_parser.feed(token)
+            self._stream_parse_time += time.perf_counter() - parse_start
+            for op in operations:
+                # 只读操作一闭合就交给后台执行，写操作等流结束后按顺序执行
+                if self.file_handler.can_prefetch(op, self._stream_operations):
+                    self._prefetched[len(self._stream_operations)] = self.file_handler.prefetch(op)
+                self._stream_operations.append(op)
         if self.update_ui_callback:
             self.update_ui_callback(token)
         print(token, end='', flush=True)
 
+    def chat(self, message: str) -> str:
+        """
+        以显式循环驱动任务：每轮把模型回复中的文件操作执行完，再把结果作为下一轮输入，
+        直到模型不再发出文件操作、达到最大轮数或超过时间上限。
+        一次任务中的全部文件改动记为快照库中的一轮，可以通过 undo_turn 整体撤销。
+
+        返回:
+            最后一轮的模型回复
+        """
+        self._inject_repo_map()
+        self.file_handler.begin_turn(message[:100])
+        try:
+            return self._run_task(message)
+        finally:
+            turn = self.file_handler.end_turn()
+            if turn is not None:
+                print(f"\n💾 本次任务的文件改动已记录为第 {turn} 轮（可撤销）")
+
+    def _run_task(self, message: str) -> str:
+        started = time.perf_counter()
+        self.iteration_stats = []
+        reply = ""
+        for iteration in range(1, self.max_iterations + 1):
+            self._begin_stream()
+            llm_start = time.perf_counter()
+            reply = self._stream_reply(message)
+            llm_time = time.perf_counter() - llm_start
+            operations = self._end_stream()
+            try:
+                message, parse_time, tool_time = self._process_reply(reply, operations)
+            except Exception as e:
+                self._report_failure(e, reply)
+                break
+            self._record_iteration(iteration, llm_time, parse_time, tool_time)
+            if message is None:
+                break
+            if time.perf_counter() - started > self.max_seconds:
+                print(f"\n⚠️ 任务超过时间上限 {self.max_seconds} 秒，停止继续处理")
+                break
+        else:
+            print(f"\n⚠️ 达到最大迭代次数 {self.max_iterations}，停止继续处理")
+        return reply
+
+    async def achat(self, message: str) -> str:
+        """
+        chat 的异步版本：模型往返使用 achat 流，文件操作在线程池中执行
+        """
+        await asyncio.to_thread(self._inject_repo_map)
+        self.file_handler.begin_turn(message[:100])
+        try:
+            return await self._arun_task(message)
+        finally:
+            turn = self.file_handler.end_turn()
+            if turn is not None:
+                print(f"\n💾 本次任务的文件改动已记录为第 {turn} 轮（可撤销）")
+
+    async def _arun_task(self, message: str) -> str:
+        started = time.perf_counter()
+        self.iteration_stats = []
+        reply = ""
+        for iteration in range(1, self.max_iterations + 1):
+            self._begin_stream()
+            llm_start = time.perf_counter()
+            reply = await self._astream_reply(message)
+            llm_time = time.perf_counter() - llm_start
+            operations = self._end_stream()
+            try:
+                message, parse_time, tool_time = await asyncio.to_thread(self._process_reply, reply, operations)
+            except Exception as e:
+                self._report_failure(e, reply)
+                break
+            self._record_iteration(iteration, llm_time, parse_time, tool_time)
+            if message is None:
+                break
+            if time.perf_counter() - started > self.max_seconds:
+                print(f"\n⚠️ 任务超过时间上限 {self.max_seconds} 秒，停止继续处理")
+                break
+        else:
+            print(f"\n⚠️ 达到最大迭代次数 {self.max_iterations}，停止继续处理")
+        return reply
+
+    def _inject_repo_map(self):
+        """
+        会话的第一个任务开始前，把仓库地图追加到系统提示末尾，模型第一轮就了解项目结构。
+        每个会话只注入一次，之后系统提示保持不变（便于模型服务端复用提示缓存）。
+        """
+        if not self.repo_map_tokens or self._repo_map_injected:
+            return
+        self._repo_map_injected = True
+        try:
+            repo_map = self.file_handler.repo_map.render(self.repo_map_tokens, self.count_tokens)
+        except Exception as e:
+            print(f"⚠️ 生成仓库地图失败: {e}")
+            return
+        if repo_map:
+            self.set_system_prompt(self.base_system_prompt + "\n\n" + repo_map)
+            print(f"🗺️ 已注入仓库地图（约 {self.count_tokens(repo_map)} tokens）")
+
+    def refresh_repo_map(self):
+        """按当前项目状态重新生成仓库地图并替换系统提示中的旧地图"""
+        self._repo_map_injected = False
+        self._inject_repo_map()
+
     def todo(self, token: str):
         """
-        处理完整的 AI 回复
+        处理完整的 AI 回复，返回需要回传给模型的操作结果（没有文件操作时返回 None）
         """
         try:
-            need_data = []
-            print(f"\n🔍 收到Python开发响应，长度: {len(token)} 字符")
-            
-            # 检查是否包含文件操作标记
-            if FileOperationHandler.has_file_operations(token):
-                print("✅ 检测到文件操作指令")
-                
-                def callback(op, result):
-                    need_data.append(result)
-                
-                result = self.file_handler.handle_tagged_file_operations(token, callback)
-                if result:
-                    print("✅ 文件操作处理完成")
-                self.chat(json.dumps(need_data, ensure_ascii=False))
-            else:
-                print("⚠️ 未检测到文件操作指令")
-                # 普通文本已通过 token_deal 实时更新 UI，此处无需重复处理
-                self.current_response = ""  # 重置累积响应
-                
+            return self._process_reply(token)[0]
         except Exception as e:
-            print(f"\n❌ Python程序员处理失败: {e}")
-            import traceback
-            traceback.print_exc()
-            print("原始响应:", token)
-            return f"错误: {str(e)}"
+            self._report_failure(e, token)
+            return None
+
+    def _begin_stream(self):
+        """每轮开始前重置流式解析状态"""
+        self.current_response = ""
+        self._tag_parser = FileOperationHandler.create_stream_parser()
+        self._stream_operations = []
+        self._prefetched = {}
+        self._stream_parse_time = 0.0
+
+    def _end_stream(self) -> list:
+        """流结束后取出本轮解析到的操作（未闭合的标签被丢弃）"""
+        operations = self._stream_operations
+        self._tag_parser.close()
+        self._tag_parser = None
+        self._stream_operations = []
+        return operations
+
+    def _process_reply(self, token: str, operations: list = None):
+        """
+        执行回复中的文件操作指令
+
+        参数:
+            token: 完整回复
+            operations: 流式解析阶段已得到的操作（其中的只读操作可能已提前执行）；
+                为 None 时对 token 做一次完整解析
+
+        返回:
+            (follow_up, parse_time, tool_time)：follow_up 为需要回传给模型的操作结果（紧凑的结果块文本），
+            没有文件操作时为 None；后两项为解析与执行工具的耗时（秒）
+        """
+        need_data = []
+        print(f"\n🔍 收到Python开发响应，长度: {len(token)} 字符")
+
+        prefetched, self._prefetched = self._prefetched, {}
+        if operations is None:
+            prefetched = {}
+            parse_start = time.perf_counter()
+            operations = parse_structured_operations(token, FileOperationHandler.OPERATION_TAGS,
+                                                     FileOperationHandler.VOID_TAGS)
+            parse_time = time.perf_counter() - parse_start
+        else:
+            parse_time = self._stream_parse_time
+
+        # 检查是否包含文件操作标记
+        if operations:
+            print("✅ 检测到文件操作指令")
+
+            def callback(op, result):
+                need_data.append((op, result))
+
+            tool_start = time.perf_counter()
+            result = self.file_handler.handle_tagged_file_operations(token, callback, operations=operations,
+                                                                      prefetched=prefetched)
+            tool_time = time.perf_counter() - tool_start
+            if result:
+                print("✅ 文件操作处理完成")
+            follow_up = self.result_serializer.serialize(need_data, self._result_in_context)
+            follow_up = self._collapse_old_results(follow_up)
+            return follow_up, parse_time, tool_time
+
+        print("⚠️ 未检测到文件操作指令")
+        # 普通文本已通过 token_deal 实时更新 UI，此处无需重复处理
+        self.current_response = ""  # 重置累积响应
+        return None, parse_time, 0.0
+
+    def _result_in_context(self, handle: str) -> bool:
+        """结果块是否仍完整地保留在上下文中（未被裁剪或折叠）"""
+        closing = f"\n@{handle}>>"
+        return any(m["role"] == "user" and closing in m["content"] for m in self.get_context())
+
+    def _collapse_old_results(self, follow_up: str) -> str:
+        """
+        改写已过时的操作结果：大段旧结果折叠为一行摘要（原文仍可通过 <recall> 取回），
+        被重新读取取代的 read_file 结果改写为指向新结果的短句。
+        除上下文中的消息外，也处理即将发送的 follow_up（同一回复中重复读取同一文件时），返回处理后的 follow_up。
+        """
+        handles = self.result_serializer.due_handles()
+        if not handles:
+            return follow_up
+        collapsed = self._rewrite_messages(
+            lambda m: self.result_serializer.collapse(m["content"], handles) if m["role"] == "user" else None
+        )
+        follow_up = self.result_serializer.collapse(follow_up, handles) or follow_up
+        self.result_serializer.mark_collapsed(handles)
+        if collapsed:
+            print(f"🗜️ 已改写 {collapsed} 条消息中的旧结果块，当前上下文约 {self.get_context_tokens()} tokens")
+        return follow_up
+
+    def _record_iteration(self, iteration: int, llm_time: float, parse_time: float, tool_time: float):
+        """记录并打印一轮的耗时"""
+        self.iteration_stats.append({
+            "iteration": iteration,
+            "llm_time": llm_time,
+            "parse_time": parse_time,
+            "tool_time": tool_time,
+        })
+        print(f"⏱️ 第 {iteration} 轮: LLM {llm_time:.2f}s | 解析 {parse_time * 1000:.1f}ms | 工具 {tool_time * 1000:.1f}ms")
+
+    def _report_failure(self, e: Exception, token: str):
+        print(f"\n❌ Python程序员处理失败: {e}")
+        import traceback
+        traceback.print_exc()
+        print("原始响应:", token)
 
     def create_file(self, filename: str, content: str):
         """
@@ -138,12 +417,36 @@ class PythonProgrammerAgent(BaseAgent):
         """
         return self.file_handler.update_file(filename, content)
 
+    def edit_file(self, filename: str, patch_text: str):
+        """
+        按 SEARCH/REPLACE 块或 unified diff 局部编辑文件
+        """
+        return self.file_handler.edit_file(filename, patch_text)
+
     def delete_file(self, filename: str):
         """
         删除文件
         """
         return self.file_handler.delete_file(filename)
 
+    def undo_turn(self, turn: int = None):
+        """
+        撤销一次任务（默认最近一次）的全部文件改动
+        """
+        return self.file_handler.undo_turn(turn)
+
+    def restore_file(self, filename: str, turn: int):
+        """
+        把文件恢复到第 turn 轮结束时的状态
+        """
+        return self.file_handler.restore_file(filename, turn)
+
+    def list_turns(self, limit: int = 20):
+        """
+        列出最近的改动轮次
+        """
+        return self.file_handler.list_turns(limit)
+
     def list_files(self):
         """
         列出所有文件
@@ -4,6 +4,7 @@
 """
 
 import sys
+import multiprocessing
 import os
 
 # 添加父目录到Python路径，以便导入ai_agent_factory
@@ -11,5 +12,6 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 # 现在运行主应用
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后的进程池工作进程不重新执行入口程序
     from main import create_ui
     create_ui()
\ No newline at end of file